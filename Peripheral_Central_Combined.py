@@ -1,10 +1,11 @@
+import argparse
 import asyncio
-import threading
+import concurrent.futures
+import logging
 import json
 import time
 import datetime
 from enum import IntEnum
-from copy import deepcopy
 
 from bluez_peripheral.gatt.service import Service
 from bluez_peripheral.gatt.characteristic import (
@@ -20,25 +21,26 @@ from bluez_peripheral.agent import NoIoAgent
 import simplepyble
 import msgpack
 
+from device_registry import DeviceRegistry
+from hub_logging import EventAggregator, get_logger
+import profiler
+from profiler import SPANS
+from snapshot_buffer import LatestValues, SnapshotBuffer
+
+# Records are written by a background thread, so logging doesn't block the event loop
+logger = get_logger(__name__, logging.INFO)
+
 RECONNECTION_DELAY = 1
 PERIPHERAL_READ_DELAY = 0.200
 
+# Snapshots per saved file (every 5 seconds)
+SNAPSHOTS_PER_FILE = 25
+
 SERVICE_UUID = "4fafc201-1fb5-459e-8fcc-c5c9c331914b"
 CHARACTERISTIC_UUID = "beb5483e-36e1-4688-b7f5-ea07361b26a8"
 
-DEVICES = [
-    "08:D1:F9:C7:14:DE",  # ESP32 DevkitC v4 1 (Left arm)
-    "08:D1:F9:DF:D7:BA",  # ESP32 DevkitC v4 2 (Right arm)
-    "CD:C8:D6:CF:45:50",  # XIAO 1 (Left leg)
-    "D9:4D:33:22:7F:55",  # XIAO 2 (Right leg)
-]
-
-DEVICE_NAMES = [
-    "LEFT_ARM",
-    "RIGHT_ARM",
-    "LEFT_LEG",
-    "RIGHT_LEG",
-]
+# Sensor nodes, loaded from devices.json
+registry = DeviceRegistry.load()
 
 
 class NodeStatus(IntEnum):
@@ -48,35 +50,31 @@ class NodeStatus(IntEnum):
     RECONNECTING = 3
 
 
-def do_every(period, f, *args):
-    def g_tick():
-        t = time.time()
-        while True:
-            t += period
-            yield max(t - time.time(), 0)
-
-    g = g_tick()
-    while True:
-        time.sleep(next(g))
-        f(*args)
+# Blocking simplepyble calls run in this executor, so the number of threads does not depend on the number of peripherals
+BLE_EXECUTOR_WORKERS = 2
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=BLE_EXECUTOR_WORKERS)
+# Reconnections (scans and blocking connects) run one at a time in their own thread, so nodes dropping at once
+# neither take the workers of the reads of the healthy nodes nor scan the adapter concurrently
+reconnect_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
 
-def start_async_thread(target, *args):
-    t = threading.Thread(target=asyncio.run, args=(target(*args),))
-    t.daemon = True
-    t.start()
 
-    return t
+async def run_blocking(f, *args, pool=executor):
+    return await asyncio.get_running_loop().run_in_executor(pool, f, *args)
 
-def start_thread(target, *args):
-    t = threading.Thread(target=target, args=args)
-    t.daemon = True
-    t.start()
 
-    return t
+async def do_every(period, offset, f, *args):
+    """Await `f(*args)` every `period` seconds, starting `offset` seconds from now. Missed ticks are skipped."""
+    loop = asyncio.get_running_loop()
+    t = loop.time() + offset
 
+    while True:
+        await asyncio.sleep(max(t - loop.time(), 0))
+        await f(*args)
 
-def start_scheduled_thread(interval, target, *args):
-    return start_thread(do_every, interval, target, *args)
+        t += period
+        if t < loop.time():
+            # Fell behind by more than a period, skip to the next tick
+            t += ((loop.time() - t) // period + 1) * period
 
 
 adapter = None
@@ -113,15 +111,15 @@ def connect_simple(address, scan_time=2000, peripherals=None):
         adapter.scan_for(scan_time)
         peripherals = adapter.scan_get_results()
 
-    p = [per for per in peripherals if per.address() == address]
+    p = [per for per in peripherals if per.address().upper() == address.upper()]
 
     if len(p) == 0:
-        print(f"Could not find peripheral with address {address}")
+        logger.warning("Could not find peripheral with address %s", address)
         return None
 
-    print(f"Found peripheral {p[0].identifier()}")
+    logger.info("Found peripheral %s", p[0].identifier())
     p[0].connect()
-    print(f"Successfully connected!")
+    logger.info("Successfully connected!")
 
     return p[0]
 
@@ -135,7 +133,8 @@ class AllTogether(Service):
 
     # Use the characteristic decorator to define your own characteristics.
     # Set the allowed access methods using the characteristic flags.
-    @characteristic("beb5483e-36e1-4688-b7f5-ea07361b26a8", CharFlags.READ)
+    # Clients can also subscribe to notifications instead of polling
+    @characteristic("beb5483e-36e1-4688-b7f5-ea07361b26a8", CharFlags.READ | CharFlags.NOTIFY)
     def my_readonly_characteristic(self, options):
         # Characteristics need to return bytes.
         return bytes(self._some_value, "utf-8") if not isinstance(self._some_value, bytes) else self._some_value
@@ -167,23 +166,30 @@ class AllTogether(Service):
 
     def update_value(self, new_value):
         self._some_value = new_value
+        self.my_readonly_characteristic.changed(new_value if isinstance(new_value, bytes) else bytes(new_value, "utf-8"))
+
 
+def send_combined(service: AllTogether, snapshot: dict):
+    """Serve a snapshot of the combined values: notify the subscribers and answer the next reads with it."""
+    with SPANS.span("pack"):
+        value = msgpack.packb(snapshot)
 
-data = []
+    logger.debug("Combined length: %d", len(value))
+    with SPANS.span("update_value"):
+        service.update_value(value)
 
 
-def save_file():
-    global data
+def save_file(data):
     fname = f"/home/raspiserver/Desktop/test_data/{datetime.datetime.now()}.json"
-    with open(fname, "w") as f:
+    with SPANS.span("save_file"), open(fname, "w") as f:
         json.dump({"data": data}, f)
 
-    print(f"\n************** Saved {fname} **************\n")
+    logger.info("************** Saved %s **************", fname)
 
 
 # This needs running in an awaitable context.
 async def main():
-    global data, adapter
+    global adapter
 
     # Get the message bus.
     bus = await get_message_bus()
@@ -208,7 +214,15 @@ async def main():
     peripherals = []
     peripherals_status = []
     peripheral_names = []
-    peripheral_threads = []
+    peripheral_addresses = []
+
+    # At most one reconnection task per peripheral
+    reconnect_tasks = {}
+
+    def ensure_reconnecting(i):
+        task = reconnect_tasks.get(i)
+        if task is None or task.done():
+            reconnect_tasks[i] = asyncio.create_task(reconnect_peripheral(i))
 
     # Reconnection code
     async def reconnect_peripheral(i):
@@ -217,26 +231,25 @@ async def main():
 
         # This will scan for 1s, wait 1s, until it manages to reconnect
         while True:
-            print(func_name + f"...")
+            logger.info("%s...", func_name)
             peripherals_status[i] = NodeStatus.RECONNECTING
 
             try:
-                p.connect()
+                await run_blocking(p.connect, pool=reconnect_executor)
                 break
             except Exception as e2:
-                print(func_name + f"Failed reconnecting: {e2}")
+                logger.warning("%sFailed reconnecting: %s", func_name, e2)
 
                 try:
-                    p = connect_simple(DEVICES[i], scan_time=1000)
+                    p = await run_blocking(connect_simple, peripheral_addresses[i], 1000, pool=reconnect_executor)
 
                     if p:
                         peripherals[i] = p
                         break
 
-                    print(func_name + f"Could not find address {DEVICES[i]}")
+                    logger.warning("%sCould not find address %s", func_name, peripheral_addresses[i])
                 except Exception as e3:
-                    print(func_name + f"Failed rescanning: {e3}")
-                    print(e3)
+                    logger.warning("%sFailed rescanning: %s", func_name, e3)
 
             # Wait before trying again
             peripherals_status[i] = NodeStatus.DISCONNECTED
@@ -248,35 +261,33 @@ async def main():
     if adapter is None:
         adapter = get_adapter()
 
-    adapter.set_callback_on_scan_start(lambda: print("Scan started."))
-    adapter.set_callback_on_scan_stop(lambda: print("Scan complete."))
+    adapter.set_callback_on_scan_start(lambda: logger.info("Scan started."))
+    adapter.set_callback_on_scan_stop(lambda: logger.info("Scan complete."))
     adapter.set_callback_on_scan_found(
-        lambda peripheral: print(f"Found {peripheral.identifier()} [{peripheral.address()}]")
+        lambda peripheral: logger.debug("Found %s [%s]", peripheral.identifier(), peripheral.address())
     )
 
     # Scan once, connect to all peripherals
     adapter.scan_for(2000)
     scanned = adapter.scan_get_results()
 
-    for d, dn in zip(DEVICES, DEVICE_NAMES):
-        p = connect_simple(d, peripherals=scanned)
+    for device in registry:
+        p = connect_simple(device.address, peripherals=scanned)
         peripherals.append(p)
-        peripheral_names.append(dn)
+        peripheral_names.append(device.name)
+        peripheral_addresses.append(device.address)
         peripherals_status.append(NodeStatus.CONNECTED if p else NodeStatus.UNAVAILABLE)
 
-    print(f"Connected to {len(peripherals)} peripherals")
+    logger.info("Connected to %d peripherals", len(peripherals))
+
+    # Latest values of each peripheral, updated by the reading tasks
+    combined = LatestValues(peripheral_names, peripherals_status)
 
-    combined = {
-        pn: {
-            "data": {},
-            "status": int(ps),
-        }
-        for pn, ps in zip(peripheral_names, peripherals_status)
-    }
+    read_errors_log = EventAggregator(logger, "%d read errors for %s in the last %.0fs")
 
-    def read_peripheral(i):
+    async def read_peripheral(i):
         # Update status
-        combined[peripheral_names[i]]["status"] = int(peripherals_status[i])
+        combined.update(peripheral_names[i], status=peripherals_status[i])
 
         if peripherals_status[i] != NodeStatus.CONNECTED:
             return
@@ -286,75 +297,61 @@ async def main():
         func_name = f"[Reading {p.identifier()}] "
 
         try:
-            contents = p.read(SERVICE_UUID, CHARACTERISTIC_UUID)
+            with SPANS.span("read_peripheral"):
+                contents = await run_blocking(p.read, SERVICE_UUID, CHARACTERISTIC_UUID)
 
-            # TODO: synchronize prints
             if len(contents) != 0:
-                unpacked = msgpack.unpackb(contents)
+                with SPANS.span("unpack"):
+                    unpacked = msgpack.unpackb(contents)
 
                 # print("\n" + func_name + f"\n{unpacked}")
 
                 # Update data
-                combined[peripheral_names[i]]["data"] = unpacked
+                combined.update(peripheral_names[i], data=unpacked)
         except RuntimeError as e:
             if str(e) == "Peripheral is not connected.":
                 peripherals_status[i] = NodeStatus.DISCONNECTED
 
-                print(func_name + f"DISCONNECTED")
+                logger.error("%sDISCONNECTED", func_name)
 
                 # This will keep reconnecting until it's successful
-                start_async_thread(reconnect_peripheral, i)
+                ensure_reconnecting(i)
         except Exception as e:
-            print(e)
-
-    def send_combined():
-        combined["time"] = time.time()
+            read_errors_log.add(peripheral_names[i])
+            logger.debug("%s%s", func_name, e)
 
-        value = msgpack.packb(combined)
+    # Reads are staggered across the period, e.g. with 4 peripherals:
+    # t0.000: read 0
+    # t0.050: read 1
+    # t0.100: read 2
+    # t0.150: read 3
+    # t0.200: send combined, read 0 again
+    stagger = PERIPHERAL_READ_DELAY / max(len(peripherals), 1)
 
-        print("\n----------------------------------")
-        print(f"Combined length: {len(value)}\n")
-        print(combined)
-        service.update_value(value)
-
-    for i in range(len(peripherals)):
-        # Current expected schedule:
-        # t0.000: read 0
-        # t0.050: read 1
-        # t0.100: read 2
-        # t0.150: read 3
-        # t0.200: send combined, read 0 again
-        peripheral_threads.append(start_scheduled_thread(PERIPHERAL_READ_DELAY, read_peripheral, i))
-        await asyncio.sleep(0.050)
+    # Keep references to the tasks so they are not garbage collected
+    read_tasks = [
+        asyncio.create_task(do_every(PERIPHERAL_READ_DELAY, i * stagger, read_peripheral, i))
+        for i in range(len(peripherals))
+    ]
 
-    # start_scheduled_thread(PERIPHERAL_READ_DELAY, send_combined)
+    # Full buffers are saved by a background thread
+    snapshots = SnapshotBuffer(SNAPSHOTS_PER_FILE, save_file)
 
-    count = 0
+    async def send_and_save_snapshot():
+        snapshot = combined.snapshot(time.time())
 
-    while True:
-        combined["time"] = time.time()
+        logger.debug("%s", snapshot)
 
-        print("\n----------------------------------")
-        print(combined)
+        send_combined(service, snapshot)
+        snapshots.append(snapshot)
 
-        data.append(deepcopy(combined))
+        read_errors_log.poll()
 
-        count += 1
-
-        # Save every 5 seconds
-        if count >= 25:
-            count = 0
-            save_file()
-            data.clear()
-
-        await asyncio.sleep(PERIPHERAL_READ_DELAY)
-
-        # # try:
-        # send_combined()
-        # await asyncio.sleep(PERIPHERAL_READ_DELAY)
-        # # except KeyboardInterrupt:
-        # #     for t in peripheral_threads:
-        # #         t.join()
+    try:
+        await do_every(PERIPHERAL_READ_DELAY, PERIPHERAL_READ_DELAY, send_and_save_snapshot)
+    finally:
+        # Save the last, partly filled buffer on shutdown
+        snapshots.close()
 
     #     # Handle dbus requests.
     #     await asyncio.sleep(0.2)
@@ -363,4 +360,11 @@ async def main():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read the sensor nodes and serve the combined values")
+    profiler.add_arguments(parser)
+    args = parser.parse_args()
+
+    # Sampling profiler on SIGUSR1, span summaries on SIGUSR2
+    profiler.apply_arguments(args, logger)
+
     asyncio.run(main())
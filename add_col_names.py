@@ -50,6 +50,20 @@ def read_label_legend(lines) -> dict:
     return tracks
 
 
+def add_labels(df, data_names, label_names, label_tracks) -> pd.DataFrame:
+    # Concatenate both dataframes
+    new_row = pd.DataFrame([data_names + label_names], columns=df.columns)
+    df = pd.concat([new_row, df]).reset_index(drop=True)
+
+    # Add label names to the track columns
+    for col_num, track_name in [t.split(" ") for t in label_names]:
+        col_num = int(col_num) - 1
+        for num, label in label_tracks[track_name].items():
+            df.loc[df.iloc[:, col_num] == num, df.columns[col_num]] = f"{num} {label}"
+
+    return df
+
+
 def main():
     if len(sys.argv) != 2:
         print("Usage: python add_col_names.py <file>")
@@ -66,15 +80,7 @@ def main():
     # Read the sensors data file
     df = pd.read_csv(sensors_data_file, sep=" ", names=(data_names + label_names), dtype="Int64")
 
-    # Concatenate both dataframes
-    new_row = pd.DataFrame([data_names + label_names], columns=df.columns)
-    df = pd.concat([new_row, df]).reset_index(drop=True)
-
-    # Add label names to the track columns
-    for col_num, track_name in [t.split(" ") for t in label_names]:
-        col_num = int(col_num) - 1
-        for num, label in label_tracks[track_name].items():
-            df.loc[df.iloc[:, col_num] == num, df.columns[col_num]] = f"{num} {label}"
+    df = add_labels(df, data_names, label_names, label_tracks)
 
     # Save the new file
     df.to_csv(sensors_data_file + ".new.csv", index=False, header=False, na_rep="NaN")
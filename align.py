@@ -0,0 +1,204 @@
+"""Time alignment of Arduino captures with dataset signals.
+
+The lag between a capture (e.g. arduino_output/arduino_data_worldacc_*.csv) and a dataset column group (e.g.
+"Acc LUA^" of the OPPORTUNITY files, or arduino_output/vectors_dataset.csv) is the peak of the normalized
+cross-correlation of their acceleration magnitudes, which does not depend on the orientation of the sensors.
+All lags are computed at once with FFTs, in O(N log N) instead of sliding the capture over the dataset.
+Missing values are masked out, so every lag is normalized over the samples that actually overlap.
+
+The scale is the least squares factor from the capture magnitude to the dataset magnitude over the overlap
+(e.g. from raw accelerometer units to milli g).
+
+    python align.py arduino_output/arduino_data_worldacc_20240502_072215.csv S1-ADL1_sensors_data.txt.new.csv \\
+        --sensor "Acc LUA^"
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from resample import DATASET_PERIOD_MS, interpolate_linear, uniform_grid
+
+# Both signals are resampled onto this grid (seconds)
+DEFAULT_PERIOD = DATASET_PERIOD_MS / 1000
+# Gaps longer than this (seconds) are masked instead of interpolated
+DEFAULT_MAX_GAP = 0.200
+# Lags where less than this fraction of the shorter signal overlaps are ignored
+DEFAULT_MIN_OVERLAP = 0.5
+# Alignments scoring less are not trusted: captures that aren't in the dataset still have a best lag, e.g. the
+# worldacc captures of arduino_output/ against vectors_dataset.csv score 0.3 to 0.5 at offsets of minutes
+DEFAULT_MIN_SCORE = 0.6
+
+
+class Alignment:
+    """Capture time t is dataset time t + offset (seconds), and capture values * scale are in dataset units."""
+
+    def __init__(self, offset, scale, score, overlap):
+        self.offset = offset
+        self.scale = scale
+        # Normalized cross-correlation at the offset, from -1 to 1
+        self.score = score
+        # Overlapping samples
+        self.overlap = overlap
+
+    def reliable(self, min_score=DEFAULT_MIN_SCORE) -> bool:
+        """Whether the offset can be used, else fall back to an interval picked by hand."""
+        return self.score >= min_score
+
+    def __repr__(self):
+        return (
+            f"Alignment(offset={self.offset:.3f}s, scale={self.scale:.4f}, score={self.score:.3f}, "
+            f"overlap={self.overlap})"
+        )
+
+
+def magnitude(xyz):
+    return np.linalg.norm(np.asarray(xyz, dtype=np.float64), axis=-1)
+
+
+def _correlate_spectra(x, y, size, len_x, len_y):
+    """c[k] = sum_i x[i] * y[i + k] from the rfft of x and y, for k from -(len_x - 1) to len_y - 1."""
+    c = np.fft.irfft(np.conj(x) * y, size)
+    return np.concatenate([c[size - len_x + 1:], c[:len_y]])
+
+
+def masked_ncc(a, b, min_overlap=1):
+    """Normalized cross-correlation of `b` against `a` for every lag, ignoring NaN values.
+
+    Returns (lags, ncc, overlap) where lag k compares a[i] with b[i + k]. Lags with less than `min_overlap`
+    overlapping samples, or without variance, are NaN.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    ma, mb = ~np.isnan(a), ~np.isnan(b)
+
+    # Centering first keeps the sums below small
+    a = np.where(ma, a - np.nanmean(a), 0.0)
+    b = np.where(mb, b - np.nanmean(b), 0.0)
+
+    n = len(a) + len(b) - 1
+    size = 1 << (n - 1).bit_length()
+    fa, fa2, fma = (np.fft.rfft(x, size) for x in (a, a * a, ma.astype(np.float64)))
+    fb, fb2, fmb = (np.fft.rfft(x, size) for x in (b, b * b, mb.astype(np.float64)))
+
+    def corr(x, y):
+        return _correlate_spectra(x, y, size, len(a), len(b))
+
+    overlap = np.rint(corr(fma, fmb))
+    sum_a, sum_b = corr(fa, fmb), corr(fma, fb)
+    sum_aa, sum_bb, sum_ab = corr(fa2, fmb), corr(fma, fb2), corr(fa, fb)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = sum_ab - sum_a * sum_b / overlap
+        variance = (sum_aa - sum_a**2 / overlap) * (sum_bb - sum_b**2 / overlap)
+        ncc = covariance / np.sqrt(variance)
+
+    # Variances of a few samples are rounding errors of the FFTs
+    valid = (overlap >= max(min_overlap, 2)) & (variance > 1e-9 * (np.sum(a * a) * np.sum(b * b)))
+    ncc = np.where(valid, np.clip(ncc, -1.0, 1.0), np.nan)
+
+    lags = np.arange(-(len(a) - 1), len(b))
+    return lags, ncc, overlap.astype(np.int64)
+
+
+def _refine_peak(ncc, i):
+    """Sub-sample position of the peak at i, from the parabola through its neighbours."""
+    if i == 0 or i == len(ncc) - 1 or np.isnan(ncc[i - 1]) or np.isnan(ncc[i + 1]):
+        return 0.0
+
+    left, center, right = ncc[i - 1], ncc[i], ncc[i + 1]
+    denominator = left - 2 * center + right
+    if denominator >= 0:
+        return 0.0
+    return 0.5 * (left - right) / denominator
+
+
+def estimate_alignment(times, xyz, reference_times, reference_xyz, period=DEFAULT_PERIOD, max_gap=DEFAULT_MAX_GAP,
+                       min_overlap=DEFAULT_MIN_OVERLAP) -> Alignment:
+    """Offset and scale of a capture against a reference, from their (n, 3) accelerations and times in seconds."""
+    grid = uniform_grid(np.nanmin(times), np.nanmax(times), period)
+    reference_grid = uniform_grid(np.nanmin(reference_times), np.nanmax(reference_times), period)
+
+    a = magnitude(interpolate_linear(times, xyz, grid, max_gap))
+    b = magnitude(interpolate_linear(reference_times, reference_xyz, reference_grid, max_gap))
+
+    shorter = min(np.count_nonzero(~np.isnan(a)), np.count_nonzero(~np.isnan(b)))
+    lags, ncc, overlap = masked_ncc(a, b, int(min_overlap * shorter))
+    if np.isnan(ncc).all():
+        raise ValueError("The signals don't overlap enough to be aligned")
+
+    i = int(np.nanargmax(ncc))
+    lag = lags[i]
+
+    # Least squares scale over the overlapping samples
+    start, end = max(0, -lag), min(len(a), len(b) - lag)
+    pa, pb = a[start:end], b[start + lag:end + lag]
+    both = ~np.isnan(pa) & ~np.isnan(pb)
+    scale = float(np.dot(pa[both], pb[both]) / np.dot(pa[both], pa[both]))
+
+    offset = reference_grid[0] - grid[0] + (lag + _refine_peak(ncc, i)) * period
+    return Alignment(float(offset), scale, float(ncc[i]), int(overlap[i]))
+
+
+def time_column(df: pd.DataFrame):
+    """Times of the rows in seconds: the "... SECOND" or "... MILLISEC" column, or the row index at the
+    dataset rate for files without a time column (e.g. vectors_dataset.csv).
+    """
+    name = df.columns[0]
+    if name.upper().endswith("MILLISEC"):
+        return df[name].to_numpy(dtype=np.float64) / 1000
+    if name.upper().endswith("SECOND"):
+        return df[name].to_numpy(dtype=np.float64)
+    return np.arange(len(df)) * DEFAULT_PERIOD
+
+
+def acceleration_columns(df: pd.DataFrame, sensor=None) -> list:
+    """The X, Y and Z columns of `sensor` (e.g. "Acc LUA^" or "IMU BACK acc"), or the last three columns."""
+    if sensor is None:
+        return list(df.columns[-3:])
+
+    columns = [c for c in df.columns if sensor in c and c[-1:].upper() in ("X", "Y", "Z")]
+    if len(columns) != 3:
+        raise ValueError(f"Expected 3 columns for {sensor}, found {columns}")
+    return columns
+
+
+def align_frames(capture: pd.DataFrame, reference: pd.DataFrame, sensor=None, capture_sensor=None,
+                 **kwargs) -> Alignment:
+    """Align two CSV files loaded with pandas, see `time_column` and `acceleration_columns`."""
+    return estimate_alignment(
+        time_column(capture),
+        capture[acceleration_columns(capture, capture_sensor)].to_numpy(dtype=np.float64),
+        time_column(reference),
+        reference[acceleration_columns(reference, sensor)].to_numpy(dtype=np.float64),
+        **kwargs,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate the time offset and scale of a capture against a dataset")
+    parser.add_argument("capture", help="Arduino capture CSV (time in the first column, X/Y/Z in the last three)")
+    parser.add_argument("reference", help="dataset CSV")
+    parser.add_argument("--sensor", help='dataset sensor, e.g. "Acc LUA^" (default: the last three columns)')
+    parser.add_argument("--period", type=float, default=DEFAULT_PERIOD, help="resampling period in seconds")
+    parser.add_argument("--min-overlap", type=float, default=DEFAULT_MIN_OVERLAP,
+                        help="minimum overlap, as a fraction of the shorter signal")
+    parser.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE,
+                        help="minimum correlation for the alignment to be used")
+    args = parser.parse_args()
+
+    alignment = align_frames(
+        pd.read_csv(args.capture),
+        pd.read_csv(args.reference),
+        sensor=args.sensor,
+        period=args.period,
+        min_overlap=args.min_overlap,
+    )
+    print(alignment)
+    if not alignment.reliable(args.min_score):
+        print(f"Warning: score below {args.min_score}, the signals probably don't match", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Benchmarks for align.py: FFT cross-correlation against sliding the capture over the dataset."""
+import numpy as np
+
+import align
+from synthetic import load_vectors_dataset
+
+REFERENCE_SAMPLES = 5000
+CAPTURE_SAMPLES = 600
+CAPTURE_START = 1800
+
+
+def _signals():
+    reference = align.magnitude(load_vectors_dataset(REFERENCE_SAMPLES))
+    capture = reference[CAPTURE_START:CAPTURE_START + CAPTURE_SAMPLES] * 2.7
+    return capture, reference
+
+
+def _sliding_ncc(a, b):
+    """Correlation coefficient of `a` with every window of `b` it fits in."""
+    return [np.corrcoef(a, b[k:k + len(a)])[0, 1] for k in range(len(b) - len(a) + 1)]
+
+
+def bench_ncc_fft():
+    capture, reference = _signals()
+    return lambda: align.masked_ncc(capture, reference, len(capture))
+
+
+def bench_ncc_sliding():
+    capture, reference = _signals()
+    return lambda: _sliding_ncc(capture, reference)
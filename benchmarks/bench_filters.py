@@ -0,0 +1,86 @@
+"""Benchmarks for filters.py: vectorized filters against the same filters written as scalar Python loops."""
+import math
+
+import filters
+from synthetic import load_vectors_dataset
+
+SAMPLES = 500
+# Four nodes with up to five 3-axis vectors each
+AXES = 60
+DT = 0.033
+
+
+def _samples():
+    rows = load_vectors_dataset(SAMPLES)
+    # Repeat the recorded axes to get the size of a combined frame
+    return [[row[i % 3] + i for i in range(AXES)] for row in rows]
+
+
+def _scalar_kalman(samples, dt, q, r):
+    """Same filter as filters.KalmanCV, one axis at a time."""
+    out = []
+    states = [None] * len(samples[0])
+    for sample in samples:
+        row = []
+        for j, z in enumerate(sample):
+            if states[j] is None:
+                states[j] = [z, 0.0, r, 0.0, r]
+                row.append(z)
+                continue
+
+            x0, x1, p00, p01, p11 = states[j]
+            x0 += dt * x1
+            p00 += dt * (2 * p01 + dt * p11) + q * dt**4 / 4
+            p01 += dt * p11 + q * dt**3 / 2
+            p11 += q * dt**2
+
+            s = p00 + r
+            k0, k1 = p00 / s, p01 / s
+            innovation = z - x0
+            states[j] = [x0 + k0 * innovation, x1 + k1 * innovation, (1 - k0) * p00, (1 - k0) * p01, p11 - k1 * p01]
+            row.append(states[j][0])
+        out.append(row)
+    return out
+
+
+def _scalar_lowpass(samples, b, a):
+    out = []
+    states = [[0.0, 0.0] for _ in samples[0]]
+    for sample in samples:
+        row = []
+        for j, x in enumerate(sample):
+            s = states[j]
+            y = b[0] * x + s[0]
+            s[0] = b[1] * x - a[1] * y + s[1]
+            s[1] = b[2] * x - a[2] * y
+            row.append(y)
+        out.append(row)
+    return out
+
+
+def bench_kalman_vectorized():
+    samples = _samples()
+    return lambda: filters.kalman_cv(samples, DT)
+
+
+def bench_kalman_scalar():
+    samples = _samples()
+    return lambda: _scalar_kalman(samples, DT, 1.0, 1.0)
+
+
+def bench_lowpass_vectorized():
+    samples = _samples()
+    return lambda: filters.lowpass(samples, 5.0, 1 / DT)
+
+
+def bench_lowpass_scalar():
+    samples = _samples()
+    b, a = filters.butterworth_coefficients(5.0, 1 / DT)
+    return lambda: _scalar_lowpass(samples, b, a)
+
+
+def bench_complementary():
+    rows = load_vectors_dataset(SAMPLES)
+    acc = [[row] * 4 for row in rows]
+    gyro = [[[math.sin(i * DT)] * 3] * 4 for i in range(len(rows))]
+    return lambda: filters.complementary(acc, gyro, DT)
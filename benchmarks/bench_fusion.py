@@ -0,0 +1,52 @@
+"""Benchmarks for fusion.py: one batched Madgwick update per frame against one update per sensor."""
+import numpy as np
+
+from fusion import GYRO_SCALE, FrameFusion, Madgwick
+from synthetic import combined_frames
+
+FRAMES = 200
+
+
+def _mpu_samples(frames):
+    """(frames, sensors, 3) accelerometer and gyroscope (rad/s) arrays of the MPUs of the frames."""
+    acc, gyro = [], []
+    for frame in frames:
+        sensors = [s for k, e in frame.items() if k != "t" for s in e["d"]["mpu"] if s]
+        acc.append([s["a"] for s in sensors])
+        gyro.append([s["g"] for s in sensors])
+    return np.asarray(acc, dtype=np.float64), np.asarray(gyro, dtype=np.float64) * GYRO_SCALE
+
+
+def bench_madgwick_batched():
+    acc, gyro = _mpu_samples(combined_frames(FRAMES))
+
+    def run():
+        f = Madgwick(acc.shape[1])
+        for i in range(len(acc)):
+            f.update(acc[i], gyro[i], 0.12)
+
+    return run
+
+
+def bench_madgwick_per_sensor():
+    acc, gyro = _mpu_samples(combined_frames(FRAMES))
+
+    def run():
+        filters = [Madgwick(1) for _ in range(acc.shape[1])]
+        for i in range(len(acc)):
+            for j, f in enumerate(filters):
+                f.update(acc[i, j:j + 1], gyro[i, j:j + 1], 0.12)
+
+    return run
+
+
+def bench_frame_fusion_apply():
+    # The orientation of the frames is replaced in place, so they can be reused
+    frames = combined_frames(FRAMES)
+
+    def run():
+        fusion = FrameFusion(overwrite=True)
+        for frame in frames:
+            fusion.apply(frame)
+
+    return run
@@ -0,0 +1,146 @@
+"""Benchmarks for the bleak_client data path: queues, alignment, encoding and persistence."""
+import logging
+import random
+import shutil
+import tempfile
+import time
+
+import lz4.frame
+import msgpack
+
+import bleak_client
+import frame_schema
+from frame_store import FrameStore
+from synthetic import combined_frames, load_vectors_dataset, node_payload
+
+FRAMES = 200
+
+# Keep the log output of the hub out of the results
+bleak_client.logger.setLevel(logging.ERROR)
+
+# One packed payload per device, reused for every notification
+_rng = random.Random(0)
+payloads = [msgpack.packb(node_payload(_rng, arm=i < 2)) for i in range(len(bleak_client.registry))]
+
+
+def bench_timed_queue_put_get():
+    q = bleak_client.TimedQueue(bleak_client.DATA_VALIDITY_THRESHOLD)
+    value = bytearray(200)
+
+    def run():
+        for _ in range(100):
+            q.put(value)
+        while not q.empty():
+            q.get()
+
+    return run
+
+
+def _fill_queues(packets, skew=0.0, loss=0.0, seed=0):
+    """Fill the notification queues with `packets` per device. Device 0 lags by `skew` seconds, `loss` is the drop chance."""
+    rng = random.Random(seed)
+    now = time.time()
+    for i, q in enumerate(bleak_client.notification_queues.values()):
+        q.clear()
+        for k in range(packets):
+            if rng.random() < loss:
+                continue
+            t = now - (packets - k) * 0.001 - (skew if i == 0 else 0.0)
+            q.queue.append((t, payloads[i]))
+
+
+
+def _combine_all():
+    while bleak_client.combine_data_and_send() is not None:
+        pass
+
+
+def _combine_bench(skew, loss):
+    def run():
+        _fill_queues(50, skew, loss)
+        _combine_all()
+
+    return run
+
+
+def bench_combine_aligned():
+    return _combine_bench(0.0, 0.0)
+
+
+def bench_combine_skewed():
+    return _combine_bench(0.200, 0.0)
+
+
+def bench_combine_lossy():
+    return _combine_bench(0.0, 0.2)
+
+
+def bench_encode_msgpack_lz4():
+    frames = combined_frames(FRAMES, recorded=load_vectors_dataset(FRAMES))
+
+    def run():
+        for frame in frames:
+            lz4.frame.compress(msgpack.packb(frame), compression_level=lz4.frame.COMPRESSIONLEVEL_MINHC + 5)
+
+    return run
+
+
+def bench_pack_schema():
+    frames = combined_frames(FRAMES, recorded=load_vectors_dataset(FRAMES))
+
+    def run():
+        for frame in frames:
+            frame_schema.pack_combined(frame)
+
+    return run
+
+
+def bench_unpack_schema():
+    packed = [frame_schema.pack_combined(f) for f in combined_frames(FRAMES, recorded=load_vectors_dataset(FRAMES))]
+
+    def run():
+        for data in packed:
+            frame_schema.unpack_combined(data)
+
+    return run
+
+
+def bench_save_file():
+    frames = combined_frames(10)
+    folder = tempfile.mkdtemp()
+
+    def run():
+        bleak_client.save_file(frames, folder)
+
+    run.cleanup = lambda: shutil.rmtree(folder, ignore_errors=True)
+    return run
+
+
+def bench_frame_store_append():
+    frames = combined_frames(FRAMES)
+    store = FrameStore(capacity=FRAMES)
+
+    def run():
+        store.clear()
+        store.extend(frames)
+
+    return run
+
+
+def bench_frame_store_to_dicts():
+    store = FrameStore.from_dicts(combined_frames(FRAMES))
+    return store.to_dicts
+
+
+def bench_dashboard_send():
+    """Cost of the dashboard feed for the hub, with nobody listening (the same with any number of browsers)."""
+    from replay import SocketSink
+
+    frames = combined_frames(FRAMES)
+    sink = SocketSink(port=5099)
+
+    def run():
+        for frame in frames:
+            sink(frame)
+
+    return run
@@ -0,0 +1,45 @@
+"""Benchmarks for label_index.py: segment queries against scanning the label column of every row."""
+import random
+
+import numpy as np
+import pandas as pd
+
+from label_index import LabelIndex
+
+ROWS = 50000
+# Chance of a label change on each row
+CHANGE_RATE = 0.005
+
+
+def _frame():
+    rng = random.Random(0)
+    labels = []
+    label = "1 Stand"
+    for _ in range(ROWS):
+        if rng.random() < CHANGE_RATE:
+            label = rng.choice(["0", "1 Stand", "2 Walk", "4 Sit", "5 Lie"])
+        labels.append(label)
+    return pd.DataFrame({"1 MILLISEC": np.arange(ROWS) * 33, "38 Locomotion": labels})
+
+
+def _scan_intervals(df, label):
+    """Walk segments found by comparing every row with the next one."""
+    walking = (df["38 Locomotion"] == label).to_numpy()
+    times = df["1 MILLISEC"].to_numpy()
+    edges = np.flatnonzero(np.diff(np.concatenate([[False], walking, [False]]).astype(np.int8)))
+    return times[edges[0::2]], times[np.minimum(edges[1::2], len(times) - 1)]
+
+
+def bench_build_index():
+    df = _frame()
+    return lambda: LabelIndex.from_frame(df, ["38 Locomotion"])
+
+
+def bench_intervals_index():
+    track = LabelIndex.from_frame(_frame(), ["38 Locomotion"])["Locomotion"]
+    return lambda: track.intervals("Walk")
+
+
+def bench_intervals_scan():
+    df = _frame()
+    return lambda: _scan_intervals(df, "2 Walk")
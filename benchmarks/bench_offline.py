@@ -0,0 +1,155 @@
+"""Benchmarks for the offline tooling: add_col_names labeling, the conversion notebook and the transform notebook math."""
+import math
+import random
+
+import pandas as pd
+
+import add_col_names
+from synthetic import column_names_lines, label_legend_lines, legacy_frames, load_vectors_dataset
+
+ROWS = 5000
+
+
+def bench_read_column_names():
+    lines = column_names_lines()
+    return lambda: add_col_names.read_column_names(lines)
+
+
+def bench_add_labels():
+    data_names, label_names = add_col_names.read_column_names(column_names_lines())
+    label_tracks = add_col_names.read_label_legend(label_legend_lines())
+
+    rng = random.Random(0)
+    rows = []
+    for i in range(ROWS):
+        rows.append([i * 33] + [rng.randint(-1000, 1000) for _ in range(len(data_names) - 1)] + [rng.choice([0, 1, 2, 4, 5]), rng.choice([0, 101, 102, 103])])
+    df = pd.DataFrame(rows, columns=data_names + label_names, dtype="Int64")
+
+    return lambda: add_col_names.add_labels(df, data_names, label_names, label_tracks)
+
+
+def _map_to_buses(json_data, devices):
+    """The "Map dictionary items to bus numbers" cell of convert_test_data.ipynb."""
+    device_data = {d: [[[], [], []], [[], []]] for d in devices}
+
+    for point in json_data:
+        for device in devices:
+            for i in range(2):
+                for j in range(3):
+                    if i == 1 and j == 2:
+                        continue
+                    device_data[device][i][j].append(None)
+
+            if device not in point:
+                continue
+
+            device_point = point[device]
+            if "mpu" not in device_point:
+                continue
+
+            qmc = device_point["qmc"] or []
+            mpu_len = len(device_point["mpu"])
+            qmc_len = len(qmc)
+
+            if mpu_len > 0:
+                device_data[device][0][0][-1] = device_point["mpu"][0]
+            if mpu_len > 1:
+                device_data[device][0][1][-1] = device_point["mpu"][1]
+            if qmc_len > 0:
+                device_data[device][0][2][-1] = qmc[0]
+            if mpu_len > 2:
+                device_data[device][1][0][-1] = device_point["mpu"][2]
+            if qmc_len > 1:
+                device_data[device][1][1][-1] = qmc[1]
+
+    return device_data
+
+
+def bench_convert_map_to_buses():
+    devices = ["LEFT_ARM", "RIGHT_ARM", "LEFT_LEG", "RIGHT_LEG"]
+    json_data = legacy_frames(ROWS)
+    return lambda: _map_to_buses(json_data, devices)
+
+
+def bench_convert_columns():
+    json_data = legacy_frames(ROWS)
+    device_data = _map_to_buses(json_data, ["LEFT_ARM"])
+    readings = [x or {"a": [None] * 3} for x in device_data["LEFT_ARM"][0][0]]
+
+    def run():
+        # The add_columns() and time column steps of convert_test_data.ipynb
+        columns = {}
+        for k in range(3):
+            columns[k] = [round(x["a"][k]) if x["a"][k] is not None else None for x in readings]
+        time_column = [round((x["time"] - json_data[0]["time"]) * 1000) for x in json_data]
+        return pd.DataFrame({"1 MILLISEC": time_column, **{str(k): v for k, v in columns.items()}}, dtype="Int64")
+
+    return run
+
+
+def _rotation_difference(v1, v2):
+    """Quaternion (w, x, y, z) rotating unit vector v1 onto unit vector v2, as mathutils' Vector.rotation_difference."""
+    cross = (v1[1] * v2[2] - v1[2] * v2[1], v1[2] * v2[0] - v1[0] * v2[2], v1[0] * v2[1] - v1[1] * v2[0])
+    w = 1 + sum(a * b for a, b in zip(v1, v2))
+    norm = math.sqrt(w * w + sum(c * c for c in cross))
+    return (w / norm, *(c / norm for c in cross))
+
+
+def _rotate(q, v):
+    w, x, y, z = q
+    # v + 2w(q x v) + 2(q x (q x v))
+    tx, ty, tz = 2 * (y * v[2] - z * v[1]), 2 * (z * v[0] - x * v[2]), 2 * (x * v[1] - y * v[0])
+    return (
+        v[0] + w * tx + (y * tz - z * ty),
+        v[1] + w * ty + (z * tx - x * tz),
+        v[2] + w * tz + (x * ty - y * tx),
+    )
+
+
+def _normalized(v):
+    m = math.sqrt(sum(c * c for c in v))
+    return tuple(c / m for c in v)
+
+
+def bench_transform_rotate_translate():
+    # The "Translation instead of (gravity + scaling)" steps of transform.ipynb, per row as in the notebook
+    dataset = load_vectors_dataset(ROWS)
+    vectors = [(x * 0.9 + 5, y * 1.1 - 3, z) for x, y, z in dataset]
+
+    def run():
+        n = 1000 // 33
+        vm1 = tuple(sum(v[k] for v in vectors[:n]) / n for k in range(3))
+        vm2 = tuple(sum(v[k] for v in dataset[:n]) / n for k in range(3))
+        qm = _rotation_difference(_normalized(vm1), _normalized(vm2))
+        trans = tuple(b - a for a, b in zip(vm1, vm2))
+
+        return [tuple(round(c + t) for c, t in zip(_rotate(qm, v), trans)) for v in vectors]
+
+    return run
+
+
+def bench_transform_mathutils():
+    try:
+        from mathutils import Vector
+    except ImportError:
+        return None
+
+    dataset = [Vector(v) for v in load_vectors_dataset(ROWS)]
+    vectors = [Vector((v.x * 0.9 + 5, v.y * 1.1 - 3, v.z)) for v in dataset]
+
+    def run():
+        n = 1000 // 33
+        vm1 = sum(vectors[:n], Vector()) / n
+        vm2 = sum(dataset[:n], Vector()) / n
+        qm = vm1.normalized().rotation_difference(vm2.normalized())
+        trans = vm2 - vm1
+
+        out = []
+        for v in vectors:
+            v1r = v.copy()
+            v1r.rotate(qm)
+            v1r += trans
+            out.append((round(v1r.x), round(v1r.y), round(v1r.z)))
+        return out
+
+    return run
@@ -0,0 +1,175 @@
+"""Minimal offline benchmark runner.
+
+Every `bench_*` function in a `bench_*.py` module does its setup and returns the callable to time
+(or None to skip). The callable can have a `cleanup` attribute that is called after timing.
+Results are compared against `baseline.json` so regressions show up as ratios. Timings of another machine mean
+nothing here, so a baseline recorded elsewhere is only reported: record one on the machine that runs the gate with
+`--save-baseline` (on a quiet machine, it keeps the results of the benchmarks that are not run).
+
+Usage: python benchmarks/runner.py [FILTER] [--save-baseline] [--threshold RATIO]
+"""
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+import traceback
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_PATH = os.path.join(BENCH_DIR, "results.json")
+
+# Minimum total time of one repeat, used to pick the number of calls per repeat
+MIN_REPEAT_TIME = 0.2
+REPEATS = 5
+
+# Ratios above this are reported as regressions, if they are still above it when timed again. Runs on the same
+# (shared, single core) VM vary by up to about 1.7x.
+REGRESSION_THRESHOLD = 2.0
+
+
+def time_callable(fn) -> float:
+    """Best time per call in seconds."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+
+        if elapsed >= MIN_REPEAT_TIME:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(MIN_REPEAT_TIME / elapsed) + 1)
+
+    best = elapsed / number
+    for _ in range(REPEATS - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+
+    return best
+
+
+def machine_info() -> dict:
+    return {
+        "machine": platform.machine(),
+        "node": platform.node(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def format_time(t):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if t >= scale:
+            return f"{t / scale:.3f}{unit}"
+    return f"{t / 1e-9:.1f}ns"
+
+
+def run_bench(bench):
+    """Best time per call of a `bench_*` function, None if it is skipped."""
+    fn = bench()
+    if fn is None:
+        return None
+    try:
+        return time_callable(fn)
+    finally:
+        if hasattr(fn, "cleanup"):
+            fn.cleanup()
+
+
+def discover(name_filter=None):
+    for file in sorted(os.listdir(BENCH_DIR)):
+        if not (file.startswith("bench_") and file.endswith(".py")):
+            continue
+
+        module_name = file[:-3]
+        try:
+            module = importlib.import_module(module_name)
+        except Exception as e:
+            # Missing optional dependencies or hardware-only imports
+            print(f"Skipping {module_name}: {e}")
+            continue
+
+        for attr in sorted(dir(module)):
+            if attr.startswith("bench_") and callable(getattr(module, attr)):
+                full_name = f"{module_name}.{attr}"
+                if name_filter is None or name_filter in full_name:
+                    yield full_name, getattr(module, attr)
+
+
+def main():
+    sys.path.insert(0, REPO_DIR)
+    sys.path.insert(0, BENCH_DIR)
+
+    argv = sys.argv[1:]
+    threshold = REGRESSION_THRESHOLD
+    if "--threshold" in argv:
+        i = argv.index("--threshold")
+        threshold = float(argv[i + 1])
+        del argv[i:i + 2]
+
+    args = [a for a in argv if not a.startswith("--")]
+    save_baseline = "--save-baseline" in argv
+    name_filter = args[0] if args else None
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r") as f:
+            baseline_file = json.load(f)
+
+        if baseline_file["machine"] == machine_info():
+            baseline = baseline_file["results"]
+        else:
+            print(
+                f"Warning: baseline was recorded on {baseline_file['machine']}, not compared. "
+                f"Record one on this machine with --save-baseline\n"
+            )
+
+    results = {}
+    regressions = []
+    for name, bench in discover(name_filter):
+        try:
+            t = run_bench(bench)
+            if t is None:
+                print(f"{name:<60} skipped")
+                continue
+
+            # Timed again before being reported, one slow run is often the machine doing something else
+            if name in baseline and t / baseline[name] > threshold:
+                t = min(t, run_bench(bench))
+        except Exception:
+            print(f"{name:<60} FAILED")
+            traceback.print_exc()
+            continue
+
+        results[name] = t
+
+        line = f"{name:<60} {format_time(t):>12}"
+        if name in baseline:
+            ratio = t / baseline[name]
+            line += f"  {ratio:5.2f}x baseline"
+            if ratio > threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+
+    with open(RESULTS_PATH, "w") as f:
+        json.dump({"machine": machine_info(), "time": time.time(), "results": results}, f, indent=2)
+
+    if save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({"machine": machine_info(), "time": time.time(), "results": {**baseline, **results}}, f, indent=2)
+        print(f"\nSaved baseline to {BASELINE_PATH}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Synthetic node payloads and recorded data loaders shared by the benchmarks."""
+import csv
+import os
+import random
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+VECTORS_DATASET_PATH = os.path.join(BENCH_DIR, "..", "arduino_output", "vectors_dataset.csv")
+
+SHORT_NAMES = ["LA", "RA", "LL", "RL"]
+LONG_NAMES = ["LEFT_ARM", "RIGHT_ARM", "LEFT_LEG", "RIGHT_LEG"]
+
+
+def load_vectors_dataset(limit=None) -> list:
+    """Rows of (x, y, z) from arduino_output/vectors_dataset.csv."""
+    rows = []
+    with open(VECTORS_DATASET_PATH, "r") as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            # Skip rows with missing values
+            if "" in row or "NaN" in row:
+                continue
+            rows.append([float(x) for x in row])
+            if limit is not None and len(rows) >= limit:
+                break
+    return rows
+
+
+def mpu_reading(rng, acc=None):
+    """MPU values in the units of the nodes: scaled integers (see convert_test_data.ipynb)."""
+    return {
+        "a": [round(x) for x in acc] if acc is not None else [rng.randint(-2000, 2000) for _ in range(3)],
+        "g": [rng.randint(-1000, 1000) for _ in range(3)],
+        "q": [rng.randint(-1000, 1000) for _ in range(4)],
+        "e": [rng.randint(-180, 180) for _ in range(3)],
+    }
+
+
+def node_payload(rng, arm=True, acc=None) -> dict:
+    """Payload as sent by a node: three MPUs and two QMCs on the arms, one MPU and no QMC on the legs."""
+    if arm:
+        return {
+            "mpu": [mpu_reading(rng, acc), mpu_reading(rng), mpu_reading(rng)],
+            "qmc": [{"m": [rng.randint(-5000, 5000) for _ in range(3)]} for _ in range(2)],
+        }
+    return {"mpu": [mpu_reading(rng, acc)], "qmc": None}
+
+
+def combined_frames(n, seed=0, recorded=None) -> list:
+    """Combined frames in the form sent by bleak_client. Left arm acceleration comes from `recorded` rows if given."""
+    rng = random.Random(seed)
+    frames = []
+    for i in range(n):
+        acc = recorded[i % len(recorded)] if recorded else None
+        frame = {"t": 1717000000.0 + i * 0.120}
+        for j, sn in enumerate(SHORT_NAMES):
+            frame[sn] = {"d": node_payload(rng, arm=j < 2, acc=acc if j == 0 else None), "s": 1}
+        frames.append(frame)
+    return frames
+
+
+def legacy_frames(n, seed=0) -> list:
+    """Frames in the older format saved by Peripheral_Central_Combined (used by convert_test_data.ipynb)."""
+    rng = random.Random(seed)
+    frames = []
+    for i in range(n):
+        frame = {"time": 1717000000.0 + i * 0.200}
+        for j, name in enumerate(LONG_NAMES):
+            frame[name] = node_payload(rng, arm=j < 2)
+        frames.append(frame)
+    return frames
+
+
+def column_names_lines() -> list:
+    """A reduced column_names.txt in the OPPORTUNITY format."""
+    lines = ["Data columns:", "Column: 1 MILLISEC; value = round(original_value), unit = ms"]
+    for i in range(2, 38):
+        lines.append(f"Column: {i} Accelerometer SENSOR{i // 3} acc{'XYZ'[i % 3]}; value = round(original_value), unit = milli g")
+    lines.append("Label columns:")
+    lines += ["Column: 38 Locomotion", "Column: 39 HL_Activity"]
+    return lines
+
+
+def label_legend_lines() -> list:
+    lines = ["Unique index   -   Track name   -   Label name", ""]
+    lines += [f"{i}   -   Locomotion   -   {name}" for i, name in [(1, "Stand"), (2, "Walk"), (4, "Sit"), (5, "Lie")]]
+    lines += [f"{100 + i}   -   HL_Activity   -   {name}" for i, name in enumerate(["Relaxing", "Coffee time", "Early morning"], 1)]
+    return lines
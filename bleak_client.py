@@ -1,13 +1,18 @@
+import time
+
+# Used to report how long startup takes
+IMPORT_START_TIME = time.perf_counter()
+
+import argparse
 import asyncio
 import concurrent.futures
 import datetime
 from enum import IntEnum
 import json
 import logging
-import time
+import queue
 from collections import deque
 from typing import Optional
-import subprocess
 
 from bluez_peripheral.gatt.service import Service
 from bluez_peripheral.gatt.characteristic import characteristic, CharacteristicFlags as CharFlags
@@ -15,33 +20,39 @@ from bluez_peripheral.util import Adapter, get_message_bus
 from bluez_peripheral.advert import Advertisement
 from bluez_peripheral.agent import NoIoAgent
 
-import colorlog
 import msgpack
 import lz4.frame
 from bleak import BleakClient, BleakScanner, BLEDevice
 from bleak.backends.characteristic import BleakGATTCharacteristic
 
-from debug_helper import get_data_cycle
-JSON_DATA_CYCLE = get_data_cycle()
+from device_registry import DeviceRegistry
+import frame_codec
+import frame_schema
+from frame_store import FrameStore
+from fanout import FanOut, Subscriber
+import metrics
+from hub_logging import EventAggregator, get_logger
+import profiler
+from profiler import SPANS
+from watchdog import Watchdog
 
 SERVICE_UUID = "4fafc201-1fb5-459e-8fcc-c5c9c331914b"
 CHARACTERISTIC_UUID = "beb5483e-36e1-4688-b7f5-ea07361b26a8"
 
-DEVICES = [
-    "08:D1:F9:C7:14:DE",  # ESP32 DevkitC v4 1 (Left arm)
-    "08:D1:F9:DF:D7:BA",  # ESP32 DevkitC v4 2 (Right arm)
-    "CD:C8:D6:CF:45:50",  # XIAO 1 (Left leg)
-    "D9:4D:33:22:7F:55",  # XIAO 2 (Right leg)
+# Extra subscriber slots, each with its own profile and pacing (see fanout.py)
+SLOT_CHARACTERISTIC_UUIDS = [
+    "beb5483e-36e1-4688-b7f5-ea07361b26a9",
+    "beb5483e-36e1-4688-b7f5-ea07361b26aa",
+    "beb5483e-36e1-4688-b7f5-ea07361b26ab",
 ]
+# Clients write msgpack {"slot": i, "profile": ..., "every": N, "interval": seconds} here to configure a slot
+SLOT_CONFIG_CHARACTERISTIC_UUID = "beb5483e-36e1-4688-b7f5-ea07361b26ac"
 
-DEVICE_NAMES = [
-    "LEFT_ARM",
-    "RIGHT_ARM",
-    "LEFT_LEG",
-    "RIGHT_LEG",
-]
+# Sensor nodes, loaded from devices.json (nodes can be added or retired while running)
+registry = DeviceRegistry.load()
 
-DEVICE_SHORT_NAMES = [''.join([x[0] for x in dn.split('_')]) for dn in DEVICE_NAMES]
+# Seconds between checks for changes in devices.json
+REGISTRY_RELOAD_INTERVAL = 2.0
 
 class NodeStatus(IntEnum):
     UNAVAILABLE = 0  # Device was not found at the start
@@ -54,8 +65,9 @@ class TimedQueue:
         self.threshold = time_threshold
         self.queue = deque()
 
-    def put(self, value):
-        now = time.time()
+    def put(self, value, now=None):
+        if now is None:
+            now = time.time()
         self.queue.append((now, value))
         self.discard_old_values(now)
 
@@ -94,41 +106,118 @@ class CentralService(Service):
     def __init__(self):
         super().__init__(SERVICE_UUID, True)
 
+        # Default profiles of the slots, can be changed by clients through the config characteristic
+        slots = [self.slot_0, self.slot_1, self.slot_2]
+        self.fanout = FanOut([
+            Subscriber(slot.changed, profile, is_active=lambda slot=slot: slot._notify)
+            for slot, profile in zip(slots, ["raw", "features", "labels"])
+        ])
+
     @characteristic(CHARACTERISTIC_UUID, CharFlags.NOTIFY)
     def combined_data(self, options): ...
 
+    @characteristic(SLOT_CHARACTERISTIC_UUIDS[0], CharFlags.NOTIFY)
+    def slot_0(self, options): ...
+
+    @characteristic(SLOT_CHARACTERISTIC_UUIDS[1], CharFlags.NOTIFY)
+    def slot_1(self, options): ...
+
+    @characteristic(SLOT_CHARACTERISTIC_UUIDS[2], CharFlags.NOTIFY)
+    def slot_2(self, options): ...
+
+    @characteristic(SLOT_CONFIG_CHARACTERISTIC_UUID, CharFlags.WRITE)
+    def slot_config(self, options): ...
+
+    @slot_config.setter
+    def slot_config(self, value, options):
+        try:
+            self.fanout.configure(value)
+        except Exception as e:
+            logger.error(f"Invalid slot config {bytes(value)}: {e}")
+
     def update_combined_data(self, data):
         """Note that notification is asynchronous (you must await something at some point after calling this)."""
         self.combined_data.changed(data)
 
+    def publish(self, kind, frame, use_single_float=False):
+        """Offer a frame to the subscriber slots. Each slot sends at its own pace from its own task."""
+        self.fanout.publish(kind, frame, use_single_float)
+
 
 DATA_VALIDITY_THRESHOLD = 0.300
 
-bleak_clients: list[Optional[BleakClient]] = [None] * len(DEVICES)
-client_statuses = [NodeStatus.UNAVAILABLE] * len(DEVICES)
+# Per-device state, keyed by address
+bleak_clients: dict[str, Optional[BleakClient]] = {}
+client_statuses: dict[str, NodeStatus] = {}
+notification_queues: dict[str, TimedQueue] = {}
+# Time each device was disconnected at, to measure reconnection time
+disconnect_times: dict[str, Optional[float]] = {}
+
 
-notification_queues = [TimedQueue(DATA_VALIDITY_THRESHOLD) for _ in DEVICES]
+def add_device_state(address):
+    bleak_clients[address] = None
+    client_statuses[address] = NodeStatus.UNAVAILABLE
+    notification_queues[address] = TimedQueue(DATA_VALIDITY_THRESHOLD)
+    disconnect_times[address] = None
 
-# Setup logging
-LOG_FORMAT = "%(log_color)s%(asctime)-15s %(name)-8s %(levelname)s: %(message)s"
 
-handler = colorlog.StreamHandler()
-handler.setFormatter(colorlog.ColoredFormatter(LOG_FORMAT))
+def remove_device_state(address):
+    for d in (bleak_clients, client_statuses, notification_queues, disconnect_times):
+        d.pop(address, None)
+    watchdog.unwatch(address)
 
-logger = colorlog.getLogger(__name__)
-logger.addHandler(handler)
-logger.setLevel(logging.INFO)
+
+for _d in registry:
+    add_device_state(_d.address)
+
+# Setup logging (records are written by a background thread)
+logger = get_logger(__name__, logging.INFO)
+
+# Skipped frames are summarized per device instead of logging every one
+skipped_frames_log = EventAggregator(logger, "Skipped %d combined packets due to empty queue for %s in the last %.0fs")
 
 executor = concurrent.futures.ThreadPoolExecutor(max_workers=5)
 
+# Metrics are served at http://127.0.0.1:METRICS_PORT/metrics (None to disable)
+METRICS_PORT = 9100
+# JSON snapshot of the metrics, rewritten every METRICS_STATS_INTERVAL seconds (None to disable)
+METRICS_STATS_FILE = None
+METRICS_STATS_INTERVAL = 10.0
+
+NOTIFICATIONS = metrics.REGISTRY.counter("hub_notifications_total", "Notifications received", "device")
+QUEUE_DEPTH = metrics.REGISTRY.gauge("hub_queue_depth", "Notifications waiting to be combined", "device")
+ALIGNMENT_SPREAD = metrics.REGISTRY.histogram("hub_alignment_spread_seconds", "Time between oldest and newest notification in a combined frame")
+FRAMES_SENT = metrics.REGISTRY.counter("hub_frames_sent_total", "Frames sent over CentralService")
+FRAMES_DROPPED = metrics.REGISTRY.counter("hub_frames_dropped_total", "Combined frames or notifications dropped", "reason")
+ENCODE_TIME = metrics.REGISTRY.histogram("hub_encode_seconds", "msgpack encoding time")
+COMPRESS_TIME = metrics.REGISTRY.histogram("hub_compress_seconds", "lz4 compression time")
+PAYLOAD_SIZE = metrics.REGISTRY.histogram("hub_payload_bytes", "Compressed payload size", metrics.SIZE_BUCKETS)
+RECONNECT_TIME = metrics.REGISTRY.histogram("hub_reconnect_seconds", "Time from disconnection to reconnection", label_name="device")
+
+
+# If set, notifications are passed to notification_sink(address, data) instead of being queued
+# (the ingest process of hub_processes.py writes them into shared memory)
+notification_sink = None
+
 
 def handle_notification(
-    index: int, characteristic: BleakGATTCharacteristic, data: bytearray
+    address: str, characteristic: BleakGATTCharacteristic, data: bytearray
 ):
-    notification_queues[index].put(data)
+    q = notification_queues.get(address)
+    device = registry.get(address)
+    if q is None or device is None:
+        # The device was retired
+        return
 
-    # logger.info(f"Notified by {DEVICE_NAMES[index]}: {data.hex()}")
-    # logger.info(f"Notified by {DEVICE_NAMES[index]}. Queue size: {notification_queues[index].qsize()}")
+    with SPANS.span("handle_notification"):
+        if notification_sink is not None:
+            notification_sink(address, data)
+        else:
+            q.put(data)
+        watchdog.record(address)
+        NOTIFICATIONS.inc(device.short_name)
+
+    # logger.info(f"Notified by {registry.get(address).name}: {data.hex()}")
 
 
 def thread_callback(callback, *args):
@@ -137,18 +226,34 @@ def thread_callback(callback, *args):
     loop.run_in_executor(executor, callback, *args)
 
 
-def disconnect_client(index: int, client: BleakClient):
-    logger.error(f"Disconnected from {DEVICE_NAMES[index]}")
-    bleak_clients[index] = None
-    client_statuses[index] = NodeStatus.DISCONNECTED
+def disconnect_client(address: str, client: BleakClient):
+    if bleak_clients.get(address) is not client:
+        # Retired, or already handled
+        return
+
+    logger.error(f"Disconnected from {registry.get(address).name}")
+    bleak_clients[address] = None
+    client_statuses[address] = NodeStatus.DISCONNECTED
+    disconnect_times[address] = time.time()
+    # Watched again once it is reconnected
+    watchdog.pause(address)
 
 
 CONNECTION_TIMEOUT = 8
 
 
-async def add_client(index: int, device: BLEDevice):
+async def start_notifications(address: str, client: BleakClient):
+    # Handle notifications in a separate thread for each client
+    await client.start_notify(
+        CHARACTERISTIC_UUID,
+        callback=lambda ch, d: thread_callback(handle_notification, address, ch, d),
+    )
+
+
+async def add_client(address: str, device: BLEDevice):
+    name = registry.get(address).name
     client = BleakClient(
-        device, disconnected_callback=lambda bc: disconnect_client(index, bc)
+        device, disconnected_callback=lambda bc: disconnect_client(address, bc)
     )
 
     try:
@@ -156,7 +261,7 @@ async def add_client(index: int, device: BLEDevice):
         async with asyncio.timeout(CONNECTION_TIMEOUT):
             await client.connect()
 
-        logger.info(f"Successfully connected to {DEVICE_NAMES[index]}")
+        logger.info(f"Successfully connected to {name}")
 
         # Force discover the services (otherwise characteristic might not be found)
         _ = await client.get_services()
@@ -165,36 +270,121 @@ async def add_client(index: int, device: BLEDevice):
         #     for c in s.characteristics:
         #         print(f'Characteristic: {c.uuid}')
 
-        # Handle notifications in a separate thread for each client
-        await client.start_notify(
-            CHARACTERISTIC_UUID,
-            callback=lambda ch, d: thread_callback(handle_notification, index, ch, d),
-        )
+        await start_notifications(address, client)
+
+        if address not in bleak_clients:
+            # Retired while connecting
+            await client.disconnect()
+            return
 
         # Add the client to the list
-        bleak_clients[index] = client
-        client_statuses[index] = NodeStatus.CONNECTED
+        bleak_clients[address] = client
+        client_statuses[address] = NodeStatus.CONNECTED
+        watchdog.watch(address, registry.get(address).short_name)
+
+        if disconnect_times[address] is not None:
+            RECONNECT_TIME.observe(time.time() - disconnect_times[address], registry.get(address).short_name)
+            disconnect_times[address] = None
     except TimeoutError:
-        logger.error(f"Connection to {DEVICE_NAMES[index]} timed out")
+        logger.error(f"Connection to {name} timed out")
         await client.disconnect()
         return
     except Exception as e:
-        logger.error(f"Error connecting to {DEVICE_NAMES[index]}: {e}")
+        logger.error(f"Error connecting to {name}: {e}")
         await client.disconnect()
         return
 
 
-def restart_bluetooth():
-    subprocess.call(["bluetoothctl", "power", "off"])
-    time.sleep(0.2)
-    subprocess.call(["bluetoothctl", "power", "on"])
-    time.sleep(0.3)
+def disconnect_all():
+    for address, client in list(bleak_clients.items()):
+        if client is not None:
+            disconnect_client(address, client)
+
 
+async def resubscribe(address: str):
+    """Cheapest recovery of a stale device: subscribe to its notifications again."""
+    client = bleak_clients.get(address)
+    if client is None:
+        return
+
+    logger.warning(f"No notifications from {registry.get(address).name}, resubscribing")
+    try:
+        async with asyncio.timeout(CONNECTION_TIMEOUT):
+            await client.stop_notify(CHARACTERISTIC_UUID)
+            await start_notifications(address, client)
+    except Exception as e:
+        logger.error(f"Error resubscribing to {registry.get(address).name}: {e}")
+
+
+async def reconnect_device(address: str) -> bool:
+    """Disconnect only the stale device, it is then scanned for and connected again by check_and_reconnect.
+
+    Returns False if it was already disconnected.
+    """
+    client = bleak_clients.get(address)
+    if client is None:
+        # Already waiting to be reconnected
+        return False
+
+    logger.warning(f"No notifications from {registry.get(address).name}, reconnecting")
+    disconnect_client(address, client)
+    try:
+        async with asyncio.timeout(CONNECTION_TIMEOUT):
+            await client.disconnect()
+    except Exception as e:
+        logger.error(f"Error disconnecting from {registry.get(address).name}: {e}")
+    return True
+
+
+async def restart_bluetooth():
+    """Last resort recovery: power cycle the adapter, without blocking the event loop."""
+    logger.warning("Devices could not be recovered, restarting the Bluetooth adapter")
+
+    # Don't power off the adapter under the scanner
+    while is_scanning:
+        await asyncio.sleep(SCAN_CHECK_INTERVAL)
+
+    disconnect_all()
+
+    for state, delay in (("off", 0.2), ("on", 0.3)):
+        process = await asyncio.create_subprocess_exec("bluetoothctl", "power", state)
+        await process.wait()
+        await asyncio.sleep(delay)
+
+
+# Recovery of devices that stopped notifying (see watchdog.py)
+WATCHDOG_STALE_AFTER = 1.0
+WATCHDOG_ACTION_TIMEOUT = 3.0
+WATCHDOG_MAX_FAILED_RECONNECTS = 3
+WATCHDOG_MIN_RESTART_INTERVAL = 60.0
+WATCHDOG_INTERVAL = 0.5
+
+watchdog = Watchdog(
+    resubscribe,
+    reconnect_device,
+    restart_bluetooth,
+    WATCHDOG_STALE_AFTER,
+    WATCHDOG_ACTION_TIMEOUT,
+    WATCHDOG_MAX_FAILED_RECONNECTS,
+    WATCHDOG_MIN_RESTART_INTERVAL,
+)
+
+
+async def apply_registry_changes():
+    """Start tracking devices added to devices.json and disconnect retired ones."""
+    added, retired = registry.reload_if_changed()
+
+    for d in retired:
+        logger.info(f"Retiring {d.name} ({d.address})")
+        client = bleak_clients.get(d.address)
+        remove_device_state(d.address)
 
-def disconnect_all():
-    for i, client in enumerate(bleak_clients):
         if client is not None:
-            disconnect_client(i, client)
+            await client.disconnect()
+
+    for d in added:
+        logger.info(f"Adding {d.name} ({d.address})")
+        add_device_state(d.address)
 
 
 # Scan parameters
@@ -208,13 +398,12 @@ is_scanning = False
 async def check_and_reconnect():
     global is_scanning
 
-    indices = [i for i in range(len(bleak_clients)) if bleak_clients[i] is None]
-    addresses = [DEVICES[i] for i in indices]
+    addresses = {a for a, bc in bleak_clients.items() if bc is None}
 
-    if len(indices) == 0:
+    if len(addresses) == 0:
         return
 
-    logger.info(f"Scanning for {[DEVICE_NAMES[i] for i in indices]}...")
+    logger.info(f"Scanning for {[registry.get(a).name for a in addresses]}...")
 
     scanned_devices = dict()
 
@@ -224,10 +413,11 @@ async def check_and_reconnect():
             async with asyncio.timeout(SCAN_TIMEOUT):
                 while True:
                     for bd in scanner.discovered_devices:
-                        print((bd.name, bd.address))
-                        if bd.address in addresses:
-                            scanned_devices[bd.address] = bd
-                            client_statuses[indices[addresses.index(bd.address)]] = NodeStatus.RECONNECTING
+                        logger.debug("Discovered %s (%s)", bd.name, bd.address)
+                        address = bd.address.upper()
+                        if address in addresses and address in client_statuses:
+                            scanned_devices[address] = bd
+                            client_statuses[address] = NodeStatus.RECONNECTING
 
                             # Stop once we find all addresses
                             if len(scanned_devices) == len(addresses):
@@ -239,44 +429,91 @@ async def check_and_reconnect():
 
     is_scanning = False
 
-    for bd in scanned_devices.values():
+    for address, bd in scanned_devices.items():
+        if address not in bleak_clients:
+            # Retired while scanning
+            continue
+
         await asyncio.sleep(0.3)  # Sleep for a while before connecting
         logger.info(f"Connecting to {bd.name} at {bd.address}")
-        await add_client(indices[addresses.index(bd.address)], bd)
+        await add_client(address, bd)
 
 
 # Intervals in seconds
 MAIN_LOOP_INTERVAL = 0.120
 MAX_MCU_TIME_DIFFERENCE = 0.150
 
-MAX_CONSECUTIVE_FAIL = 15
-consecutive_empty_packet_count = 0
+# What is sent to the server Pi: "raw" combined frames, "features" computed over sliding windows,
+# or "labels" predicted by the model at INFERENCE_MODEL_PATH
+PAYLOAD_MODE = "raw"
+FEATURE_WINDOW_SIZE = 32
+FEATURE_HOP = 16
+# If set, features are computed over frames resampled every RESAMPLE_PERIOD seconds instead of the uneven
+# combined frames (see resample.py)
+RESAMPLE_PERIOD = None
+RESAMPLE_MAX_GAP = 0.200
+
+# Exported model (.onnx or pickled scikit-learn). If set, the latest predicted label is added to raw frames as "p"
+INFERENCE_MODEL_PATH = None
+INFERENCE_BATCH_SIZE = 4
+
+# Filter applied to every vector of the combined frames before they are used: None, "kalman" or "lowpass"
+# (see filters.py). The Kalman filter uses the time between the frames, the low-pass is made for one frame every
+# MAIN_LOOP_INTERVAL seconds, and both start over on channels without values for filters.MAX_GAP seconds.
+FRAME_FILTER = None
+KALMAN_PROCESS_NOISE = 1.0
+KALMAN_MEASUREMENT_NOISE = 1.0
+LOWPASS_CUTOFF = 2.0
+
+# Orientation ("q" and "e") fused on the hub for the MPUs that don't send it (see fusion.py): None or "madgwick".
+# FUSION_MAGNETOMETERS pairs MPUs with a QMC of the same node, e.g. {"LA.mpu0": "qmc0"}
+ORIENTATION_FUSION = None
+FUSION_BETA = 0.1
+FUSION_MAGNETOMETERS = {}
+# rad/s per unit of the gyroscope values of the nodes (None for fusion.GYRO_SCALE, degrees per second)
+FUSION_GYRO_SCALE = None
+
+# Encoding of raw frames: "msgpack" (lz4 compressed maps) or "packed" (fixed int16 layout, see frame_schema.py)
+FRAME_FORMAT = "msgpack"
+
+# Local UDP port of dashboard.py (None to disable). The combined frames, and the node statuses and drop counts every
+# DASHBOARD_STATUS_INTERVAL seconds, are sent without blocking and dropped if the socket buffer is full
+DASHBOARD_PORT = None
+DASHBOARD_STATUS_INTERVAL = 1.0
+
+
+def unpack_node_payload(data) -> dict:
+    # Nodes send msgpack maps, or the fixed layout of frame_schema.py
+    if frame_schema.is_packed(data):
+        return frame_schema.unpack_node_dict(data)
+    return msgpack.unpackb(data)
 
 
 def combine_data_and_send() -> Optional[dict]:
-    global consecutive_empty_packet_count
+    # Devices currently tracked, in registry order
+    devices = [d for d in registry if d.address in notification_queues]
+    queues = [notification_queues[d.address] for d in devices]
+
+    if len(devices) == 0:
+        return
+
+    for d, q in zip(devices, queues):
+        QUEUE_DEPTH.set(len(q.queue), d.short_name)
 
     while True:
         # Get the latest notification from each queue
         latest_notifications: list[Optional[tuple[float, bytearray]]] = [
-            q.get() if not q.empty() else None for q in notification_queues
+            q.get() if not q.empty() else None for q in queues
         ]
 
         if any(n is None for n in latest_notifications):
-            logger.warning(f"Skipping combined packet due to empty queues: {[DEVICE_NAMES[i] for i, n in enumerate(latest_notifications) if n is None]}")
-            consecutive_empty_packet_count += 1
-
-            if consecutive_empty_packet_count > MAX_CONSECUTIVE_FAIL:
-                consecutive_empty_packet_count = 0
-
-                # If all devices appear to be connected, disconnect all of them to force scanning
-                if not any([bc for bc in bleak_clients if bc is None]):
-                    disconnect_all()
-                    restart_bluetooth()
+            for d, n in zip(devices, latest_notifications):
+                if n is None:
+                    skipped_frames_log.add(d.short_name)
+            # Stale devices are recovered by the watchdog
+            FRAMES_DROPPED.inc("empty_queue")
             return
 
-        consecutive_empty_packet_count = 0
-
         # Calculate the time difference between the latest notifications
         time_diff = max(n[0] for n in latest_notifications) - min(
             n[0] for n in latest_notifications
@@ -284,10 +521,11 @@ def combine_data_and_send() -> Optional[dict]:
 
         # While the time difference is greater than the threshold, drop older values from the queue with the oldest
         if time_diff > MAX_MCU_TIME_DIFFERENCE:
+            FRAMES_DROPPED.inc("skew")
             # logger.warning(f"Skipping oldest packet due to time difference between MCUs ({int(time_diff * 1000)}ms)")
 
             # Find the queue with the oldest data
-            min_queue = notification_queues[
+            min_queue = queues[
                 latest_notifications.index(
                     min(latest_notifications, key=lambda n: n[0])
                 )
@@ -299,32 +537,37 @@ def combine_data_and_send() -> Optional[dict]:
 
             continue
         else:
+            ALIGNMENT_SPREAD.observe(time_diff)
+
             # Combine the data from the notifications
             last_i = 0
             try:
                 combined_data = dict()
                 combined_data["t"] = time.time()
 
-                for i, n in enumerate(latest_notifications):
+                for i, (d, n) in enumerate(zip(devices, latest_notifications)):
                     last_i = i
-                    combined_data[DEVICE_SHORT_NAMES[i]] = dict()
-                    combined_data[DEVICE_SHORT_NAMES[i]]["d"] = msgpack.unpackb(n[1])
-                    combined_data[DEVICE_SHORT_NAMES[i]]["s"] = int(client_statuses[i])
-                    # combined_data[DEVICE_SHORT_NAMES[i]]["data"] = json.loads(n[1].decode())
+                    combined_data[d.short_name] = dict()
+                    combined_data[d.short_name]["d"] = unpack_node_payload(n[1])
+                    combined_data[d.short_name]["s"] = int(client_statuses[d.address])
 
                 return combined_data
             except Exception as e:
-                logger.error(f"Error unpacking data from {DEVICE_NAMES[last_i]}: {e}")
-                print(f"Received data:\n{latest_notifications[last_i][1]}")
+                FRAMES_DROPPED.inc("unpack_error")
+                logger.error(f"Error unpacking data from {devices[last_i].name}: {e}")
+                logger.debug("Received data:\n%s", latest_notifications[last_i][1])
                 # print(f'Received data:\n{latest_notifications[last_i][1].decode()}')
                 return
 
 
-def save_file(data):
-    fname = f"/home/raspiserver/Desktop/test_data_06_06/{datetime.datetime.now()}.json"
+SAVE_FOLDER = "/home/raspiserver/Desktop/test_data_06_06"
+
+
+def save_file(data, folder=SAVE_FOLDER):
+    fname = f"{folder}/{datetime.datetime.now()}.json"
 
     try:
-        with open(fname, "w") as f:
+        with SPANS.span("save_file"), open(fname, "w") as f:
             json.dump({"data": data}, f)
 
         logger.info(f"************** Saved {fname} **************\n")
@@ -332,7 +575,118 @@ def save_file(data):
         logger.error(f'Error saving file "{fname}": {e}')
 
 
-async def main():
+async def ingest_main(ring_name):
+    """Only own the connections, and write every notification into the shared ring `ring_name`.
+
+    Run by the ingest process of hub_processes.py, the other processes read the ring.
+    """
+    global notification_sink
+
+    from shm_ring import RingWriter, SharedRing
+
+    ring = SharedRing(ring_name)
+    writer = RingWriter(ring)
+    notification_sink = lambda address, data: writer.write(time.time(), address, int(client_statuses.get(address, 0)), data)
+
+    # Keep a reference so the task is not garbage collected
+    watchdog_task = asyncio.create_task(watchdog.run(WATCHDOG_INTERVAL))
+    last_registry_check = time.time()
+
+    while True:
+        try:
+            if time.time() - last_registry_check >= REGISTRY_RELOAD_INTERVAL:
+                last_registry_check = time.time()
+                await apply_registry_changes()
+
+            # The script will crash on Linux if we create two instances of BleakScanner
+            if not is_scanning:
+                await check_and_reconnect()
+
+            await asyncio.sleep(MAIN_LOOP_INTERVAL)
+        except Exception as e:
+            logger.error(f"Error in ingest loop: {e}")
+
+
+# Seconds between reads of the shared ring when the notifications come from another process
+RING_POLL_INTERVAL = 0.010
+
+
+async def feed_from_ring(ring_name):
+    """Queue the notifications written into the shared ring by the ingest process."""
+    from shm_ring import RingReader, SharedRing
+
+    reader = RingReader(SharedRing(ring_name))
+    while True:
+        for t, address, status, data in reader.read():
+            q = notification_queues.get(address)
+            if q is not None:
+                q.put(data, t)
+                client_statuses[address] = NodeStatus(status)
+
+        await asyncio.sleep(RING_POLL_INTERVAL)
+
+
+def make_frame_filter():
+    # numpy is only imported when a filter is used
+    from filters import Biquad, FrameFilter, KalmanCV
+
+    if FRAME_FILTER == "kalman":
+        return FrameFilter(lambda axes: KalmanCV(axes, MAIN_LOOP_INTERVAL, KALMAN_PROCESS_NOISE, KALMAN_MEASUREMENT_NOISE))
+    if FRAME_FILTER == "lowpass":
+        return FrameFilter(lambda axes: Biquad.lowpass(axes, LOWPASS_CUTOFF, 1 / MAIN_LOOP_INTERVAL))
+    raise ValueError(f"Unknown filter {FRAME_FILTER}")
+
+
+def dashboard_status() -> dict:
+    """Status message of the dashboard feed."""
+    return {
+        "t": time.time(),
+        "status": {d.short_name: int(client_statuses.get(d.address, NodeStatus.UNAVAILABLE)) for d in registry},
+        "drops": FRAMES_DROPPED.snapshot(),
+        "spread": ALIGNMENT_SPREAD.snapshot().get(None),
+    }
+
+
+def make_frame_fusion():
+    # numpy is only imported when fusion is used
+    from fusion import FrameFusion
+
+    if ORIENTATION_FUSION == "madgwick":
+        if FUSION_GYRO_SCALE is not None:
+            return FrameFusion(FUSION_BETA, FUSION_MAGNETOMETERS, gyro_scale=FUSION_GYRO_SCALE)
+        return FrameFusion(FUSION_BETA, FUSION_MAGNETOMETERS)
+    raise ValueError(f"Unknown orientation fusion {ORIENTATION_FUSION}")
+
+
+def check_label_format(model):
+    """Packed raw frames only have room for integer labels: reject other models at startup instead of every frame."""
+    from inference import integer_labels
+
+    if FRAME_FORMAT == "packed" and PAYLOAD_MODE == "raw" and integer_labels(model) is False:
+        raise ValueError(f'{INFERENCE_MODEL_PATH} predicts non-integer labels, which FRAME_FORMAT = "packed" can\'t send')
+
+
+def publish_results(central_service, results_queue) -> dict:
+    """Publish the frames computed by the analytics process, without waiting. Returns the latest frame of each kind."""
+    latest = {}
+    while True:
+        try:
+            kind, frame = results_queue.get_nowait()
+        except queue.Empty:
+            return latest
+
+        central_service.publish(kind, frame, use_single_float=kind == "features")
+        latest[kind] = frame
+
+
+async def main(replay_folder=None, replay_speed=1.0, ring_name=None, results_queue=None):
+    """Combine the notifications and send the frames.
+
+    With `ring_name`, the notifications are read from the shared ring of another process that owns the
+    connections. With `results_queue`, features and predictions are computed by an analytics process instead of
+    here: its (kind, frame) results are published to the subscriber slots and sent as the features and labels
+    payloads.
+    """
     # Alternativly you can request this bus directly from dbus_next.
     bus = await get_message_bus()
 
@@ -351,28 +705,160 @@ async def main():
     advert = Advertisement("CENTRAL_PI", [SERVICE_UUID], 0, timeout=0)
     await advert.register(bus, adapter)
 
+    logger.info("Advertising %.3fs after import", time.perf_counter() - IMPORT_START_TIME)
+
+    if METRICS_PORT is not None:
+        metrics.start_http_server(METRICS_PORT)
+    if METRICS_STATS_FILE is not None:
+        metrics.start_stats_file_writer(METRICS_STATS_FILE, METRICS_STATS_INTERVAL)
+
+    # Send to the subscriber slots from their own tasks
+    central_service.fanout.start()
+
+    if replay_folder is not None:
+        # Replay recorded frames with their original timing instead of combining notifications
+        # (only loaded when requested)
+        from debug_helper import get_data_cycle
+        from replay import ReplayEngine, central_service_sink
+
+        engine = ReplayEngine(get_data_cycle(replay_folder), replay_speed)
+        await engine.run(central_service_sink(central_service))
+        return
+
+    # Keep references so the tasks are not garbage collected
+    if ring_name is not None:
+        feed_task = asyncio.create_task(feed_from_ring(ring_name))
+    else:
+        # Recover stale devices one at a time instead of restarting Bluetooth for all of them
+        watchdog_task = asyncio.create_task(watchdog.run(WATCHDOG_INTERVAL))
+
     count = 0
-    data = []
+    # Sent frames waiting to be saved, as columns instead of nested dicts
+    data = FrameStore()
+    last_registry_check = time.time()
+
+    # numpy is only imported when features or predictions are needed
+    feature_extractor = None
+    resampler = None
+    frame_filter = None
+    frame_fusion = None
+
+    inference_stage = None
+    last_label_time = None
+    # Results of the analytics process not sent as a payload yet, and its latest prediction
+    results = {}
+    latest_label = None
+
+    dashboard_sink = None
+    last_dashboard_status = 0.0
+    if DASHBOARD_PORT is not None:
+        from replay import SocketSink
+
+        dashboard_sink = SocketSink(port=DASHBOARD_PORT)
+    if INFERENCE_MODEL_PATH and results_queue is None:
+        from inference import InferenceStage, load_model
+
+        model = load_model(INFERENCE_MODEL_PATH)
+        check_label_format(model)
+        inference_stage = InferenceStage(model, batch_size=INFERENCE_BATCH_SIZE)
+        inference_stage.start()
 
     while True:
         try:
-            combined_data = combine_data_and_send()
-            # combined_data = next(JSON_DATA_CYCLE)
+            if results_queue is not None:
+                results.update(publish_results(central_service, results_queue))
+                if "labels" in results:
+                    latest_label = results["labels"]["p"]
 
-            if combined_data:
-                # Send combined data to server Pi
-                # Note that after calling the update function, the data will not be sent until an await occurs
-                combined_data_packed = msgpack.packb(combined_data)
-                combined_data_compressed = lz4.frame.compress(combined_data_packed, compression_level=lz4.frame.COMPRESSIONLEVEL_MINHC + 5)
-                central_service.update_combined_data(combined_data_compressed)
+            with SPANS.span("combine_data_and_send"):
+                combined_data = combine_data_and_send()
 
-                if len(combined_data_compressed) >= 512:
-                    logger.error(f"Combined data size ({len(combined_data_compressed)} bytes) exceeds 512 bytes")
+            if combined_data:
+                # Fused from the unfiltered vectors
+                if ORIENTATION_FUSION is not None:
+                    if frame_fusion is None:
+                        frame_fusion = make_frame_fusion()
+                    with SPANS.span("fusion"):
+                        frame_fusion.apply(combined_data)
+
+                if FRAME_FILTER is not None:
+                    if frame_filter is None:
+                        frame_filter = make_frame_filter()
+                    frame_filter.apply(combined_data)
+
+                # Computed by the analytics process when there is one
+                if feature_extractor is None and results_queue is None and (
+                    PAYLOAD_MODE != "raw" or INFERENCE_MODEL_PATH or central_service.fanout.has_active("features")
+                ):
+                    from feature_extraction import FeatureExtractor
+
+                    feature_extractor = FeatureExtractor(FEATURE_WINDOW_SIZE, FEATURE_HOP)
+
+                    if RESAMPLE_PERIOD:
+                        from resample import FrameResampler
+
+                        resampler = FrameResampler(RESAMPLE_PERIOD, RESAMPLE_MAX_GAP)
+
+                # Only get a feature frame once every FEATURE_HOP combined (or resampled) frames
+                features = None
+                if feature_extractor is not None:
+                    for frame in resampler.push(combined_data) if resampler is not None else [combined_data]:
+                        features = feature_extractor.push(frame) or features
+
+                if features and inference_stage is not None:
+                    inference_stage.submit(features)
+
+                # Only send each prediction once
+                labels = None
+                if inference_stage is not None:
+                    latest_label = inference_stage.latest_label
+                    if inference_stage.latest_time != last_label_time:
+                        last_label_time = inference_stage.latest_time
+                        labels = {"t": last_label_time, "p": latest_label}
+
+                if results_queue is not None:
+                    features, labels = results.pop("features", None), results.pop("labels", None)
+
+                if latest_label is not None and PAYLOAD_MODE == "raw":
+                    combined_data["p"] = latest_label
+
+                payload = {"raw": combined_data, "features": features, "labels": labels}[PAYLOAD_MODE]
+
+                if payload:
+                    # Send combined data to server Pi
+                    # Note that after calling the update function, the data will not be sent until an await occurs
+                    if FRAME_FORMAT == "packed" and PAYLOAD_MODE == "raw":
+                        # Small enough without compression
+                        with ENCODE_TIME.time(), SPANS.span("pack"):
+                            combined_data_compressed = frame_schema.pack_combined(payload)
+                    else:
+                        with ENCODE_TIME.time(), SPANS.span("pack"):
+                            combined_data_packed = msgpack.packb(payload, use_single_float=PAYLOAD_MODE == "features")
+                        with COMPRESS_TIME.time(), SPANS.span("compress"):
+                            combined_data_compressed = lz4.frame.compress(combined_data_packed, compression_level=frame_codec.COMPRESSION_LEVEL)
+                    with SPANS.span("update_combined_data"):
+                        central_service.update_combined_data(combined_data_compressed)
+
+                    FRAMES_SENT.inc()
+                    PAYLOAD_SIZE.observe(len(combined_data_compressed))
+
+                    if len(combined_data_compressed) >= 512:
+                        logger.error("Combined data size (%d bytes) exceeds 512 bytes", len(combined_data_compressed))
+
+                central_service.publish("raw", combined_data)
+                # The results of the analytics process are already published by publish_results
+                if features and results_queue is None:
+                    central_service.publish("features", features, use_single_float=True)
+                if labels and results_queue is None:
+                    central_service.publish("labels", labels)
+                if dashboard_sink is not None:
+                    dashboard_sink(combined_data)
 
                 # Only add the data if it's not None
                 data.append(combined_data)
                 if count % 10 == 0:
-                    logger.info(f"Combined data ({len(combined_data_compressed)} bytes): {combined_data}\n\n")
+                    # Lazy formatting, the dict is only converted to a string if debug logging is enabled
+                    logger.debug("Combined data: %s\n\n", combined_data)
                     # logger.info(f"Combined data packed: {combined_data_packed}\n\n")
 
             count += 1
@@ -381,11 +867,22 @@ async def main():
             # This ensures that the last data is saved even if it's less than 10 items
             if len(data) >= 10 or (count >= 20 and len(data) > 0):
                 count = 0
-                # save_file(data)
+                # save_file(data.to_dicts())
                 data.clear()
 
+            skipped_frames_log.poll()
+
+            # Also sent when no frames are combined, e.g. while nodes are disconnected
+            if dashboard_sink is not None and time.time() - last_dashboard_status >= DASHBOARD_STATUS_INTERVAL:
+                last_dashboard_status = time.time()
+                dashboard_sink(dashboard_status())
+
+            if time.time() - last_registry_check >= REGISTRY_RELOAD_INTERVAL:
+                last_registry_check = time.time()
+                await apply_registry_changes()
+
             # The script will crash on Linux if we create two instances of BleakScanner
-            if not is_scanning:
+            if ring_name is None and not is_scanning:
                 await check_and_reconnect()
 
             # Sleep for a while before checking again
@@ -395,8 +892,17 @@ async def main():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Combine sensor node notifications and send them to the server Pi")
+    parser.add_argument("--replay", metavar="FOLDER", help="send recorded frames from FOLDER instead of live data")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="replay speed multiplier, 0 for as fast as possible")
+    profiler.add_arguments(parser)
+    args = parser.parse_args()
+
+    # Sampling profiler on SIGUSR1, span summaries on SIGUSR2
+    profiler.apply_arguments(args, logger)
+
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.replay, args.replay_speed))
     except KeyboardInterrupt:
         disconnect_all()
         logger.info("Disconnected all devices")
@@ -0,0 +1,156 @@
+"""Client library for the frames sent by the hub, using notifications instead of polling reads.
+
+Frames are decoded (lz4+msgpack or the fixed layout of frame_schema.py from bleak_client, or plain msgpack)
+and handed to the application in batches, either through an async iterator or a callback:
+
+    consumer = FrameConsumer(batch_size=10)
+    transport = BleakTransport(HUB_ADDRESS)
+    await transport.start(consumer)
+    async for batch in consumer.batches():
+        ...
+"""
+import asyncio
+import time
+
+import msgpack
+
+import frame_schema
+from frame_codec import decode_frame
+
+SERVICE_UUID = "4fafc201-1fb5-459e-8fcc-c5c9c331914b"
+CHARACTERISTIC_UUID = "beb5483e-36e1-4688-b7f5-ea07361b26a8"
+
+LZ4_FRAME_MAGIC = b"\x04\x22\x4d\x18"
+
+
+def decode_payload(data) -> dict:
+    data = bytes(data)
+    if data[:4] == LZ4_FRAME_MAGIC:
+        return decode_frame(data)
+    if frame_schema.is_packed(data):
+        return frame_schema.unpack_combined_dict(data)
+    return msgpack.unpackb(data)
+
+
+class FrameConsumer:
+    """Decodes notification payloads and groups the frames into batches of up to `batch_size`.
+
+    A batch is also delivered when its first frame is older than `max_delay` seconds. If the application
+    falls behind by more than `max_pending` frames, the oldest ones are dropped.
+    """
+
+    def __init__(self, batch_size=10, max_delay=0.5, max_pending=1000):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+
+        self.queue = asyncio.Queue()
+        self.loop = None
+
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def feed(self, data):
+        """Called with every notification payload, from the event loop thread."""
+        try:
+            frame = decode_payload(data)
+        except Exception:
+            self.errors += 1
+            return
+
+        self.received += 1
+
+        if self.queue.qsize() >= self.max_pending:
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+    def feed_threadsafe(self, data):
+        """Same as `feed`, for callbacks running in another thread (e.g. simplepyble)."""
+        self.loop.call_soon_threadsafe(self.feed, bytes(data))
+
+    async def batches(self):
+        self.loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + self.max_delay
+
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            yield batch
+
+    async def run(self, callback):
+        """Call `callback(batch)` for every batch (can be a coroutine function)."""
+        async for batch in self.batches():
+            result = callback(batch)
+            if asyncio.iscoroutine(result):
+                await result
+
+
+class BleakTransport:
+    def __init__(self, address, characteristic_uuid=CHARACTERISTIC_UUID):
+        self.address = address
+        self.characteristic_uuid = characteristic_uuid
+        self.client = None
+
+    async def start(self, consumer: FrameConsumer):
+        # Only needed for this transport
+        from bleak import BleakClient
+
+        consumer.loop = asyncio.get_running_loop()
+
+        self.client = BleakClient(self.address)
+        await self.client.connect()
+        await self.client.start_notify(self.characteristic_uuid, lambda ch, data: consumer.feed(data))
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.disconnect()
+
+
+class SimplePybleTransport:
+    def __init__(self, peripheral, service_uuid=SERVICE_UUID, characteristic_uuid=CHARACTERISTIC_UUID):
+        """`peripheral` is a connected simplepyble.Peripheral."""
+        self.peripheral = peripheral
+        self.service_uuid = service_uuid
+        self.characteristic_uuid = characteristic_uuid
+
+    async def start(self, consumer: FrameConsumer):
+        consumer.loop = asyncio.get_running_loop()
+
+        # simplepyble calls back from its own thread
+        self.peripheral.notify(self.service_uuid, self.characteristic_uuid, consumer.feed_threadsafe)
+
+    async def stop(self):
+        self.peripheral.unsubscribe(self.service_uuid, self.characteristic_uuid)
+
+
+class LocalTransport:
+    """Subscribes to a characteristic of an in-process service (see mock_gatt.py), a stand-in for the hub."""
+
+    def __init__(self, characteristic):
+        self.characteristic = characteristic
+        self.consumer = None
+
+    async def start(self, consumer: FrameConsumer):
+        consumer.loop = asyncio.get_running_loop()
+        self.consumer = consumer
+        self.characteristic.subscribe(consumer.feed)
+
+    async def stop(self):
+        self.characteristic.unsubscribe(self.consumer.feed)
@@ -0,0 +1,266 @@
+"""Live web view of the hub: the vectors of every node, their status and the frames dropped by the hub.
+
+The hub sends its combined frames, and a status message every DASHBOARD_STATUS_INTERVAL seconds, as UDP datagrams
+to a local port (set DASHBOARD_PORT in bleak_client.py). The datagrams are sent without blocking and dropped when
+nobody reads them, so the hub runs the same with or without the dashboard and however many browsers are open.
+`replay.py` sends recorded frames to the same port:
+
+    python dashboard.py [--port 5005]
+    python replay.py FOLDER --loop
+
+Received frames are kept in a ring shared by the browsers. Every UPDATE_INTERVAL seconds each browser gets the
+frames it hasn't seen yet, decimated to FRAME_BUDGET points per trace, through the `extendData` of its graphs,
+so an update costs the same whatever the rate of the hub.
+"""
+import argparse
+import math
+import socket
+import threading
+import time
+from collections import deque
+
+from dash import Dash, Input, Output, State, callback, dcc, html, no_update
+import plotly.graph_objects as go
+
+from device_registry import DeviceRegistry
+from feature_extraction import iter_vectors
+from frame_codec import decode_frame
+
+DEFAULT_HOST = "127.0.0.1"
+# Same default port as replay.py
+DEFAULT_PORT = 5005
+
+# Seconds between browser updates
+UPDATE_INTERVAL = 0.5
+# Points per trace sent to a browser in one update at most
+FRAME_BUDGET = 25
+# Points kept on each graph
+WINDOW_POINTS = 600
+# Received frames kept for the browsers, those that fall further behind skip to the latest frames
+HISTORY_FRAMES = 2048
+# Largest datagram accepted (frames are under 512 bytes, see bleak_client.py)
+MAX_DATAGRAM = 65536
+
+CHANNELS = [f"mpu{i}.{key}" for i in range(3) for key in ("a", "g")] + [f"qmc{i}.m" for i in range(2)]
+DEFAULT_CHANNEL = "mpu0.a"
+AXES = ("x", "y", "z")
+
+# Names and colors of bleak_client.NodeStatus, without importing the hub (and bleak)
+STATUS_NAMES = {0: "UNAVAILABLE", 1: "CONNECTED", 2: "DISCONNECTED", 3: "RECONNECTING"}
+STATUS_COLORS = {0: "gray", 1: "green", 2: "red", 3: "orange"}
+
+
+class FeedReceiver:
+    """Receives the datagrams of the hub from its own thread.
+
+    Frames are numbered in order of arrival and kept in `frames`, the latest status message is in `status`.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, history=HISTORY_FRAMES):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(1.0)
+
+        self.frames = deque(maxlen=history)
+        self.received = 0
+        self.errors = 0
+        self.status = None
+        self.previous_status = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._receive_loop, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _receive_loop(self):
+        while True:
+            try:
+                data = self.sock.recv(MAX_DATAGRAM)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+            try:
+                message = decode_frame(data)
+            except Exception:
+                self.errors += 1
+                continue
+
+            with self.lock:
+                if "status" in message:
+                    self.previous_status, self.status = self.status, message
+                else:
+                    self.frames.append((self.received, message))
+                    self.received += 1
+
+    def since(self, position):
+        """Frames after `position` (the number of frames received when last called) and the new position."""
+        with self.lock:
+            if not self.frames or position is None:
+                return [], self.received
+
+            skip = max(position - self.frames[0][0], 0)
+            return [frame for _, frame in list(self.frames)[skip:]], self.received
+
+    def close(self):
+        self.sock.close()
+
+
+def decimate(frames, budget=FRAME_BUDGET) -> list:
+    """At most `budget` frames at an even stride, always keeping the latest one."""
+    if len(frames) <= budget:
+        return frames
+
+    stride = math.ceil(len(frames) / budget)
+    return frames[::-stride][::-1]
+
+
+def channel_points(frames, device, channel):
+    """Times (ms since the epoch) and x, y, z values of `channel` of `device` in the frames that have it."""
+    times, values = [], ([], [], [])
+    for frame in frames:
+        entry = frame.get(device)
+        if not isinstance(entry, dict):
+            continue
+
+        v = dict(iter_vectors(entry.get("d"))).get(channel)
+        if v is None:
+            continue
+
+        times.append(frame.get("t", 0) * 1000)
+        for axis, value in zip(values, v):
+            axis.append(value)
+    return times, values
+
+
+def status_rows(status) -> list:
+    """Table rows of the node statuses in a status message."""
+    rows = [html.Tr([html.Th("Node"), html.Th("Status")])]
+    for device, value in (status or {}).get("status", {}).items():
+        rows.append(
+            html.Tr(
+                [
+                    html.Td(device),
+                    html.Td(STATUS_NAMES.get(value, str(value)), style={"color": STATUS_COLORS.get(value, "black")}),
+                ]
+            )
+        )
+    return rows
+
+
+def drop_rows(status, previous) -> list:
+    """Table rows of the frames dropped by the hub, in total and per second since the previous status message."""
+    rows = [html.Tr([html.Th("Dropped"), html.Th("Total"), html.Th("Per second")])]
+    if status is None:
+        return rows
+
+    elapsed = status["t"] - previous["t"] if previous is not None else 0
+    for reason, total in sorted(status.get("drops", {}).items()):
+        before = previous.get("drops", {}).get(reason, 0) if previous is not None else total
+        rate = f"{(total - before) / elapsed:.1f}" if elapsed > 0 else ""
+        rows.append(html.Tr([html.Td(reason), html.Td(total), html.Td(rate)]))
+
+    # Mean time between the oldest and newest notification of the frames since the previous message
+    spread, spread_before = status.get("spread"), (previous or {}).get("spread")
+    if spread and spread_before and spread["count"] > spread_before["count"]:
+        mean = (spread["sum"] - spread_before["sum"]) / (spread["count"] - spread_before["count"])
+        rows.append(html.Tr([html.Td("alignment spread"), html.Td(""), html.Td(f"{mean * 1000:.0f}ms")]))
+    return rows
+
+
+receiver: FeedReceiver = None
+devices = [d.short_name for d in DeviceRegistry.load()]
+
+
+def empty_figure(device, channel):
+    fig = go.Figure([go.Scattergl(x=[], y=[], mode="lines", name=axis) for axis in AXES])
+    fig.update_layout(
+        title=f"{device} {channel}",
+        xaxis_type="date",
+        height=260,
+        margin=dict(l=40, r=20, t=40, b=30),
+        uirevision=channel,
+    )
+    return fig
+
+
+@callback(
+    [Output(f"graph-{device}", "figure") for device in devices],
+    Input("channel-selection", "value"),
+)
+def reset_graphs(channel):
+    return [empty_figure(device, channel) for device in devices]
+
+
+@callback(
+    [Output(f"graph-{device}", "extendData") for device in devices] + [Output("feed-position", "data")],
+    Input("update-interval", "n_intervals"),
+    State("feed-position", "data"),
+    State("channel-selection", "value"),
+)
+def extend_graphs(_, position, channel):
+    # Each browser keeps its own position, so they don't take frames from each other
+    frames, position = receiver.since(position)
+    frames = decimate(frames)
+
+    updates = []
+    for device in devices:
+        times, values = channel_points(frames, device, channel)
+        if times:
+            updates.append((dict(x=[times] * len(AXES), y=list(values)), list(range(len(AXES))), WINDOW_POINTS))
+        else:
+            updates.append(no_update)
+    return updates + [position]
+
+
+@callback(
+    Output("status-table", "children"),
+    Output("drop-table", "children"),
+    Output("feed-info", "children"),
+    Input("update-interval", "n_intervals"),
+)
+def update_status(_):
+    with receiver.lock:
+        status, previous = receiver.status, receiver.previous_status
+
+    age = f", last status {time.time() - status['t']:.1f}s ago" if status is not None else ", no status from the hub yet"
+    info = f"{receiver.received} frames received, {receiver.errors} undecodable datagrams{age}"
+    return status_rows(status), drop_rows(status, previous), info
+
+
+def make_layout():
+    return html.Div(
+        [
+            dcc.Dropdown(CHANNELS, DEFAULT_CHANNEL, clearable=False, id="channel-selection"),
+            html.Div(
+                [html.Table(id="status-table"), html.Table(id="drop-table")],
+                style={"display": "grid", "gridTemplateColumns": "1fr 1fr"},
+            ),
+            html.Div(id="feed-info"),
+            *[dcc.Graph(id=f"graph-{device}") for device in devices],
+            dcc.Interval(interval=UPDATE_INTERVAL * 1000, id="update-interval"),
+            dcc.Store(id="feed-position"),
+        ]
+    )
+
+
+def main():
+    global receiver
+
+    parser = argparse.ArgumentParser(description="Live view of the frames sent by the hub to a local UDP port")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--web-port", type=int, default=8050, help="port of the web page")
+    args = parser.parse_args()
+
+    receiver = FeedReceiver(args.host, args.port)
+    receiver.start()
+
+    app = Dash(__name__, external_stylesheets=["https://codepen.io/chriddyp/pen/bWLwgP.css"])
+    app.layout = make_layout()
+    app.run(port=args.web_port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Partitioned Parquet store for all recorded and reference data.
+
+Sessions are stored under ROOT/subject=S1/pose=walking/date=2024-06-09/device=all/part-*.parquet. Each append
+writes a new file, so existing data is never rewritten. Columns follow column_names.txt (time in ms as int64,
+sensor values as float32 and labels as int32), other tables (e.g. arduino_output) keep their own columns.
+
+Reading only loads the selected columns, and partition filters and predicates on columns are pushed down to
+skip files and row groups:
+
+    store = DatasetStore("dataset")
+    df = store.read(["1 MILLISEC", "8 Acc LUA^ accX"], [("1 MILLISEC", "<", 60000)], subject="S1", pose="walking")
+
+Files can be imported with:
+
+    python dataset_store.py import FILE --subject S1 --pose walking [--date 2024-06-09] [--device all] [--root dataset]
+
+Needs pyarrow (pip install pyarrow).
+"""
+import argparse
+import datetime
+import os
+import re
+import time
+
+import pandas as pd
+
+from add_col_names import COLUMN_NAMES, read_column_names
+
+DEFAULT_ROOT = "dataset"
+PARTITION_KEYS = ("subject", "pose", "date", "device")
+
+# Device partition of tables with the columns of every device
+ALL_DEVICES = "all"
+
+# Rows per Parquet row group, the unit skipped by predicate pushdown
+ROW_GROUP_SIZE = 16384
+
+# e.g. "12 Stand" in .new.csv label columns
+LABEL_NUMBER = re.compile(r"^\s*(-?\d+)")
+
+
+def load_column_names(path=COLUMN_NAMES):
+    with open(path, "r") as f:
+        return read_column_names(f.readlines())
+
+
+def make_schema(data_names, label_names):
+    # Only needed when the store is used
+    import pyarrow as pa
+
+    fields = [pa.field(data_names[0], pa.int64())]
+    fields += [pa.field(name, pa.float32()) for name in data_names[1:]]
+    fields += [pa.field(name, pa.int32()) for name in label_names]
+    return pa.schema(fields)
+
+
+def parse_labels(column: pd.Series) -> pd.Series:
+    """Label numbers of a column with "num label" values (see add_col_names.add_labels)."""
+    if pd.api.types.is_numeric_dtype(column):
+        return column
+    return column.astype("string").str.extract(LABEL_NUMBER, expand=False).astype("Int32")
+
+
+class DatasetStore:
+    def __init__(self, root=DEFAULT_ROOT, column_names_path=COLUMN_NAMES):
+        self.root = root
+
+        self.schema = None
+        self.label_names = []
+        if column_names_path is not None and os.path.exists(column_names_path):
+            data_names, self.label_names = load_column_names(column_names_path)
+            self.schema = make_schema(data_names, self.label_names)
+
+    def _partition_path(self, partition):
+        parts = [f"{key}={partition[key]}" for key in PARTITION_KEYS]
+        return os.path.join(self.root, *parts)
+
+    def append(self, df: pd.DataFrame, subject, pose, date=None, device=ALL_DEVICES) -> str:
+        """Write a new session part. Returns the path of the written file."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if date is None:
+            date = datetime.date.today().isoformat()
+
+        if self.schema is not None and list(df.columns) == self.schema.names:
+            df = df.copy()
+            for name in self.label_names:
+                df[name] = parse_labels(df[name])
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False, safe=False)
+        else:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+
+        folder = self._partition_path({"subject": subject, "pose": pose, "date": date, "device": device})
+        os.makedirs(folder, exist_ok=True)
+
+        path = os.path.join(folder, f"part-{time.time_ns()}.parquet")
+        pq.write_table(table, path, row_group_size=ROW_GROUP_SIZE)
+        return path
+
+    def dataset(self):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        # Partition values are always strings (e.g. dates are not parsed)
+        partitioning = ds.partitioning(pa.schema([(key, pa.string()) for key in PARTITION_KEYS]), flavor="hive")
+        return ds.dataset(self.root, format="parquet", partitioning=partitioning)
+
+    def _filter(self, filters, partition):
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        expression = pq.filters_to_expression(filters) if filters else None
+        for key, value in partition.items():
+            if key not in PARTITION_KEYS:
+                raise ValueError(f"Unknown partition key {key}, expected one of {PARTITION_KEYS}")
+            if value is None:
+                continue
+
+            condition = ds.field(key) == str(value)
+            expression = condition if expression is None else expression & condition
+
+        return expression
+
+    def read(self, columns=None, filters=None, **partition) -> pd.DataFrame:
+        """Read `columns` (all if None) of the rows matching `filters` (e.g. [("1 MILLISEC", ">=", 1000)])
+        in the partitions matching `partition` (e.g. subject="S1", pose="walking").
+        """
+        table = self.dataset().to_table(columns=columns, filter=self._filter(filters, partition))
+        return table.to_pandas()
+
+    def columns(self) -> list:
+        """Column names, read from the file footers only."""
+        return [name for name in self.dataset().schema.names if name not in PARTITION_KEYS]
+
+    def sessions(self) -> list:
+        """Partition values of every stored session."""
+        sessions = []
+        for folder, _, files in os.walk(self.root):
+            if not any(f.endswith(".parquet") for f in files):
+                continue
+
+            parts = os.path.relpath(folder, self.root).split(os.sep)
+            sessions.append(dict(p.split("=", 1) for p in parts))
+        return sessions
+
+
+def read_source(path, column_names_path=COLUMN_NAMES) -> pd.DataFrame:
+    """Read one of the text formats in use: comma separated files with a header (.new.csv, arduino_output)
+    or space separated files without one (converted test data and OPPORTUNITY files).
+    """
+    with open(path, "r") as f:
+        first_line = f.readline()
+
+    if "," in first_line:
+        return pd.read_csv(path, na_values="NaN")
+
+    data_names, label_names = load_column_names(column_names_path)
+    names = data_names + label_names
+    df = pd.read_csv(path, sep=" ", header=None, na_values="NaN")
+    df.columns = names[: len(df.columns)]
+
+    # Converted test data has no label columns
+    for name in names[len(df.columns):]:
+        df[name] = pd.array([pd.NA] * len(df), dtype="Int32")
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Partitioned Parquet dataset store")
+    parser.add_argument("--root", default=DEFAULT_ROOT)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="append a text file as a new session part")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--subject", required=True)
+    import_parser.add_argument("--pose", required=True)
+    import_parser.add_argument("--date")
+    import_parser.add_argument("--device", default=ALL_DEVICES)
+
+    subparsers.add_parser("list", help="list the stored sessions")
+
+    args = parser.parse_args()
+    store = DatasetStore(args.root)
+
+    if args.command == "import":
+        df = read_source(args.file)
+        path = store.append(df, args.subject, args.pose, args.date, args.device)
+        print(f"Wrote {len(df)} rows to {path}")
+    else:
+        for session in store.sessions():
+            print(" ".join(f"{k}={session.get(k)}" for k in PARTITION_KEYS))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,46 @@
 import json
 import os
-from itertools import cycle
-
-DEVICE_NAMES_MAP = {
-    "LEFT_ARM": 'LA',
-    "RIGHT_ARM": 'RA',
-    "LEFT_LEG": 'LL',
-    "RIGHT_LEG": 'RL',
-}
-
-test_folder = '../../train/stand'
-
-# Get all files after the start file (including it)
-files = os.listdir(test_folder)
-files = sorted(files)
-
-# Collect all data points into one list
-json_data = []
-for file in files:
-    with open(os.path.join(test_folder, file), 'r') as f:
-        dic = json.load(f)
-        json_data.extend(dic['data'])
-
-new_data = list()
-for point in json_data:
-    new_data.append({})
+
+from device_registry import DeviceRegistry
+
+# e.g. LEFT_ARM -> LA
+DEVICE_NAMES_MAP = {d.name: d.short_name for d in DeviceRegistry.load()}
+
+TEST_FOLDER = '../../train/stand'
+
+
+def convert_point(point):
+    """Convert a point saved by Peripheral_Central_Combined to the combined frame format sent by bleak_client."""
+    new_point = {}
     for device in point:
         if device == 'time':
-            new_data[-1]['t'] = point[device]
+            new_point['t'] = point[device]
             continue
 
-        new_data[-1][DEVICE_NAMES_MAP[device]] = {}
-        new_data[-1][DEVICE_NAMES_MAP[device]]['d'] = point[device]
-        new_data[-1][DEVICE_NAMES_MAP[device]]['s'] = 1
-        
+        new_point[DEVICE_NAMES_MAP[device]] = {}
+        new_point[DEVICE_NAMES_MAP[device]]['d'] = point[device]
+        new_point[DEVICE_NAMES_MAP[device]]['s'] = 1
+
+    return new_point
+
+
+def iter_recorded_frames(test_folder=TEST_FOLDER):
+    """Stream the converted frames of every file in the folder, loading one file at a time."""
+    for file in sorted(os.listdir(test_folder)):
+        with open(os.path.join(test_folder, file), 'r') as f:
+            dic = json.load(f)
+
+        for point in dic['data']:
+            yield convert_point(point)
+
+
+def get_data_cycle(test_folder=TEST_FOLDER):
+    """Endlessly replay the recorded frames. Files are read again on every pass instead of being kept in memory."""
+    while True:
+        empty = True
+        for point in iter_recorded_frames(test_folder):
+            empty = False
+            yield point
 
-def get_data_cycle():
-    return cycle(new_data)
+        if empty:
+            raise ValueError(f"No recorded frames in {test_folder}")
@@ -0,0 +1,133 @@
+"""Registry of the sensor nodes (MAC address -> body location and short name), loaded from devices.json.
+
+The file can be edited while the hub is running; `reload_if_changed()` picks up added and retired nodes.
+"""
+import json
+import os
+from collections import Counter
+
+from hub_logging import get_logger
+
+DEVICES_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.json")
+
+logger = get_logger(__name__)
+
+
+class Device:
+    def __init__(self, address, name, short_name=None, description=""):
+        self.address = address.upper()
+        self.name = name
+        # e.g. LEFT_ARM -> LA
+        self.short_name = short_name or "".join(x[0] for x in name.split("_"))
+        self.description = description
+
+    def __repr__(self):
+        return f"Device({self.address}, {self.name})"
+
+    def to_dict(self):
+        return {"address": self.address, "name": self.name, "short_name": self.short_name, "description": self.description}
+
+
+class DeviceRegistry:
+    def __init__(self, devices=(), path=None):
+        self.path = path
+        self.mtime = None
+        # Modification time of a version of the file that was rejected, so it's only reported once
+        self.rejected_mtime = None
+        # Insertion order is the order of the devices in the file
+        self.devices: dict[str, Device] = {}
+        self.by_short_name: dict[str, Device] = {}
+
+        for d in devices:
+            self.add(d)
+
+    @classmethod
+    def load(cls, path=DEVICES_CONFIG) -> "DeviceRegistry":
+        registry = cls(path=path)
+        registry.mtime = os.path.getmtime(path)
+        for d in cls._read(path):
+            registry.add(d)
+        return registry
+
+    @staticmethod
+    def _read(path) -> list:
+        with open(path, "r") as f:
+            return [Device(**d) for d in json.load(f)["devices"]]
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(list(self.devices.values()))
+
+    def __contains__(self, address):
+        return address.upper() in self.devices
+
+    def get(self, address) -> "Device | None":
+        return self.devices.get(address.upper())
+
+    def addresses(self) -> list:
+        return list(self.devices)
+
+    def add(self, device: Device):
+        if device.short_name in self.by_short_name and self.by_short_name[device.short_name].address != device.address:
+            raise ValueError(f"Short name {device.short_name} is already used by {self.by_short_name[device.short_name]}")
+
+        self.devices[device.address] = device
+        self.by_short_name[device.short_name] = device
+
+    def retire(self, address) -> "Device | None":
+        device = self.devices.pop(address.upper(), None)
+        if device is not None:
+            self.by_short_name.pop(device.short_name, None)
+        return device
+
+    def save(self, path=None):
+        path = path or self.path
+        with open(path, "w") as f:
+            json.dump({"devices": [d.to_dict() for d in self]}, f, indent=4)
+        self.mtime = os.path.getmtime(path)
+
+    def reload_if_changed(self) -> tuple[list, list]:
+        """Re-read the config file if it was modified. Returns the (added, retired) devices.
+
+        A file where two devices have the same short name is rejected as a whole, the registry is left unchanged
+        until the file is fixed.
+        """
+        if self.path is None:
+            return [], []
+
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self.mtime or mtime == self.rejected_mtime:
+                return [], []
+
+            new_devices = {d.address: d for d in self._read(self.path)}
+        except (OSError, ValueError, TypeError, KeyError):
+            # The file may be half written, try again next time
+            return [], []
+
+        conflicts = [name for name, count in Counter(d.short_name for d in new_devices.values()).items() if count > 1]
+        if conflicts:
+            self.rejected_mtime = mtime
+            logger.error("Ignoring %s: short names %s are used by several devices", self.path, conflicts)
+            return [], []
+
+        self.mtime = mtime
+
+        retired = [self.retire(a) for a in list(self.devices) if a not in new_devices]
+        added = []
+        for address, d in new_devices.items():
+            old = self.devices.get(address)
+            if old is None:
+                added.append(d)
+            elif (old.name, old.short_name) != (d.name, d.short_name):
+                # Treat a renamed device as retired and added again
+                retired.append(self.retire(address))
+                added.append(d)
+
+        # Every device that kept its short name is in new_devices, so these can't conflict
+        for d in added:
+            self.add(d)
+
+        return added, retired
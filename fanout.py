@@ -0,0 +1,119 @@
+"""Fan-out of hub frames to several subscribers, each with its own payload profile and pacing.
+
+Every subscriber has a single pending payload that is replaced by newer ones, and its own sending task,
+so a slow subscriber only drops its own frames and never holds back the others.
+"""
+import asyncio
+import time
+
+import msgpack
+
+from frame_codec import encode_frame
+
+PROFILES = ("raw", "features", "labels")
+
+
+class Subscriber:
+    def __init__(self, notify, profile="raw", every=1, min_interval=0.0, is_active=None):
+        """`notify(bytes)` sends a payload, `is_active()` tells whether anyone is listening (always if None)."""
+        self.notify = notify
+        self.is_active = is_active
+        self.profile = profile
+        self.every = every
+        self.min_interval = min_interval
+
+        self.pending = None
+        self.event = asyncio.Event()
+        self.frame_count = 0
+        self.last_sent = 0.0
+
+        self.sent = 0
+        self.dropped = 0
+
+    def configure(self, profile=None, every=None, min_interval=None):
+        if profile is not None:
+            if profile not in PROFILES:
+                raise ValueError(f"Unknown profile {profile}")
+            self.profile = profile
+        if every is not None:
+            self.every = max(1, int(every))
+        if min_interval is not None:
+            self.min_interval = max(0.0, float(min_interval))
+
+        self.frame_count = 0
+
+    def wants(self, kind) -> bool:
+        """Whether the next frame of `kind` should be sent to this subscriber (applies decimation)."""
+        if kind != self.profile or (self.is_active is not None and not self.is_active()):
+            return False
+
+        self.frame_count += 1
+        return (self.frame_count - 1) % self.every == 0
+
+    def offer(self, payload: bytes):
+        if self.pending is not None:
+            # The previous payload was not sent in time, the newer one replaces it
+            self.dropped += 1
+
+        self.pending = payload
+        self.event.set()
+
+    async def run(self):
+        while True:
+            await self.event.wait()
+            self.event.clear()
+
+            delay = self.last_sent + self.min_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            payload, self.pending = self.pending, None
+            if payload is None:
+                continue
+
+            self.notify(payload)
+            self.last_sent = time.monotonic()
+            self.sent += 1
+
+
+class FanOut:
+    def __init__(self, subscribers=None):
+        self.subscribers: list[Subscriber] = subscribers or []
+        self.tasks = []
+
+    def add(self, subscriber: Subscriber) -> Subscriber:
+        self.subscribers.append(subscriber)
+        if self.tasks:
+            self.tasks.append(asyncio.create_task(subscriber.run()))
+        return subscriber
+
+    def start(self):
+        self.tasks = [asyncio.create_task(s.run()) for s in self.subscribers]
+
+    def stop(self):
+        for t in self.tasks:
+            t.cancel()
+        self.tasks = []
+
+    def has_active(self, profile) -> bool:
+        return any(s.profile == profile and (s.is_active is None or s.is_active()) for s in self.subscribers)
+
+    def publish(self, kind, frame, use_single_float=False):
+        """Offer a frame of `kind` ("raw", "features" or "labels") to the subscribers using that profile.
+
+        The frame is only encoded if at least one subscriber takes it, and only once for all of them.
+        """
+        encoded = None
+        for s in self.subscribers:
+            if s.wants(kind):
+                if encoded is None:
+                    encoded = encode_frame(frame, use_single_float)
+                s.offer(encoded)
+
+    def configure(self, data: bytes):
+        """Apply a msgpack config written by a client, e.g. {"slot": 1, "profile": "features", "every": 2, "interval": 0.5}."""
+        config = msgpack.unpackb(bytes(data))
+        self.subscribers[config["slot"]].configure(config.get("profile"), config.get("every"), config.get("interval"))
+
+    def stats(self) -> list:
+        return [{"profile": s.profile, "sent": s.sent, "dropped": s.dropped} for s in self.subscribers]
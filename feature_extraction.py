@@ -0,0 +1,148 @@
+"""Streaming sliding-window HAR features computed on the hub from combined frames."""
+import numpy as np
+
+# Keys of the 3-axis vectors inside a node payload (see convert_test_data.ipynb)
+VECTOR_KEYS = ("a", "g", "m")
+SENSOR_BLOCKS = ("mpu", "qmc")
+
+# Recompute the running sums from the buffer every this many windows to avoid float drift
+RESYNC_WINDOWS = 8
+
+
+def iter_vectors(device_data):
+    """Yield (channel_name, xyz) for every 3-axis vector in a node payload, e.g. ("mpu0.a", [x, y, z])."""
+    if not device_data:
+        return
+
+    for block in SENSOR_BLOCKS:
+        for i, sensor in enumerate(device_data.get(block) or []):
+            if not sensor:
+                continue
+
+            for key in VECTOR_KEYS:
+                v = sensor.get(key)
+                if v is not None and len(v) == 3:
+                    yield f"{block}{i}.{key}", v
+
+
+class SlidingWindow:
+    """Fixed-size window of 3-axis samples with running sums for O(1) statistics per sample."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.buffer = np.zeros((size, 3), dtype=np.float64)
+        self.magnitudes = np.zeros(size, dtype=np.float64)
+        self.index = 0
+        self.count = 0
+        self.pushes = 0
+
+        self.sum = np.zeros(3)
+        self.sum_sq = np.zeros(3)
+        # Cross products in the order xy, xz, yz
+        self.sum_cross = np.zeros(3)
+        self.sum_mag = 0.0
+
+    @staticmethod
+    def _cross(v):
+        return np.array([v[0] * v[1], v[0] * v[2], v[1] * v[2]])
+
+    def push(self, value):
+        v = np.asarray(value, dtype=np.float64)
+        mag = float(np.sqrt(v @ v))
+
+        if self.count == self.size:
+            # Remove the sample that is about to be overwritten
+            old = self.buffer[self.index]
+            self.sum -= old
+            self.sum_sq -= old * old
+            self.sum_cross -= self._cross(old)
+            self.sum_mag -= self.magnitudes[self.index]
+        else:
+            self.count += 1
+
+        self.buffer[self.index] = v
+        self.magnitudes[self.index] = mag
+        self.sum += v
+        self.sum_sq += v * v
+        self.sum_cross += self._cross(v)
+        self.sum_mag += mag
+
+        self.index = (self.index + 1) % self.size
+
+        self.pushes += 1
+        if self.pushes % (self.size * RESYNC_WINDOWS) == 0:
+            self.resync()
+
+    def resync(self):
+        b = self.buffer[: self.count]
+        self.sum = b.sum(axis=0)
+        self.sum_sq = (b * b).sum(axis=0)
+        self.sum_cross = np.array([(b[:, 0] * b[:, 1]).sum(), (b[:, 0] * b[:, 2]).sum(), (b[:, 1] * b[:, 2]).sum()])
+        self.sum_mag = float(self.magnitudes[: self.count].sum())
+
+    def full(self):
+        return self.count == self.size
+
+    def features(self, n_bands: int) -> list:
+        """Mean (3), variance (3), energy (3), mean magnitude (1), axis correlation xy/xz/yz (3), band power (n_bands * 3)."""
+        n = self.count
+        mean = self.sum / n
+        var = np.maximum(self.sum_sq / n - mean * mean, 0.0)
+        energy = self.sum_sq / n
+        mag = self.sum_mag / n
+
+        cov = self.sum_cross / n - np.array([mean[0] * mean[1], mean[0] * mean[2], mean[1] * mean[2]])
+        std = np.sqrt(var)
+        denom = np.array([std[0] * std[1], std[0] * std[2], std[1] * std[2]])
+        corr = np.divide(cov, denom, out=np.zeros(3), where=denom > 0)
+
+        # The power spectrum does not depend on where the ring buffer starts, so no reordering is needed
+        spectrum = np.abs(np.fft.rfft(self.buffer[:n] - mean, axis=0)) ** 2 / n
+        # Split the non-DC bins into equal bands
+        bands = np.array_split(spectrum[1:], n_bands, axis=0)
+        band_power = np.array([b.sum(axis=0) if len(b) else np.zeros(3) for b in bands]).ravel()
+
+        return np.concatenate([mean, var, energy, [mag], corr, band_power]).tolist()
+
+
+class FeatureExtractor:
+    """Keeps a sliding window per device/sensor channel and emits feature frames every `hop` combined frames."""
+
+    def __init__(self, window_size: int = 32, hop: int = 16, n_bands: int = 4):
+        self.window_size = window_size
+        self.hop = hop
+        self.n_bands = n_bands
+        self.windows: dict[str, dict[str, SlidingWindow]] = {}
+        self.frames_since_emit = 0
+
+    def push(self, combined: dict):
+        """Add a combined frame. Returns a feature frame ({"t": ..., "LA": {"mpu0.a": [...]}, ...}) or None."""
+        for device, entry in combined.items():
+            if device == "t" or not isinstance(entry, dict):
+                continue
+
+            device_windows = self.windows.setdefault(device, {})
+            for channel, xyz in iter_vectors(entry.get("d")):
+                window = device_windows.get(channel)
+                if window is None:
+                    window = device_windows[channel] = SlidingWindow(self.window_size)
+                window.push(xyz)
+
+        self.frames_since_emit += 1
+        if self.frames_since_emit < self.hop:
+            return None
+
+        self.frames_since_emit = 0
+
+        features = {"t": combined.get("t")}
+        for device, device_windows in self.windows.items():
+            features[device] = {ch: w.features(self.n_bands) for ch, w in device_windows.items() if w.full()}
+
+        if not any(features[d] for d in self.windows):
+            return None
+
+        return features
+
+    def clear(self):
+        self.windows.clear()
+        self.frames_since_emit = 0
@@ -0,0 +1,371 @@
+"""Filters for IMU streams, vectorized over all axes (and devices) at once.
+
+Every filter has a batch function for offline (N, axes) arrays, e.g. the columns of an arduino_output CSV,
+and a stateful class that filters one (axes,) sample at a time on the hub:
+
+- constant-velocity Kalman filter: `kalman_cv` / `KalmanCV`
+- Butterworth low-pass (second order, like the DLPF of the MPU6050): `lowpass` / `Biquad`
+- complementary filter for roll and pitch from accelerometer and gyroscope: `complementary` / `ComplementaryFilter`
+
+Missing values (NaN) are skipped: the filters keep their state and output NaN for them.
+
+`FrameFilter` applies a filter to every vector of a combined frame in one batched update.
+"""
+import math
+
+import numpy as np
+
+from feature_extraction import iter_vectors
+
+# Channels of a FrameFilter without values for longer than this (in seconds) start over from their next value
+MAX_GAP = 0.5
+
+
+class KalmanCV:
+    """Constant-velocity Kalman filter, with a position/velocity state for each axis.
+
+    `process_noise` is the variance of the acceleration driving the velocity and `measurement_noise` the variance
+    of the measurements. Covariances are kept per axis, so axes with missing values converge on their own.
+    """
+
+    # update() takes the time step of each sample
+    variable_dt = True
+
+    def __init__(self, axes, dt, process_noise=1.0, measurement_noise=1.0):
+        self.dt = dt
+        self.q = process_noise
+        self.r = measurement_noise
+
+        self.x = np.zeros((axes, 2))
+        # Symmetric covariance entries p00, p01, p11 of each axis
+        self.p = np.zeros((axes, 3))
+        self.initialized = np.zeros(axes, dtype=bool)
+
+    def resize(self, axes):
+        """Add axes (not initialized) or remove the last ones, keeping the state of the others."""
+        n = min(axes, len(self.x))
+        x, p, initialized = np.zeros((axes, 2)), np.zeros((axes, 3)), np.zeros(axes, dtype=bool)
+        x[:n], p[:n], initialized[:n] = self.x[:n], self.p[:n], self.initialized[:n]
+        self.x, self.p, self.initialized = x, p, initialized
+
+    def update(self, z, dt=None):
+        """Update with an (axes,) sample. `dt` is the time since the previous one (a number or one per axis),
+        `self.dt` by default."""
+        z = np.asarray(z, dtype=np.float64)
+        measured = ~np.isnan(z)
+
+        # Start at the first measurement of each axis
+        first = measured & ~self.initialized
+        if first.any():
+            self.x[first, 0] = z[first]
+            self.x[first, 1] = 0.0
+            self.p[first] = (self.r, 0.0, self.r)
+            self.initialized |= first
+
+        dt = self.dt if dt is None else np.asarray(dt, dtype=np.float64)
+        x0, x1 = self.x[:, 0], self.x[:, 1]
+        p00, p01, p11 = self.p[:, 0], self.p[:, 1], self.p[:, 2]
+
+        # Predict, with the discrete white noise acceleration model
+        x0 = x0 + dt * x1
+        p00 = p00 + dt * (2 * p01 + dt * p11) + self.q * dt**4 / 4
+        p01 = p01 + dt * p11 + self.q * dt**3 / 2
+        p11 = p11 + self.q * dt**2
+
+        # Update the measured axes
+        update = measured & ~first
+        s = p00 + self.r
+        k0 = np.where(update, p00 / s, 0.0)
+        k1 = np.where(update, p01 / s, 0.0)
+        innovation = np.where(update, z - x0, 0.0)
+
+        self.x[:, 0] = x0 + k0 * innovation
+        self.x[:, 1] = x1 + k1 * innovation
+        self.p[:, 0] = (1 - k0) * p00
+        self.p[:, 1] = (1 - k0) * p01
+        self.p[:, 2] = p11 - k1 * p01
+
+        # Axes that were never measured have no estimate
+        out = np.where(self.initialized, self.x[:, 0], np.nan)
+        out[~measured] = np.nan
+        return out
+
+    def reset(self, axes=slice(None)):
+        """Forget the state of `axes` (indices or a boolean mask), all of them by default."""
+        self.x[axes] = 0
+        self.p[axes] = 0
+        self.initialized[axes] = False
+
+
+def kalman_cv(values, dt, process_noise=1.0, measurement_noise=1.0):
+    """Filter an (N, axes) array, each axis on its own."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values.copy()
+
+    if np.isnan(values).any():
+        kf = KalmanCV(values.shape[1], dt, process_noise, measurement_noise)
+        out = np.empty_like(values)
+        for i in range(len(values)):
+            out[i] = kf.update(values[i])
+        return out
+
+    # Without missing values, the covariance (and the gains) are the same for every axis,
+    # so only the state update is done on arrays
+    q, r = process_noise, measurement_noise
+    # Covariance after the first measurement, predicted like in KalmanCV
+    p00, p01, p11 = r + dt * dt * r + q * dt**4 / 4, dt * r + q * dt**3 / 2, r + q * dt**2
+
+    x0 = values[0].copy()
+    x1 = np.zeros_like(x0)
+    out = np.empty_like(values)
+    out[0] = x0
+
+    for i in range(1, len(values)):
+        p00 += dt * (2 * p01 + dt * p11) + q * dt**4 / 4
+        p01 += dt * p11 + q * dt**3 / 2
+        p11 += q * dt**2
+        s = p00 + r
+        k0, k1 = p00 / s, p01 / s
+        p00, p01, p11 = (1 - k0) * p00, (1 - k0) * p01, p11 - k1 * p01
+
+        x0 += dt * x1
+        innovation = values[i] - x0
+        x0 += k0 * innovation
+        x1 += k1 * innovation
+        out[i] = x0
+
+    return out
+
+
+def butterworth_coefficients(cutoff, sample_rate):
+    """Second order Butterworth low-pass (b, a) coefficients, with the bilinear transform."""
+    k = math.tan(math.pi * cutoff / sample_rate)
+    norm = 1 / (1 + math.sqrt(2) * k + k * k)
+
+    b0 = k * k * norm
+    b = (b0, 2 * b0, b0)
+    a = (1.0, 2 * (k * k - 1) * norm, (1 - math.sqrt(2) * k + k * k) * norm)
+    return b, a
+
+
+class Biquad:
+    """Second order IIR filter (transposed direct form II) over all axes at once."""
+
+    # The coefficients are made for a fixed sample rate
+    variable_dt = False
+
+    def __init__(self, axes, b, a):
+        self.b = b
+        self.a = a
+        self.state = np.zeros((axes, 2))
+        self.initialized = np.zeros(axes, dtype=bool)
+
+    @classmethod
+    def lowpass(cls, axes, cutoff, sample_rate):
+        return cls(axes, *butterworth_coefficients(cutoff, sample_rate))
+
+    def resize(self, axes):
+        """Add axes (not initialized) or remove the last ones, keeping the state of the others."""
+        n = min(axes, len(self.state))
+        state, initialized = np.zeros((axes, 2)), np.zeros(axes, dtype=bool)
+        state[:n], initialized[:n] = self.state[:n], self.initialized[:n]
+        self.state, self.initialized = state, initialized
+
+    def update(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        measured = ~np.isnan(x)
+        (b0, b1, b2), (_, a1, a2) = self.b, self.a
+
+        # Start each axis in its steady state for the first value, instead of ramping up from 0
+        first = measured & ~self.initialized
+        if first.any():
+            gain = sum(self.b) / sum(self.a)
+            self.state[first, 0] = x[first] * (gain - b0)
+            self.state[first, 1] = x[first] * (b2 - a2 * gain)
+            self.initialized |= first
+
+        xm = np.where(measured, x, 0.0)
+        y = b0 * xm + self.state[:, 0]
+        s0 = b1 * xm - a1 * y + self.state[:, 1]
+        s1 = b2 * xm - a2 * y
+
+        # Missing values keep the previous state
+        self.state[:, 0] = np.where(measured, s0, self.state[:, 0])
+        self.state[:, 1] = np.where(measured, s1, self.state[:, 1])
+        return np.where(measured, y, np.nan)
+
+    def reset(self, axes=slice(None)):
+        """Forget the state of `axes` (indices or a boolean mask), all of them by default."""
+        self.state[axes] = 0
+        self.initialized[axes] = False
+
+
+def _iir(values, b, a):
+    """Biquad over an (N, axes) array without missing values, starting in the steady state of the first row."""
+    (b0, b1, b2), (_, a1, a2) = b, a
+    gain = sum(b) / sum(a)
+
+    s0 = values[0] * (gain - b0)
+    s1 = values[0] * (b2 - a2 * gain)
+    out = np.empty_like(values)
+
+    for i in range(len(values)):
+        x = values[i]
+        y = b0 * x + s0
+        s0 = b1 * x - a1 * y + s1
+        s1 = b2 * x - a2 * y
+        out[i] = y
+
+    return out
+
+
+def lowpass(values, cutoff, sample_rate, zero_phase=False):
+    """Butterworth low-pass of an (N, axes) array. `zero_phase` filters forward and backward (offline only)."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values.copy()
+
+    b, a = butterworth_coefficients(cutoff, sample_rate)
+
+    def run(data):
+        if not np.isnan(data).any():
+            return _iir(data, b, a)
+
+        f = Biquad(data.shape[1], b, a)
+        out = np.empty_like(data)
+        for i in range(len(data)):
+            out[i] = f.update(data[i])
+        return out
+
+    out = run(values)
+    if zero_phase:
+        out = run(out[::-1])[::-1]
+    return out
+
+
+def accelerometer_angles(acc):
+    """Roll and pitch (radians) of (..., 3) accelerometer vectors, from the direction of gravity."""
+    acc = np.asarray(acc, dtype=np.float64)
+    roll = np.arctan2(acc[..., 1], acc[..., 2])
+    pitch = np.arctan2(-acc[..., 0], np.sqrt(acc[..., 1] ** 2 + acc[..., 2] ** 2))
+    return np.stack([roll, pitch], axis=-1)
+
+
+class ComplementaryFilter:
+    """Roll and pitch of several sensors (devices, 3) from accelerometer and gyroscope (rad/s) samples.
+
+    The integrated gyroscope is trusted for fast changes and the accelerometer for the long term, with
+    `alpha` the weight of the gyroscope.
+    """
+
+    def __init__(self, sensors, alpha=0.98):
+        self.alpha = alpha
+        self.angles = np.full((sensors, 2), np.nan)
+
+    def update(self, acc, gyro, dt):
+        acc_angles = accelerometer_angles(acc)
+        gyro = np.asarray(gyro, dtype=np.float64)
+
+        integrated = self.angles + gyro[..., :2] * dt
+        fused = self.alpha * integrated + (1 - self.alpha) * acc_angles
+
+        # Start from the accelerometer, and keep the integrated gyroscope without accelerometer
+        fused = np.where(np.isnan(self.angles), acc_angles, fused)
+        fused = np.where(np.isnan(acc_angles), integrated, fused)
+
+        self.angles = fused
+        return fused
+
+    def reset(self):
+        self.angles[:] = np.nan
+
+
+def complementary(acc, gyro, dt, alpha=0.98):
+    """Roll and pitch (N, sensors, 2) of (N, sensors, 3) accelerometer and gyroscope arrays."""
+    acc = np.asarray(acc, dtype=np.float64)
+    gyro = np.asarray(gyro, dtype=np.float64)
+    f = ComplementaryFilter(acc.shape[1], alpha)
+
+    out = np.empty(acc.shape[:2] + (2,))
+    for i in range(len(acc)):
+        out[i] = f.update(acc[i], gyro[i], dt)
+    return out
+
+
+class FrameFilter:
+    """Filters every 3-axis vector of combined frames with one batched update per frame.
+
+    `make_filter(axes)` creates the stateful filter (e.g. `lambda n: KalmanCV(n, 0.12)`). Each (device, channel)
+    keeps its own axes of the filter: channels seen for the first time are added without resetting the others,
+    and channels missing from a frame (e.g. a node that dropped) are NaN, so they keep their state.
+
+    Frames don't come at a fixed rate (the hub waits for notifications, nodes drop), so filters with a
+    `variable_dt` get the time since the previous value of each channel, from the "t" of the frames. Channels
+    without values for more than `max_gap` seconds (or when time goes back) start over from their next value.
+    """
+
+    def __init__(self, make_filter, max_gap=MAX_GAP):
+        self.make_filter = make_filter
+        self.max_gap = max_gap
+        self.filter = None
+        # (device, channel) -> row of its 3 axes in the filter
+        self.channels = {}
+        # Time of the last value of each channel
+        self.last_times = np.empty(0)
+
+    def _row(self, key):
+        row = self.channels.get(key)
+        if row is None:
+            row = self.channels[key] = len(self.channels)
+            if self.filter is None:
+                self.filter = self.make_filter(3 * len(self.channels))
+            else:
+                self.filter.resize(3 * len(self.channels))
+            self.last_times = np.append(self.last_times, np.nan)
+        return row
+
+    def apply(self, combined: dict) -> dict:
+        """Replace the vectors of the frame with their filtered values (in place) and return the frame."""
+        rows = []
+        vectors = []
+        for device, entry in combined.items():
+            if device == "t" or not isinstance(entry, dict):
+                continue
+
+            # The lists of the payloads, replaced in place below
+            for channel, v in iter_vectors(entry.get("d")):
+                rows.append(self._row((device, channel)))
+                vectors.append(v)
+
+        if not vectors:
+            return combined
+
+        values = np.full((len(self.channels), 3), np.nan)
+        values[rows] = vectors
+
+        dt = None
+        t = combined.get("t")
+        if t is not None:
+            measured = np.zeros(len(self.channels), dtype=bool)
+            measured[rows] = True
+            dt = t - self.last_times
+            self.last_times[rows] = t
+
+            # New channels have no last time (NaN) and are not initialized anyway
+            restart = measured & ~((dt >= 0) & (dt <= self.max_gap))
+            if restart.any():
+                self.filter.reset(np.repeat(restart, 3))
+            # Missing channels are not moved forward, their next value gets the whole time since the last one
+            dt = np.repeat(np.where(measured & ~restart, dt, 0.0), 3)
+
+        if dt is not None and self.filter.variable_dt:
+            filtered = self.filter.update(values.ravel(), dt)
+        else:
+            filtered = self.filter.update(values.ravel())
+        filtered = filtered.reshape(-1, 3)[rows].tolist()
+
+        for v, f in zip(vectors, filtered):
+            v[:] = f
+
+        return combined
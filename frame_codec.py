@@ -0,0 +1,13 @@
+"""Encoding of the frames sent by the hub (msgpack, then lz4 frame compression)."""
+import lz4.frame
+import msgpack
+
+COMPRESSION_LEVEL = lz4.frame.COMPRESSIONLEVEL_MINHC + 5
+
+
+def encode_frame(frame, use_single_float=False) -> bytes:
+    return lz4.frame.compress(msgpack.packb(frame, use_single_float=use_single_float), compression_level=COMPRESSION_LEVEL)
+
+
+def decode_frame(data) -> dict:
+    return msgpack.unpackb(lz4.frame.decompress(bytes(data)))
@@ -0,0 +1,276 @@
+"""Fixed-layout binary packing of node payloads and combined frames.
+
+Instead of msgpack maps that repeat the key strings in every packet, each sensor block has a fixed NumPy dtype
+layout of int16 fixed-point values. A presence bitmask marks the missing MPUs and QMCs, so the layout (and the
+size of a frame) only depends on the schema version and the number of devices. Unpacking is a single
+`np.frombuffer` call on the received buffer, without copying it:
+
+    frame = unpack_combined(data)           # structured record
+    frame["devices"]["d"]["mpu"]["a"]       # int16 (devices, MPU slots, 3)
+    unpack_combined_dict(data)              # same frame as the msgpack format, at the edges
+
+Packing gathers the values of a frame in one list and quantizes them with a single NumPy operation into a
+preallocated record with the same layout. Packing a frame still takes about 1.7x as long as msgpack+lz4 (see
+bench_hub.py), the gains are the size of the frames and unpacking, so msgpack stays the default on the hub.
+
+Layouts are versioned: the first byte of every packet is the magic byte, the second the schema version.
+"""
+import numpy as np
+
+# First byte of a packed payload, not a valid start of a msgpack map (which node payloads and frames are)
+MAGIC = 0xB1
+
+# Node payload fields: (key, components, scale). Values are stored as round(value * scale) in int16.
+# The nodes already send scaled integers (e.g. q as [994, -2, -95, -32], g up to +-1000, m in the thousands, see
+# convert_test_data.ipynb), which are stored as they are.
+MPU_FIELDS = (("a", 3, 1), ("g", 3, 1), ("q", 4, 1), ("e", 3, 1))
+QMC_FIELDS = (("m", 3, 1),)
+# Scales of version 1, which assumed float units and corrupted the integers of the nodes. Only kept to read
+# version 1 packets.
+MPU_FIELDS_V1 = (("a", 3, 1.0), ("g", 3, 100.0), ("q", 4, 16384.0), ("e", 3, 100.0))
+QMC_FIELDS_V1 = (("m", 3, 10.0),)
+
+INT16_MIN = np.iinfo(np.int16).min
+INT16_MAX = np.iinfo(np.int16).max
+
+# Predicted label ("p") of a combined frame without one. Only integer labels can be packed.
+NO_PREDICTION = np.iinfo(np.int32).min
+
+# Bytes of the device short name in combined frames (null padded)
+DEVICE_ID_SIZE = 4
+
+
+class Schema:
+    """Layout of one schema version."""
+
+    def __init__(self, version, mpu_slots, qmc_slots, mpu_fields=MPU_FIELDS, qmc_fields=QMC_FIELDS, prediction=True):
+        self.version = version
+        # Whether combined frames have the "p" field
+        self.prediction = prediction
+        self.mpu_slots = mpu_slots
+        self.qmc_slots = qmc_slots
+        self.mpu_fields = mpu_fields
+        self.qmc_fields = qmc_fields
+
+        self.mpu_dtype = np.dtype([(key, "<i2", (n,)) for key, n, _ in mpu_fields])
+        self.qmc_dtype = np.dtype([(key, "<i2", (n,)) for key, n, _ in qmc_fields])
+
+        # Bits 0 to mpu_slots - 1 are the MPUs, the next qmc_slots bits the QMCs
+        self.node_dtype = np.dtype([
+            ("presence", "<u2"),
+            ("mpu", self.mpu_dtype, (mpu_slots,)),
+            ("qmc", self.qmc_dtype, (qmc_slots,)),
+        ])
+        self.node_packet_dtype = np.dtype([("magic", "u1"), ("version", "u1"), ("node", self.node_dtype)])
+
+        self.device_dtype = np.dtype([("id", f"S{DEVICE_ID_SIZE}"), ("s", "u1"), ("d", self.node_dtype)])
+        self._combined_dtypes = {}
+
+        # Same layouts with the values of a node as one flat int16 array, for packing
+        self.node_values = mpu_slots * sum(n for _, n, _ in mpu_fields) + qmc_slots * sum(n for _, n, _ in qmc_fields)
+        self.flat_node_dtype = np.dtype([("presence", "<u2"), ("values", "<i2", (self.node_values,))])
+        self.flat_node_packet_dtype = np.dtype([("magic", "u1"), ("version", "u1"), ("node", self.flat_node_dtype)])
+        self.flat_device_dtype = np.dtype([("id", f"S{DEVICE_ID_SIZE}"), ("s", "u1"), ("d", self.flat_node_dtype)])
+        self._flat_combined_dtypes = {}
+
+        # Scale of each value in layout order, None when they are all 1
+        scales = []
+        for fields, slots in ((mpu_fields, mpu_slots), (qmc_fields, qmc_slots)):
+            scales += [scale for key, n, scale in fields for _ in range(n)] * slots
+        self.scales = np.array(scales) if any(scale != 1 for scale in scales) else None
+        # (key, fields as (key, components), slots, first presence bit, zeros of a missing slot) of each block
+        self.blocks = tuple(
+            (block, tuple((key, n) for key, n, _ in fields), slots, offset, [0] * sum(n for _, n, _ in fields))
+            for block, fields, slots, offset in (
+                ("mpu", mpu_fields, mpu_slots, 0),
+                ("qmc", qmc_fields, qmc_slots, mpu_slots),
+            )
+        )
+
+    def combined_dtype(self, device_count):
+        dtype = self._combined_dtypes.get(device_count)
+        if dtype is None:
+            dtype = self._combined_dtypes[device_count] = self._combined_layout(self.device_dtype, device_count)
+        return dtype
+
+    def flat_combined_dtype(self, device_count):
+        dtype = self._flat_combined_dtypes.get(device_count)
+        if dtype is None:
+            dtype = self._flat_combined_dtypes[device_count] = self._combined_layout(self.flat_device_dtype, device_count)
+        return dtype
+
+    def _combined_layout(self, device_dtype, device_count):
+        return np.dtype([
+            ("magic", "u1"),
+            ("version", "u1"),
+            ("count", "u1"),
+            ("t", "<f8"),
+            *([("p", "<i4")] if self.prediction else []),
+            ("devices", device_dtype, (device_count,)),
+        ])
+
+
+# Schema versions that can be decoded, the latest one is used to encode
+SCHEMAS = {
+    1: Schema(1, mpu_slots=3, qmc_slots=2, mpu_fields=MPU_FIELDS_V1, qmc_fields=QMC_FIELDS_V1, prediction=False),
+    2: Schema(2, mpu_slots=3, qmc_slots=2),
+}
+CURRENT_VERSION = 2
+
+
+def is_packed(data) -> bool:
+    return len(data) > 0 and data[0] == MAGIC
+
+
+def _schema(data) -> Schema:
+    if not is_packed(data) or len(data) < 2:
+        raise ValueError("Not a packed payload")
+
+    schema = SCHEMAS.get(data[1])
+    if schema is None:
+        raise ValueError(f"Unknown schema version {data[1]}")
+    return schema
+
+
+def _gather(payload, schema: Schema, values: list) -> int:
+    """Append the values of every slot of a node payload to `values`, in layout order. Returns the presence bitmask."""
+    presence = 0
+
+    for block, fields, slots, offset, empty in schema.blocks:
+        sensors = (payload or {}).get(block) or ()
+        for i in range(slots):
+            sensor = sensors[i] if i < len(sensors) else None
+            if not sensor:
+                values += empty
+                continue
+
+            presence |= 1 << (offset + i)
+            for key, n in fields:
+                v = sensor.get(key)
+                if v is not None and len(v) == n:
+                    values += v
+                elif v is None:
+                    values += [0] * n
+                else:
+                    v = list(v[:n])
+                    values += v + [0] * (n - len(v))
+
+    return presence
+
+
+def quantize(values, schema: Schema, nodes=1) -> np.ndarray:
+    """(nodes, values per node) int16 array of gathered values: scaled, rounded and clipped. NaN is stored as 0."""
+    x = np.array(values, dtype=np.float64).reshape(nodes, schema.node_values)
+    if schema.scales is not None:
+        x *= schema.scales
+    x[np.isnan(x)] = 0
+    return np.clip(np.rint(x, out=x), INT16_MIN, INT16_MAX, out=x).astype(np.int16)
+
+
+def node_values(payload, schema: Schema) -> list:
+    """Presence bitmask followed by the quantized values of every slot, in layout order."""
+    values = []
+    presence = _gather(payload, schema, values)
+    return [presence] + quantize(values, schema)[0].tolist()
+
+
+def _node_to_dict(record, schema: Schema) -> dict:
+    presence = int(record["presence"])
+
+    payload = {}
+    for block, fields, slots, offset in (
+        ("mpu", schema.mpu_fields, schema.mpu_slots, 0),
+        ("qmc", schema.qmc_fields, schema.qmc_slots, schema.mpu_slots),
+    ):
+        sensors = []
+        for i in range(slots):
+            if presence & (1 << (offset + i)):
+                slot = record[block][i]
+                sensors.append({key: (slot[key] / scale if scale != 1 else slot[key]).tolist() for key, _, scale in fields})
+            else:
+                sensors.append(None)
+
+        # Trailing missing sensors are left out, like in node payloads
+        while sensors and sensors[-1] is None:
+            sensors.pop()
+        payload[block] = sensors or None
+
+    return payload
+
+
+def pack_node(payload: dict, version=CURRENT_VERSION) -> bytes:
+    schema = SCHEMAS[version]
+    values = []
+
+    packet = np.zeros((), dtype=schema.flat_node_packet_dtype)
+    packet["magic"] = MAGIC
+    packet["version"] = version
+    packet["node"]["presence"] = _gather(payload, schema, values)
+    packet["node"]["values"] = quantize(values, schema)[0]
+    return packet.tobytes()
+
+
+def unpack_node(data):
+    """Node record (a view on `data`) with the presence bitmask and the quantized "mpu" and "qmc" slots."""
+    schema = _schema(data)
+    return np.frombuffer(data, dtype=schema.node_packet_dtype, count=1)[0]["node"]
+
+
+def unpack_node_dict(data) -> dict:
+    return _node_to_dict(unpack_node(data), _schema(data))
+
+
+def pack_combined(frame: dict, version=CURRENT_VERSION) -> bytes:
+    """Pack a combined frame ({"t": ..., "LA": {"d": payload, "s": status}, ...})."""
+    schema = SCHEMAS[version]
+    devices = [(name, entry) for name, entry in frame.items() if name != "t" and isinstance(entry, dict)]
+
+    # Keys that can't be packed are an error rather than being dropped
+    extra = [name for name, entry in frame.items() if name not in ("t", "p") and not isinstance(entry, dict)]
+    if extra or ("p" in frame and not schema.prediction):
+        raise ValueError(f"Can't pack the keys {extra or ['p']} in schema version {version}")
+
+    packet = np.zeros((), dtype=schema.flat_combined_dtype(len(devices)))
+    packet["magic"] = MAGIC
+    packet["version"] = version
+    packet["count"] = len(devices)
+    packet["t"] = frame.get("t") or 0.0
+    if schema.prediction:
+        p = frame.get("p")
+        if p is not None and (not isinstance(p, int) or isinstance(p, bool) or not NO_PREDICTION < p <= 2**31 - 1):
+            raise ValueError(f"Only int32 labels can be packed, got {p!r}")
+        packet["p"] = NO_PREDICTION if p is None else p
+
+    if devices:
+        values = []
+        records = packet["devices"]
+        records["id"] = [name.encode()[:DEVICE_ID_SIZE] for name, _ in devices]
+        records["s"] = [entry.get("s") or 0 for _, entry in devices]
+        records["d"]["presence"] = [_gather(entry.get("d"), schema, values) for _, entry in devices]
+        records["d"]["values"] = quantize(values, schema, len(devices))
+
+    return packet.tobytes()
+
+
+def unpack_combined(data):
+    """Combined frame record (a view on `data`). Values are quantized, see `dequantize`."""
+    schema = _schema(data)
+    return np.frombuffer(data, dtype=schema.combined_dtype(data[2]), count=1)[0]
+
+
+def unpack_combined_dict(data) -> dict:
+    """Unpack to the same dict as the msgpack format."""
+    schema = _schema(data)
+    packet = unpack_combined(data)
+
+    frame = {"t": float(packet["t"])}
+    for record in packet["devices"]:
+        frame[record["id"].decode()] = {"d": _node_to_dict(record["d"], schema), "s": int(record["s"])}
+    if schema.prediction and packet["p"] != NO_PREDICTION:
+        frame["p"] = int(packet["p"])
+    return frame
+
+
+def dequantize(slots, fields):
+    """Float values of quantized slots, e.g. dequantize(frame["devices"]["d"]["mpu"], MPU_FIELDS)["q"]."""
+    return {key: slots[key] / scale for key, _, scale in fields}
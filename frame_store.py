@@ -0,0 +1,241 @@
+"""Columnar in-memory store of combined frames.
+
+Frames are kept in one preallocated NumPy structured array instead of a list of nested dicts: a "t" column, a
+"<device>.s" status column per device and a float32 column per device, sensor and field, e.g. "LA.mpu0.a"
+(3 axes) or "LA.qmc1.m". Missing sensors and fields are NaN, and the status of a device that is not in a frame
+is ABSENT. Capacity doubles when full, so appends are amortized O(1), and devices seen for the first time add
+their columns.
+
+    store = FrameStore()
+    store.append(combined_data)
+    store.frames[-100:]             # last 100 frames, a view
+    store.column("LA.mpu0.a")       # (n, 3) view
+    store.to_dicts()                # same dicts as appended, for saving as JSON
+
+The layout of a device (MPU and QMC slots and fields) is the one of frame_schema.py. Other keys of the frames
+(e.g. the "p" prediction) are not stored.
+"""
+import math
+import sys
+
+import numpy as np
+
+import frame_schema
+
+# Status of a device that is missing from a frame
+ABSENT = -1
+
+DEFAULT_CAPACITY = 1024
+
+VALUE_DTYPE = np.dtype("<f4")
+
+# Layout of the devices
+SCHEMA = frame_schema.SCHEMAS[frame_schema.CURRENT_VERSION]
+
+# (block, slots, [(key, components)], values of a missing sensor) of a device, in layout order
+BLOCKS = [
+    (block, slots, [(key, n) for key, n, _ in fields], [math.nan] * sum(n for _, n, _ in fields))
+    for block, fields, slots in (
+        ("mpu", SCHEMA.mpu_fields, SCHEMA.mpu_slots),
+        ("qmc", SCHEMA.qmc_fields, SCHEMA.qmc_slots),
+    )
+]
+
+# (block, slot, key, components) of every value column of a device
+FIELDS = [(block, slot, key, n) for block, slots, keys, _ in BLOCKS for slot in range(slots) for key, n in keys]
+DEVICE_VALUES = sum(n for _, _, _, n in FIELDS)
+
+# The time is followed by the statuses
+STATUS_OFFSET = 8
+
+
+def values_offset(device_count) -> int:
+    return math.ceil((STATUS_OFFSET + device_count) / VALUE_DTYPE.itemsize) * VALUE_DTYPE.itemsize
+
+
+def make_dtype(devices) -> np.dtype:
+    """Time, then the statuses, then the float32 values of every device (contiguous, so they can be filled as
+    one row).
+    """
+    names, formats, offsets = ["t"], ["<f8"], [0]
+
+    for i, device in enumerate(devices):
+        names.append(f"{device}.s")
+        formats.append("i1")
+        offsets.append(STATUS_OFFSET + i)
+
+    offset = values_offset(len(devices))
+    for device in devices:
+        for block, slot, key, n in FIELDS:
+            names.append(f"{device}.{block}{slot}.{key}")
+            formats.append((VALUE_DTYPE, (n,)))
+            offsets.append(offset)
+            offset += n * VALUE_DTYPE.itemsize
+
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": offset})
+
+
+def _device_values(payload) -> list:
+    """The values of a node payload in layout order, NaN when missing."""
+    values = []
+    for block, slots, keys, missing in BLOCKS:
+        sensors = (payload.get(block) if payload else None) or ()
+        for slot in range(slots):
+            sensor = sensors[slot] if slot < len(sensors) else None
+            if not sensor:
+                values += missing
+                continue
+
+            for key, n in keys:
+                v = sensor.get(key)
+                if v is None:
+                    values += missing[:n]
+                elif len(v) == n:
+                    values += v
+                else:
+                    values += (list(v) + missing[:n])[:n]
+    return values
+
+
+def _device_payload(values) -> dict:
+    """The node payload of the values of a device, without the missing sensors and fields."""
+    payload = {}
+    i = 0
+    for block, slots, keys, _ in BLOCKS:
+        sensors = []
+        for _ in range(slots):
+            sensor = {}
+            for key, n in keys:
+                v = values[i:i + n]
+                i += n
+                if not all(map(math.isnan, v)):
+                    sensor[key] = v
+            sensors.append(sensor or None)
+
+        # Trailing missing sensors are left out, like in node payloads
+        while sensors and sensors[-1] is None:
+            sensors.pop()
+        payload[block] = sensors or None
+    return payload
+
+
+class FrameStore:
+    def __init__(self, devices=(), capacity=DEFAULT_CAPACITY):
+        self.devices = list(devices)
+        self.count = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity, old=None):
+        self.dtype = make_dtype(self.devices)
+        array = np.zeros(capacity, dtype=self.dtype)
+
+        # Plain views of the statuses and values, to fill a frame with one assignment each
+        buffer = array.view(np.uint8)
+        self._status = np.ndarray((capacity, len(self.devices)), dtype="i1", buffer=buffer, offset=STATUS_OFFSET,
+                                  strides=(self.dtype.itemsize, 1))
+        self._values = np.ndarray((capacity, len(self.devices) * DEVICE_VALUES), dtype=VALUE_DTYPE, buffer=buffer,
+                                  offset=values_offset(len(self.devices)),
+                                  strides=(self.dtype.itemsize, VALUE_DTYPE.itemsize))
+        self._status[:] = ABSENT
+        self._values[:] = np.nan
+
+        if old is not None:
+            for name in old.dtype.names:
+                array[name][: self.count] = old[name][: self.count]
+
+        self._array = array
+        self._times = array["t"]
+
+    @property
+    def capacity(self):
+        return len(self._array)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def frames(self):
+        """The stored frames (a view, valid until the next append)."""
+        return self._array[: self.count]
+
+    def column(self, name):
+        return self._array[name][: self.count]
+
+    def append(self, frame: dict):
+        devices = [name for name, entry in frame.items() if name != "t" and isinstance(entry, dict)]
+
+        new_devices = [d for d in devices if d not in self.devices]
+        if new_devices or self.count == self.capacity:
+            self.devices += new_devices
+            self._allocate(2 * self.capacity if self.count == self.capacity else self.capacity, self._array)
+
+        i = self.count
+        self._times[i] = frame.get("t") or 0.0
+
+        if devices == self.devices:
+            # Usual case, every device in the frame
+            values = []
+            for device in devices:
+                values += _device_values(frame[device].get("d"))
+            self._status[i] = [frame[device].get("s") or 0 for device in devices]
+            self._values[i] = values
+        else:
+            self._status[i] = ABSENT
+            self._values[i] = np.nan
+            for device in devices:
+                j = self.devices.index(device)
+                self._status[i, j] = frame[device].get("s") or 0
+                self._values[i, j * DEVICE_VALUES:(j + 1) * DEVICE_VALUES] = _device_values(frame[device].get("d"))
+
+        self.count += 1
+
+    def extend(self, frames):
+        for frame in frames:
+            self.append(frame)
+
+    def clear(self):
+        """Remove the frames and keep the capacity."""
+        self._status[: self.count] = ABSENT
+        self._values[: self.count] = np.nan
+        self.count = 0
+
+    def to_dicts(self, start=0, end=None) -> list:
+        """The frames as combined frame dicts ({"t": ..., "LA": {"d": payload, "s": status}, ...})."""
+        end = self.count if end is None else min(end, self.count)
+        times = self._times[start:end].tolist()
+        statuses = self._status[start:end].tolist()
+        values = self._values[start:end].tolist()
+
+        frames = []
+        for t, row_statuses, row_values in zip(times, statuses, values):
+            frame = {"t": t}
+            for j, (device, status) in enumerate(zip(self.devices, row_statuses)):
+                if status != ABSENT:
+                    payload = _device_payload(row_values[j * DEVICE_VALUES:(j + 1) * DEVICE_VALUES])
+                    frame[device] = {"d": payload, "s": status}
+            frames.append(frame)
+        return frames
+
+    @classmethod
+    def from_dicts(cls, frames, capacity=DEFAULT_CAPACITY):
+        store = cls(capacity=max(capacity, len(frames)))
+        store.extend(frames)
+        return store
+
+    @property
+    def nbytes(self):
+        """Bytes used by the stored frames."""
+        return self.count * self.dtype.itemsize
+
+
+def deep_size(obj) -> int:
+    """Bytes used by nested dicts and lists, e.g. the frames of the dict form, to compare with `FrameStore.nbytes`.
+
+    Shared objects (e.g. the key strings) are counted every time, so this is an upper bound.
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k) + deep_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(v) for v in obj)
+    return size
@@ -0,0 +1,285 @@
+"""Orientation of the MPUs of combined frames, fused on the hub instead of on the nodes.
+
+A Madgwick filter is updated for all the sensors of a frame at once (one NumPy update for every MPU of every node),
+from the accelerometer, the gyroscope and optionally a magnetometer of the same node:
+
+    fusion = FrameFusion(magnetometers={"LA.mpu0": "qmc0"})
+    fusion.apply(combined_data)    # fills "q" (w, x, y, z) and "e" (roll, pitch, yaw) of the MPUs
+
+The outputs are in the units of the nodes, integers like the rest of their payload: "q" is the unit quaternion
+times QUATERNION_SCALE and "e" is in degrees (the Eu columns of the dataset). Quaternions rotate the sensor frame
+into the earth frame (z up). Sensors start, and start again after a gap
+longer than MAX_DT, from the orientation given by gravity (and the magnetometer, else a yaw of 0). Without a
+magnetometer the yaw drifts with the gyroscope bias. Missing values (NaN) are skipped: the filter keeps its state
+and outputs NaN for them, like filters.py.
+"""
+import math
+
+import numpy as np
+
+from filters import accelerometer_angles
+
+# Weight of the accelerometer (and magnetometer) correction, against the integrated gyroscope
+DEFAULT_BETA = 0.1
+# Radians per second of one unit of the gyroscope values of the nodes. Taken as degrees per second: the values go
+# up to +-1000, the +-1000 deg/s range of the MPU6050. The firmware isn't in this repository, so check it against
+# the nodes and set bleak_client.FUSION_GYRO_SCALE if they send something else.
+GYRO_SCALE = math.pi / 180
+# The nodes send quaternions times 1000, e.g. [994, -2, -95, -32] (see frame_schema.py)
+QUATERNION_SCALE = 1000
+# Longer gaps (seconds) between two samples of a sensor start its orientation again
+MAX_DT = 0.5
+
+
+def euler_to_quaternion(angles):
+    """(..., 4) quaternions of (..., 3) roll, pitch and yaw angles in radians (rotations about x, then y, then z)."""
+    angles = np.asarray(angles, dtype=np.float64) / 2
+    cr, cp, cy = np.cos(angles[..., 0]), np.cos(angles[..., 1]), np.cos(angles[..., 2])
+    sr, sp, sy = np.sin(angles[..., 0]), np.sin(angles[..., 1]), np.sin(angles[..., 2])
+    return np.stack(
+        [
+            cr * cp * cy + sr * sp * sy,
+            sr * cp * cy - cr * sp * sy,
+            cr * sp * cy + sr * cp * sy,
+            cr * cp * sy - sr * sp * cy,
+        ],
+        axis=-1,
+    )
+
+
+def quaternion_to_euler(q):
+    """(..., 3) roll, pitch and yaw in radians of (..., 4) quaternions."""
+    q = np.asarray(q, dtype=np.float64)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    roll = np.arctan2(w * x + y * z, 0.5 - x * x - y * y)
+    pitch = np.arcsin(np.clip(-2 * (x * z - w * y), -1, 1))
+    yaw = np.arctan2(x * y + w * z, 0.5 - y * y - z * z)
+    return np.stack([roll, pitch, yaw], axis=-1)
+
+
+def _rotate(q, v):
+    """(..., 3) vectors `v` of the sensor frame in the earth frame."""
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    vx, vy, vz = v[..., 0], v[..., 1], v[..., 2]
+    return np.stack(
+        [
+            2 * (vx * (0.5 - y * y - z * z) + vy * (x * y - w * z) + vz * (x * z + w * y)),
+            2 * (vx * (x * y + w * z) + vy * (0.5 - x * x - z * z) + vz * (y * z - w * x)),
+            2 * (vx * (x * z - w * y) + vy * (y * z + w * x) + vz * (0.5 - x * x - y * y)),
+        ],
+        axis=-1,
+    )
+
+
+def initial_orientation(acc, mag=None):
+    """(..., 4) quaternions of the roll and pitch of gravity, and the heading of `mag` (yaw 0 where it's NaN)."""
+    angles = np.zeros(np.shape(acc)[:-1] + (3,))
+    angles[..., :2] = accelerometer_angles(acc)
+    q = euler_to_quaternion(angles)
+
+    if mag is not None:
+        # Turn about z until the horizontal part of the field points to x
+        h = _rotate(q, np.asarray(mag, dtype=np.float64))
+        yaw = -np.arctan2(h[..., 1], h[..., 0])
+        angles[..., 2] = np.where(np.isnan(yaw), 0.0, yaw)
+        q = euler_to_quaternion(angles)
+    return q
+
+
+def _normalize(v):
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(norm > 0, v / norm, 0.0)
+
+
+class Madgwick:
+    """Madgwick filter of several sensors, with a (sensors, 4) quaternion state.
+
+    Accelerometer and magnetometer units don't matter (they are normalized), the gyroscope is in rad/s. Sensors
+    without a magnetometer value (NaN) get the accelerometer-only update.
+    """
+
+    def __init__(self, sensors, beta=DEFAULT_BETA, max_dt=MAX_DT):
+        self.beta = beta
+        self.max_dt = max_dt
+        self.q = np.full((sensors, 4), np.nan)
+
+    def resize(self, sensors):
+        """Add sensors (in the initial state) or remove the last ones, keeping the state of the others."""
+        q = np.full((sensors, 4), np.nan)
+        q[: min(sensors, len(self.q))] = self.q[:sensors]
+        self.q = q
+
+    def update(self, acc, gyro, dt, mag=None):
+        """Update with (sensors, 3) samples, `dt` a number or one per sensor. Returns the (sensors, 4) quaternions."""
+        acc = np.asarray(acc, dtype=np.float64)
+        gyro = np.asarray(gyro, dtype=np.float64)
+        mag = np.full_like(acc, np.nan) if mag is None else np.asarray(mag, dtype=np.float64)
+        dt = np.broadcast_to(np.asarray(dt, dtype=np.float64), acc.shape[:1])[:, None]
+
+        valid = ~(np.isnan(acc).any(axis=1) | np.isnan(gyro).any(axis=1))
+        has_mag = ~np.isnan(mag).any(axis=1)
+        restart = valid & (np.isnan(self.q).any(axis=1) | ~(dt[:, 0] <= self.max_dt))
+
+        q = self.q
+        w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+
+        # Rate of change from the gyroscope: q * (0, gx, gy, gz) / 2
+        gx, gy, gz = gyro[:, 0], gyro[:, 1], gyro[:, 2]
+        q_dot = 0.5 * np.stack(
+            [
+                -x * gx - y * gy - z * gz,
+                w * gx + y * gz - z * gy,
+                w * gy - x * gz + z * gx,
+                w * gz + x * gy - y * gx,
+            ],
+            axis=1,
+        )
+
+        # Gradient of the error between the measured and the expected direction of gravity
+        a = _normalize(acc)
+        f1 = 2 * (x * z - w * y) - a[:, 0]
+        f2 = 2 * (w * x + y * z) - a[:, 1]
+        f3 = 2 * (0.5 - x * x - y * y) - a[:, 2]
+        step = np.stack(
+            [
+                -2 * y * f1 + 2 * x * f2,
+                2 * z * f1 + 2 * w * f2 - 4 * x * f3,
+                -2 * w * f1 + 2 * z * f2 - 4 * y * f3,
+                2 * x * f1 + 2 * y * f2,
+            ],
+            axis=1,
+        )
+
+        if has_mag.any():
+            # Earth field in the x-z plane, from the measured field turned into the earth frame
+            m = _normalize(np.where(has_mag[:, None], mag, 0.0))
+            h = _rotate(q, m)
+            bx, bz = np.hypot(h[:, 0], h[:, 1]), h[:, 2]
+            f4 = 2 * bx * (0.5 - y * y - z * z) + 2 * bz * (x * z - w * y) - m[:, 0]
+            f5 = 2 * bx * (x * y - w * z) + 2 * bz * (w * x + y * z) - m[:, 1]
+            f6 = 2 * bx * (w * y + x * z) + 2 * bz * (0.5 - x * x - y * y) - m[:, 2]
+            mag_step = np.stack(
+                [
+                    -2 * bz * y * f4 + (-2 * bx * z + 2 * bz * x) * f5 + 2 * bx * y * f6,
+                    2 * bz * z * f4 + (2 * bx * y + 2 * bz * w) * f5 + (2 * bx * z - 4 * bz * x) * f6,
+                    (-4 * bx * y - 2 * bz * w) * f4 + (2 * bx * x + 2 * bz * z) * f5 + (2 * bx * w - 4 * bz * y) * f6,
+                    (-4 * bx * z + 2 * bz * x) * f4 + (-2 * bx * w + 2 * bz * y) * f5 + 2 * bx * x * f6,
+                ],
+                axis=1,
+            )
+            step = step + np.where(has_mag[:, None], mag_step, 0.0)
+
+        q_dot -= self.beta * _normalize(step)
+        updated = _normalize(q + q_dot * dt)
+
+        if restart.any():
+            updated[restart] = initial_orientation(acc[restart], np.where(has_mag[restart, None], mag[restart], np.nan))
+
+        self.q = np.where(valid[:, None], updated, q)
+        return np.where(valid[:, None], self.q, np.nan)
+
+    def reset(self):
+        self.q[:] = np.nan
+
+
+def madgwick(acc, gyro, dt, mag=None, beta=DEFAULT_BETA):
+    """Quaternions (N, sensors, 4) of (N, sensors, 3) accelerometer, gyroscope (rad/s) and magnetometer arrays."""
+    acc = np.asarray(acc, dtype=np.float64)
+    f = Madgwick(acc.shape[1], beta)
+
+    out = np.empty(acc.shape[:2] + (4,))
+    for i in range(len(acc)):
+        out[i] = f.update(acc[i], gyro[i], dt, None if mag is None else mag[i])
+    return out
+
+
+class FrameFusion:
+    """Fills the "q" and "e" fields of the MPUs of combined frames, with one batched update per frame.
+
+    `gyro_scale` converts the gyroscope values to rad/s, and `quaternion_scale` the unit quaternions to the
+    integers sent by the nodes.
+
+    `magnetometers` pairs MPUs with a QMC of the same node, e.g. {"LA.mpu0": "qmc0"}. With `overwrite` False,
+    MPUs that already send their orientation keep it. Each MPU keeps its state while its node is connected,
+    and nodes that connect later get new sensors without resetting the others.
+    """
+
+    def __init__(self, beta=DEFAULT_BETA, magnetometers=None, overwrite=False, gyro_scale=GYRO_SCALE,
+                 quaternion_scale=QUATERNION_SCALE):
+        self.filter = Madgwick(0, beta)
+        self.magnetometers = magnetometers or {}
+        self.overwrite = overwrite
+        self.gyro_scale = gyro_scale
+        self.quaternion_scale = quaternion_scale
+        # (device, MPU slot) -> row of the filter
+        self.sensors = {}
+        self.last_times = np.empty(0)
+
+    def _row(self, key):
+        row = self.sensors.get(key)
+        if row is None:
+            row = self.sensors[key] = len(self.sensors)
+            self.filter.resize(len(self.sensors))
+            self.last_times = np.append(self.last_times, np.nan)
+        return row
+
+    def apply(self, combined: dict) -> dict:
+        """Fill the orientation of the MPUs of the frame (in place) and return the frame."""
+        sensors = []
+        for device, entry in combined.items():
+            if device == "t" or not isinstance(entry, dict) or not entry.get("d"):
+                continue
+
+            payload = entry["d"]
+            for slot, sensor in enumerate(payload.get("mpu") or []):
+                if not sensor or (not self.overwrite and sensor.get("q") is not None):
+                    continue
+
+                a, g = sensor.get("a"), sensor.get("g")
+                if a is None or g is None or len(a) != 3 or len(g) != 3:
+                    continue
+
+                m = None
+                qmc = self.magnetometers.get(f"{device}.mpu{slot}")
+                if qmc is not None:
+                    qmc_slot = int(qmc[3:])
+                    qmcs = payload.get("qmc") or []
+                    if qmc_slot < len(qmcs) and qmcs[qmc_slot] and qmcs[qmc_slot].get("m") is not None:
+                        m = qmcs[qmc_slot]["m"]
+
+                sensors.append((self._row((device, slot)), sensor, a, g, m))
+
+        if not sensors:
+            return combined
+
+        rows = len(self.sensors)
+        acc, gyro, mag = (np.full((rows, 3), np.nan) for _ in range(3))
+        index = [row for row, *_ in sensors]
+        acc[index] = [a for _, _, a, _, _ in sensors]
+        gyro[index] = [g for _, _, _, g, _ in sensors]
+        for row, _, _, _, m in sensors:
+            if m is not None:
+                mag[row] = m
+
+        t = combined.get("t") or 0.0
+        dt = t - self.last_times
+        self.last_times[index] = t
+
+        q = self.filter.update(acc, gyro * self.gyro_scale, dt, mag)
+        valid = (~np.isnan(q[:, 0])).tolist()
+        q = np.nan_to_num(q)
+        # Rounded to the integers of the nodes
+        e = np.rint(np.degrees(quaternion_to_euler(q))).astype(np.int64).tolist()
+        q = np.rint(q * self.quaternion_scale).astype(np.int64).tolist()
+
+        # Sensors with missing values are left without an orientation
+        for row, sensor, *_ in sensors:
+            if valid[row]:
+                sensor["q"] = q[row]
+                sensor["e"] = e[row]
+        return combined
+
+    def reset(self):
+        self.filter.reset()
+        self.last_times[:] = np.nan
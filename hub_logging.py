@@ -0,0 +1,102 @@
+"""Logging for the hub: records are handed to a background listener thread, and repetitive events are aggregated."""
+import atexit
+import logging
+import logging.handlers
+import queue
+import time
+
+import colorlog
+
+LOG_FORMAT = "%(log_color)s%(asctime)-15s %(name)-8s %(levelname)s: %(message)s"
+
+_listener = None
+_log_queue = None
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The default handler formats the message on the calling thread. Since the listener runs in the same process,
+    the record can be passed as is. Arguments are formatted later, so don't pass objects that will be mutated.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def _start_listener():
+    global _listener, _log_queue
+
+    if _listener is not None:
+        return
+
+    handler = colorlog.StreamHandler()
+    handler.setFormatter(colorlog.ColoredFormatter(LOG_FORMAT))
+
+    _log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
+    # Flush whatever is left in the queue on exit
+    atexit.register(_listener.stop)
+
+
+def get_logger(name, level=logging.INFO) -> logging.Logger:
+    """Get a logger whose records are written by the background listener."""
+    _start_listener()
+
+    logger = logging.getLogger(name)
+    if not any(isinstance(h, DeferredQueueHandler) for h in logger.handlers):
+        logger.addHandler(DeferredQueueHandler(_log_queue))
+        logger.propagate = False
+    logger.setLevel(level)
+
+    return logger
+
+
+class EventAggregator:
+    """Counts repetitive events and logs one summary per key every `interval` seconds.
+
+    e.g. `skipped.add("LL")` called 37 times logs "Skipped 37 frames for LL in the last 5s".
+
+    Call `poll()` regularly (e.g. from the main loop), so the last burst before things go quiet is logged on
+    time and with the right window. What is left is logged on exit.
+    """
+
+    def __init__(self, logger, message, interval=5.0, level=logging.WARNING):
+        # `message` is formatted with (count, key, interval)
+        self.logger = logger
+        self.message = message
+        self.interval = interval
+        self.level = level
+        self.counts = {}
+        self.last_flush = time.monotonic()
+
+        # Registered after the listener, so it runs before the listener is stopped
+        atexit.register(self.flush)
+
+    def add(self, key, amount=1):
+        self.counts[key] = self.counts.get(key, 0) + amount
+        self.poll()
+
+    def poll(self, now=None):
+        """Log the summary if the interval is over, also without new events."""
+        if now is None:
+            now = time.monotonic()
+
+        if now - self.last_flush >= self.interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        if now is None:
+            now = time.monotonic()
+
+        elapsed = now - self.last_flush
+        self.last_flush = now
+
+        counts, self.counts = self.counts, {}
+        if not self.logger.isEnabledFor(self.level):
+            return
+
+        for key, count in counts.items():
+            self.logger.log(self.level, self.message, count, key, elapsed)
@@ -0,0 +1,286 @@
+"""Runs the hub as several processes, each on its own core, under a supervisor that restarts them.
+
+- ingest: owns the BleakClients and writes every notification into a shared memory ring (see shm_ring.py)
+- combine: aligns the notifications from the ring, sends the combined frames and serves the subscriber slots
+- recorder: saves every raw notification, so that nothing is lost if combining falls behind
+- analytics: computes features and predictions, the results are published by the combine process
+
+The ring is owned by the supervisor, so any process can be restarted without the others noticing more than a gap.
+
+Usage: python hub_processes.py [--no-recorder] [--no-analytics]
+"""
+import argparse
+import asyncio
+import datetime
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+import msgpack
+
+from hub_logging import get_logger
+from shm_ring import RingReader, SharedRing
+
+# Core of each process on the Pi 5 (None to let the OS decide)
+WORKER_CORES = {"ingest": 0, "combine": 1, "recorder": 2, "analytics": 3}
+
+# Seconds between checks of the processes
+SUPERVISOR_INTERVAL = 1.0
+# Restart delay doubles with every crash, up to the maximum. A process that ran this long is considered healthy again.
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 30.0
+HEALTHY_RUN_TIME = 60.0
+
+RECORD_FOLDER = "/home/raspiserver/Desktop/raw_data"
+RECORD_PACKETS_PER_FILE = 10000
+RECORD_POLL_INTERVAL = 0.050
+# Seconds between syncs of the recorded file to disk. A restarted recorder records again what wasn't synced.
+RECORD_SYNC_INTERVAL = 1.0
+
+# Results waiting to be published, older ones are dropped if the combine process is down
+RESULTS_QUEUE_SIZE = 100
+
+logger = get_logger("hub")
+
+
+def pin_to_core(name):
+    core = WORKER_CORES.get(name)
+    if core is not None and hasattr(os, "sched_setaffinity") and core < os.cpu_count():
+        os.sched_setaffinity(0, {core})
+
+
+def run_ingest(ring_name, results_queue):
+    import bleak_client
+
+    asyncio.run(bleak_client.ingest_main(ring_name))
+
+
+def run_combine(ring_name, results_queue):
+    import bleak_client
+
+    asyncio.run(bleak_client.main(ring_name=ring_name, results_queue=results_queue))
+
+
+class Recorder:
+    """Appends the raw notifications of the ring as msgpack [t, address, status, data] records, one file per
+    RECORD_PACKETS_PER_FILE packets.
+
+    The position in the ring is saved once the packets before it are synced to disk, so a restarted recorder
+    continues after the last packet it saved, without recording packets twice.
+    """
+
+    def __init__(self, ring: SharedRing, folder=RECORD_FOLDER, sync_interval=RECORD_SYNC_INTERVAL):
+        # After a restart, continue after the last packet saved by the previous recorder
+        self.reader = RingReader(ring, start="saved")
+        self.folder = folder
+        self.sync_interval = sync_interval
+        os.makedirs(folder, exist_ok=True)
+
+        self.f = None
+        self.count = 0
+        self.lost = 0
+        self.unsynced = False
+        self.last_sync = time.monotonic()
+
+    def _new_file(self):
+        # e.g. 20240502_072215_123456.msgpack
+        name = f"{datetime.datetime.now():%Y%m%d_%H%M%S_%f}.msgpack"
+        return open(os.path.join(self.folder, name), "wb")
+
+    def poll(self, timeout=RECORD_POLL_INTERVAL):
+        packets = self.reader.wait(timeout)
+
+        for t, address, status, data in packets:
+            if self.f is None:
+                self.f = self._new_file()
+            self.f.write(msgpack.packb([t, address, status, data]))
+            self.count += 1
+            self.unsynced = True
+
+            if self.count >= RECORD_PACKETS_PER_FILE:
+                self.sync()
+                self.f.close()
+                self.f = None
+                self.count = 0
+
+        if self.unsynced and time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+        if self.reader.lost != self.lost:
+            logger.warning("Recorder lost %d packets", self.reader.lost - self.lost)
+            self.lost = self.reader.lost
+
+    def sync(self):
+        """Write the packets read so far to disk, then save the position in the ring."""
+        if self.f is not None:
+            self.f.flush()
+            os.fsync(self.f.fileno())
+        self.reader.save_position()
+        self.unsynced = False
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        self.sync()
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+def run_recorder(ring_name, results_queue, folder=RECORD_FOLDER):
+    recorder = Recorder(SharedRing(ring_name), folder)
+    while True:
+        recorder.poll()
+
+
+def run_analytics(ring_name, results_queue):
+    """Align the notifications like the combine process does, and compute features (and predictions)."""
+    import bleak_client
+    from feature_extraction import FeatureExtractor
+
+    reader = RingReader(SharedRing(ring_name))
+    extractor = FeatureExtractor(bleak_client.FEATURE_WINDOW_SIZE, bleak_client.FEATURE_HOP)
+
+    inference_stage = None
+    if bleak_client.INFERENCE_MODEL_PATH:
+        from inference import InferenceStage, load_model
+
+        model = load_model(bleak_client.INFERENCE_MODEL_PATH)
+        bleak_client.check_label_format(model)
+        inference_stage = InferenceStage(
+            model,
+            batch_size=bleak_client.INFERENCE_BATCH_SIZE,
+            on_prediction=lambda t, label: offer(results_queue, ("labels", {"t": t, "p": label})),
+        )
+        inference_stage.start()
+
+    while True:
+        started = time.monotonic()
+
+        for t, address, status, data in reader.read():
+            q = bleak_client.notification_queues.get(address)
+            if q is not None:
+                q.put(data, t)
+                bleak_client.client_statuses[address] = bleak_client.NodeStatus(status)
+
+        combined = bleak_client.combine_data_and_send()
+        if combined:
+            features = extractor.push(combined)
+            if features:
+                offer(results_queue, ("features", features))
+                if inference_stage is not None:
+                    inference_stage.submit(features)
+
+        time.sleep(max(bleak_client.MAIN_LOOP_INTERVAL - (time.monotonic() - started), 0))
+
+
+def offer(results_queue, item):
+    try:
+        results_queue.put_nowait(item)
+    except queue.Full:
+        pass
+
+
+WORKER_TARGETS = {
+    "ingest": run_ingest,
+    "combine": run_combine,
+    "recorder": run_recorder,
+    "analytics": run_analytics,
+}
+
+
+def worker_main(name, ring_name, results_queue):
+    pin_to_core(name)
+    # The supervisor stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    WORKER_TARGETS[name](ring_name, results_queue)
+
+
+class Worker:
+    def __init__(self, name, context, ring_name, results_queue):
+        self.name = name
+        self.context = context
+        self.args = (name, ring_name, results_queue)
+        self.process = None
+        self.started = 0.0
+        self.restarts = 0
+        self.next_start = 0.0
+
+    def start(self):
+        self.process = self.context.Process(target=worker_main, args=self.args, name=self.name, daemon=True)
+        self.process.start()
+        self.started = time.monotonic()
+        logger.info("Started %s (pid %d)", self.name, self.process.pid)
+
+    def check(self, now):
+        """Restart the process if it died, with an increasing delay if it keeps crashing."""
+        if self.process is not None and self.process.is_alive():
+            if now - self.started >= HEALTHY_RUN_TIME:
+                self.restarts = 0
+            return
+
+        if self.process is not None:
+            logger.error("%s exited with code %s", self.name, self.process.exitcode)
+            self.process = None
+            self.next_start = now + min(RESTART_DELAY * 2 ** self.restarts, MAX_RESTART_DELAY)
+            self.restarts += 1
+
+        if now >= self.next_start:
+            self.start()
+
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+
+
+class Supervisor:
+    def __init__(self, names):
+        # Fresh interpreters, nothing (threads, dbus connections) is inherited from the supervisor
+        self.context = multiprocessing.get_context("spawn")
+        self.ring = SharedRing(create=True)
+        # Without the analytics process, the combine process computes the features itself
+        self.results_queue = self.context.Queue(RESULTS_QUEUE_SIZE) if "analytics" in names else None
+        self.workers = [Worker(name, self.context, self.ring.name, self.results_queue) for name in names]
+
+    def run(self):
+        for worker in self.workers:
+            worker.start()
+
+        try:
+            while True:
+                time.sleep(SUPERVISOR_INTERVAL)
+                now = time.monotonic()
+                for worker in self.workers:
+                    worker.check(now)
+        finally:
+            self.stop()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+        self.ring.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the hub as supervised processes")
+    parser.add_argument("--no-recorder", action="store_true", help="don't save the raw notifications")
+    parser.add_argument("--no-analytics", action="store_true", help="don't compute features and predictions")
+    args = parser.parse_args()
+
+    names = ["ingest", "combine"]
+    if not args.no_recorder:
+        names.append("recorder")
+    if not args.no_analytics:
+        names.append("analytics")
+
+    try:
+        Supervisor(names).run()
+    except KeyboardInterrupt:
+        logger.info("Stopped")
+
+
+if __name__ == "__main__":
+    main()
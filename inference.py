@@ -0,0 +1,222 @@
+"""Activity classification on the hub, running an exported model on feature windows in a worker thread.
+
+Can also be run as a script to benchmark a model against recorded sessions.
+"""
+import json
+import os
+import pickle
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from feature_extraction import FeatureExtractor
+from hub_logging import get_logger
+
+ONNX_EXTENSION = ".onnx"
+
+logger = get_logger(__name__)
+
+
+class OnnxModel:
+    def __init__(self, path):
+        # Only needed when an ONNX model is used
+        import onnxruntime
+
+        self.session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, x):
+        # The first output of converted classifiers is the label
+        return self.session.run(None, {self.input_name: x.astype(np.float32)})[0]
+
+
+def load_model(path):
+    """Load an ONNX model or a pickled scikit-learn style model (anything with `predict`)."""
+    if path.endswith(ONNX_EXTENSION):
+        return OnnxModel(path)
+
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def integer_labels(model):
+    """Whether `model` predicts integer labels, None if it can't be told without predicting."""
+    if isinstance(model, OnnxModel):
+        # e.g. "tensor(int64)" or "tensor(string)"
+        label_type = model.session.get_outputs()[0].type
+        return label_type.startswith("tensor(int") or label_type.startswith("tensor(uint")
+
+    classes = getattr(model, "classes_", None)
+    if classes is None:
+        return None
+    return np.issubdtype(np.asarray(classes).dtype, np.integer)
+
+
+def flatten_features(feature_frame: dict, channels: list, feature_length: int) -> np.ndarray:
+    """Flatten a feature frame into one vector in `channels` order ((device, channel) pairs).
+
+    Missing channels, e.g. of a device that dropped, and channels of another length are zero-filled.
+    """
+    vector = np.zeros(len(channels) * feature_length, dtype=np.float32)
+    for i, (device, channel) in enumerate(channels):
+        values = (feature_frame.get(device) or {}).get(channel)
+        if values is not None and len(values) == feature_length:
+            vector[i * feature_length : (i + 1) * feature_length] = values
+
+    return vector
+
+
+def feature_channels(feature_frame: dict) -> list:
+    return sorted((d, c) for d, chs in feature_frame.items() if d != "t" and chs for c in chs)
+
+
+def feature_length(feature_frame: dict):
+    """Number of features per channel, None if the frame has no channel."""
+    for device, chs in feature_frame.items():
+        if device != "t" and chs:
+            return len(next(iter(chs.values())))
+    return None
+
+
+class InferenceStage:
+    """Batches feature windows and runs the model on them in a worker thread.
+
+    The latest prediction is available in `latest_label`, and `on_prediction(t, label)` is called for every window.
+    """
+
+    def __init__(self, model, channels=None, batch_size=4, max_wait=0.050, max_pending=64, on_prediction=None):
+        self.model = model
+        self.channels = channels
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.on_prediction = on_prediction
+
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.latest_label = None
+        self.latest_time = None
+        self.dropped = 0
+        # Batches dropped because the model raised
+        self.failed = 0
+        self.feature_length = None
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+    def submit(self, feature_frame: dict):
+        """Queue a feature frame for prediction without blocking the caller. Drops the window if the worker is behind."""
+        if self.feature_length is None:
+            # The channel order and the vector length are fixed by the first window with channels
+            self.feature_length = feature_length(feature_frame)
+            if self.feature_length is None:
+                return
+            if self.channels is None:
+                self.channels = feature_channels(feature_frame)
+
+        vector = flatten_features(feature_frame, self.channels, self.feature_length)
+
+        try:
+            self.pending.put_nowait((feature_frame.get("t"), vector))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while self.running:
+            try:
+                batch = [self.pending.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+
+            # Collect more windows until the batch is full or we've waited long enough
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                labels = self.model.predict(np.stack([v for _, v in batch]))
+            except Exception as e:
+                # e.g. a model expecting another number of features, the next windows are still predicted
+                self.failed += 1
+                logger.error("Prediction of %d windows failed, dropped: %s", len(batch), e)
+                continue
+
+            for (t, _), label in zip(batch, labels):
+                label = label.item() if isinstance(label, np.generic) else label
+                self.latest_label = label
+                self.latest_time = t
+
+                if self.on_prediction is not None:
+                    self.on_prediction(t, label)
+
+
+def load_recorded_frames(folder):
+    """Yield combined frames from JSON files saved by `save_file` in `bleak_client.py`."""
+    for file in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, file), "r") as f:
+            yield from json.load(f)["data"]
+
+
+def benchmark(model_path, session_folder, combine_rate, window_size=32, hop=16, batch_size=4):
+    model = load_model(model_path)
+    extractor = FeatureExtractor(window_size, hop)
+
+    windows = [w for w in map(extractor.push, load_recorded_frames(session_folder)) if w]
+    if len(windows) == 0:
+        print("Not enough frames for a single window")
+        return
+
+    channels = feature_channels(windows[0])
+    length = feature_length(windows[0])
+    vectors = np.stack([flatten_features(w, channels, length) for w in windows])
+
+    # Latency of a single window
+    latencies = []
+    for v in vectors:
+        start = time.perf_counter()
+        model.predict(v[None, :])
+        latencies.append(time.perf_counter() - start)
+
+    # Throughput when batching
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch_size):
+        model.predict(vectors[i : i + batch_size])
+    throughput = len(vectors) / (time.perf_counter() - start)
+
+    required = combine_rate / hop
+    latencies = np.array(latencies) * 1000
+
+    print(f"Windows: {len(vectors)} ({vectors.shape[1]} features)")
+    print(f"Latency p50: {np.percentile(latencies, 50):.3f}ms, p99: {np.percentile(latencies, 99):.3f}ms")
+    print(f"Throughput (batch {batch_size}): {throughput:.1f} windows/s, required: {required:.2f} windows/s")
+    print("Keeps up with the combine rate" if throughput >= required else "Does NOT keep up with the combine rate")
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: python inference.py MODEL SESSION_FOLDER [COMBINE_RATE_HZ]")
+        sys.exit(1)
+
+    # Default combine rate matches MAIN_LOOP_INTERVAL in bleak_client.py
+    combine_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 1 / 0.120
+
+    benchmark(sys.argv[1], sys.argv[2], combine_rate)
+
+
+if __name__ == "__main__":
+    main()
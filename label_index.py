@@ -0,0 +1,251 @@
+"""Run-length index of the label tracks of a dataset file.
+
+Each label column (Locomotion, HL_Activity, ... see add_col_names.py) is stored as one label per row. The index
+encodes every track as (start, end, label) segments, with `end` the time of the first row after the segment,
+so finding all the "Walk" segments or the label at a time doesn't scan the rows:
+
+    index = LabelIndex.load_or_build("S1-ADL1_sensors_data.txt.new.csv")
+    locomotion = index["244 Locomotion"]
+    locomotion.intervals("Walk")               # (n, 2) array of [start, end) times in ms
+    locomotion.label_at(61000)                 # "Stand"
+    locomotion.windows("Walk", 2000, 1000)     # starts of 2s windows (1s hop) fully inside Walk segments
+
+The index is saved next to the data as FILE.labels.json, and built again when the file changes:
+
+    python label_index.py S1-ADL1_sensors_data.txt.new.csv [--track Locomotion]
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from add_col_names import COLUMN_NAMES, LABEL_LEGEND, read_label_legend
+from dataset_store import LABEL_NUMBER, load_column_names, parse_labels
+
+INDEX_SUFFIX = ".labels.json"
+
+# Label of the rows without one (the null class of OPPORTUNITY)
+NO_LABEL = 0
+
+
+class LabelTrack:
+    """Segments of one label track, sorted by time."""
+
+    def __init__(self, name, starts, ends, labels, names=None):
+        self.name = name
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.labels = np.asarray(labels, dtype=np.int64)
+        # Label number -> label name, e.g. {1: "Stand"}
+        self.names = names or {}
+        self._numbers = {label: number for number, label in self.names.items()}
+
+    def __len__(self):
+        return len(self.starts)
+
+    def number(self, label) -> int:
+        """Label number of a label name or number."""
+        if isinstance(label, str):
+            return self._numbers[label]
+        return int(label)
+
+    def label_name(self, number) -> str:
+        return self.names.get(int(number), str(number))
+
+    def segments(self, label=None):
+        """(start, end, label number) of every segment, or only those of `label`."""
+        mask = slice(None) if label is None else self.labels == self.number(label)
+        return list(zip(self.starts[mask].tolist(), self.ends[mask].tolist(), self.labels[mask].tolist()))
+
+    def intervals(self, label):
+        """(n, 2) array of the [start, end) times of the segments of `label`."""
+        mask = self.labels == self.number(label)
+        return np.stack([self.starts[mask], self.ends[mask]], axis=1)
+
+    def label_at(self, t):
+        """Label name at time `t`, None outside of the segments."""
+        i = np.searchsorted(self.starts, t, side="right") - 1
+        if i < 0 or t >= self.ends[i]:
+            return None
+        return self.label_name(self.labels[i])
+
+    def windows(self, label, length, hop):
+        """Start times of the windows of `length` every `hop` that are fully inside one segment of `label`."""
+        starts = []
+        for start, end in self.intervals(label):
+            count = (end - start - length) // hop + 1
+            if count > 0:
+                starts.append(start + np.arange(count) * hop)
+        return np.concatenate(starts) if starts else np.empty(0, dtype=np.int64)
+
+    def to_dict(self) -> dict:
+        return {
+            "starts": self.starts.tolist(),
+            "ends": self.ends.tolist(),
+            "labels": self.labels.tolist(),
+            "names": {str(k): v for k, v in self.names.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, name, d):
+        return cls(name, d["starts"], d["ends"], d["labels"], {int(k): v for k, v in d["names"].items()})
+
+
+def run_length(times, labels):
+    """Segments (starts, ends, labels) of consecutive equal labels. The last segment ends one period after the
+    last row.
+    """
+    times = np.asarray(times, dtype=np.int64)
+    labels = np.asarray(labels, dtype=np.int64)
+    if len(times) == 0:
+        return times, times, labels
+
+    first = np.concatenate([[0], np.flatnonzero(np.diff(labels)) + 1])
+    period = int(np.median(np.diff(times))) if len(times) > 1 else 0
+    ends = np.concatenate([times[first[1:]], [times[-1] + period]])
+    return times[first], ends, labels[first]
+
+
+def label_names(column: pd.Series) -> dict:
+    """Label number -> name, from the "num label" values of a column (see add_col_names.add_labels)."""
+    if pd.api.types.is_numeric_dtype(column):
+        return {}
+
+    names = {}
+    for value in column.dropna().unique():
+        value = str(value)
+        match = LABEL_NUMBER.match(value)
+        name = value[match.end():].strip() if match else ""
+        if match and name:
+            names[int(match.group(1))] = name
+    return names
+
+
+def load_label_legend(path=LABEL_LEGEND) -> dict:
+    """Track name -> {label number: name} from label_legend.txt, empty if it's missing."""
+    if path is None or not os.path.exists(path):
+        return {}
+
+    with open(path, "r") as f:
+        return read_label_legend(f.readlines())
+
+
+def label_columns(df: pd.DataFrame, column_names_path=COLUMN_NAMES) -> list:
+    """The label columns of column_names.txt in `df`, or its text columns without column_names.txt."""
+    if column_names_path is not None and os.path.exists(column_names_path):
+        _, names = load_column_names(column_names_path)
+        return [name for name in names if name in df.columns]
+
+    return [name for name in df.columns[1:] if not pd.api.types.is_numeric_dtype(df[name])]
+
+
+class LabelIndex:
+    """Tracks by column name, e.g. index["244 Locomotion"]. Tracks can also be found by their short name
+    ("Locomotion").
+    """
+
+    def __init__(self, tracks: dict, time_column=None, source_mtime=None, source_size=None):
+        self.tracks = tracks
+        self.time_column = time_column
+        self.source_mtime = source_mtime
+        self.source_size = source_size
+
+    def __getitem__(self, name) -> LabelTrack:
+        if name in self.tracks:
+            return self.tracks[name]
+
+        for column, track in self.tracks.items():
+            if column.split(" ", 1)[-1] == name:
+                return track
+        raise KeyError(name)
+
+    def __iter__(self):
+        return iter(self.tracks)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns=None):
+        """Index the label `columns` (see `label_columns`) of a frame with the time in its first column."""
+        if columns is None:
+            columns = label_columns(df)
+
+        # Numeric label columns (e.g. from the dataset store) are named with label_legend.txt
+        legend = load_label_legend()
+
+        times = df[df.columns[0]].to_numpy(dtype=np.int64)
+        tracks = {}
+        for name in columns:
+            labels = parse_labels(df[name]).fillna(NO_LABEL).to_numpy(dtype=np.int64)
+            names = label_names(df[name]) or legend.get(name.split(" ", 1)[-1], {})
+            tracks[name] = LabelTrack(name, *run_length(times, labels), names)
+
+        return cls(tracks, df.columns[0])
+
+    @classmethod
+    def build(cls, path, columns=None, df=None):
+        stat = os.stat(path)
+        if df is None:
+            df = pd.read_csv(path, na_values="NaN", low_memory=False)
+
+        index = cls.from_frame(df, columns)
+        index.source_mtime = stat.st_mtime
+        index.source_size = stat.st_size
+        return index
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "time_column": self.time_column,
+                    "source_mtime": self.source_mtime,
+                    "source_size": self.source_size,
+                    "tracks": {name: track.to_dict() for name, track in self.tracks.items()},
+                },
+                f,
+            )
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as f:
+            d = json.load(f)
+
+        tracks = {name: LabelTrack.from_dict(name, t) for name, t in d["tracks"].items()}
+        return cls(tracks, d["time_column"], d["source_mtime"], d["source_size"])
+
+    @classmethod
+    def load_or_build(cls, data_path, columns=None, df=None):
+        """The index saved next to `data_path`, built (and saved) again if missing or older than the data.
+        `df` is the file if it was already read.
+        """
+        index_path = data_path + INDEX_SUFFIX
+        stat = os.stat(data_path)
+
+        if os.path.exists(index_path):
+            index = cls.load(index_path)
+            if index.source_mtime == stat.st_mtime and index.source_size == stat.st_size:
+                return index
+
+        index = cls.build(data_path, columns, df)
+        index.save(index_path)
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the label segment index of a dataset file")
+    parser.add_argument("file", help="dataset CSV with label columns (see add_col_names.py)")
+    parser.add_argument("--track", help="print the segments of this track")
+    args = parser.parse_args()
+
+    index = LabelIndex.load_or_build(args.file)
+    for name in index:
+        print(f"{name}: {len(index[name])} segments")
+
+    if args.track:
+        track = index[args.track]
+        for start, end, label in track.segments():
+            print(f"{start / 1000:10.3f}s {end / 1000:10.3f}s  {track.label_name(label)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Counters, gauges and histograms for the hub, exposed in Prometheus text format over HTTP or written to a stats file."""
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Default histogram buckets in seconds
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (32, 64, 128, 192, 256, 320, 384, 448, 512, 1024)
+
+
+class Metric:
+    type_name = ""
+
+    def __init__(self, name, help_text, label_name=None):
+        self.name = name
+        self.help = help_text
+        self.label_name = label_name
+        self.lock = threading.Lock()
+
+    def _label(self, label):
+        return f'{{{self.label_name}="{label}"}}' if self.label_name and label is not None else ""
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name, help_text, label_name=None):
+        super().__init__(name, help_text, label_name)
+        self.values = {}
+
+    def inc(self, label=None, amount=1):
+        with self.lock:
+            self.values[label] = self.values.get(label, 0) + amount
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+    def render(self):
+        return super().render() + [f"{self.name}{self._label(k)} {v}" for k, v in self.snapshot().items()]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def set(self, value, label=None):
+        # A single dict assignment, so no lock is needed
+        self.values[label] = value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, buckets=TIME_BUCKETS, label_name=None):
+        super().__init__(name, help_text, label_name)
+        self.buckets = tuple(buckets)
+        # label -> [bucket counts..., +Inf count, sum]
+        self.values = {}
+
+    def observe(self, value, label=None):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(label)
+            if counts is None:
+                counts = self.values[label] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[i] += 1
+            counts[-1] += value
+
+    def time(self, label=None):
+        return _Timer(self, label)
+
+    def snapshot(self):
+        with self.lock:
+            values = {k: list(v) for k, v in self.values.items()}
+
+        result = {}
+        for label, counts in values.items():
+            total = sum(counts[:-1])
+            result[label] = {"count": total, "sum": counts[-1], "mean": counts[-1] / total if total else 0.0}
+        return result
+
+    def render(self):
+        lines = super().render()
+
+        with self.lock:
+            values = {k: list(v) for k, v in self.values.items()}
+
+        for label, counts in values.items():
+            extra = f'{self.label_name}="{label}",' if self.label_name and label is not None else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{extra}le="{bound}"}} {cumulative}')
+
+            lines.append(f"{self.name}_sum{self._label(label)} {counts[-1]}")
+            lines.append(f"{self.name}_count{self._label(label)} {cumulative}")
+
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "label", "start")
+
+    def __init__(self, histogram, label):
+        self.histogram = histogram
+        self.label = label
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, self.label)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def counter(self, name, help_text, label_name=None) -> Counter:
+        return self._add(Counter(name, help_text, label_name))
+
+    def gauge(self, name, help_text, label_name=None) -> Gauge:
+        return self._add(Gauge(name, help_text, label_name))
+
+    def histogram(self, name, help_text, buckets=TIME_BUCKETS, label_name=None) -> Histogram:
+        return self._add(Histogram(name, help_text, buckets, label_name))
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for m in list(self.metrics.values()):
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {name: {str(k): v for k, v in m.snapshot().items()} for name, m in list(self.metrics.items())}
+
+
+REGISTRY = Registry()
+
+
+def start_http_server(port, registry=REGISTRY, host="127.0.0.1"):
+    """Serve the registry at http://host:port/metrics from a daemon thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+
+    return server
+
+
+def start_stats_file_writer(path, interval=10.0, registry=REGISTRY):
+    """Overwrite `path` with a JSON snapshot of the registry every `interval` seconds from a daemon thread."""
+
+    def write_loop():
+        while True:
+            time.sleep(interval)
+            try:
+                with open(path, "w") as f:
+                    json.dump({"time": time.time(), "metrics": registry.snapshot()}, f)
+            except OSError:
+                pass
+
+    t = threading.Thread(target=write_loop, daemon=True)
+    t.start()
+
+    return t
@@ -0,0 +1,183 @@
+"""Stand-in for bleak with simulated sensor nodes, so the hub can run without a Bluetooth adapter.
+
+Call `install(nodes)` before importing bleak_client. The scanner discovers the nodes that are not connected,
+and a connected client notifies node payloads every `period` seconds from the event loop, like bleak does:
+
+    nodes = [SimulatedNode(d.address, d.name) for d in DeviceRegistry.load()]
+    mock_bleak.install(nodes)
+    import bleak_client
+
+Each payload carries the node's send time ("ts") and a sequence number ("n") next to the sensor values, which
+go through the hub untouched, so consumers can measure latency and loss. Nodes can drop notifications and
+disconnect at random to exercise the recovery paths.
+"""
+import asyncio
+import random
+import sys
+import time
+import types
+
+import msgpack
+
+
+class BLEDevice:
+    def __init__(self, address, name=None):
+        self.address = address
+        self.name = name
+
+    def __repr__(self):
+        return f"BLEDevice({self.address}, {self.name})"
+
+
+class BleakGATTCharacteristic:
+    def __init__(self, uuid):
+        self.uuid = uuid
+
+
+class SimulatedNode:
+    """A sensor node: three MPUs and two QMCs on the arms, one MPU on the legs (like the real nodes)."""
+
+    def __init__(self, address, name, period=0.033, drop_rate=0.0, disconnect_rate=0.0, seed=None):
+        self.address = address.upper()
+        self.name = name
+        self.period = period
+        # Chance of a notification being lost, and of a disconnection, per notification
+        self.drop_rate = drop_rate
+        self.disconnect_rate = disconnect_rate
+        self.rng = random.Random(seed)
+
+        self.client = None
+        self.sent = 0
+        self.dropped = 0
+        self.disconnects = 0
+
+    @property
+    def arm(self):
+        return "ARM" in self.name.upper()
+
+    def _mpu(self):
+        # Scaled integers, in the units of the nodes (see benchmarks/synthetic.py)
+        rng = self.rng
+        return {
+            "a": [rng.randint(-2000, 2000) for _ in range(3)],
+            "g": [rng.randint(-1000, 1000) for _ in range(3)],
+            "q": [rng.randint(-1000, 1000) for _ in range(4)],
+            "e": [rng.randint(-180, 180) for _ in range(3)],
+        }
+
+    def payload(self) -> bytes:
+        payload = {"mpu": [self._mpu()], "qmc": None, "ts": time.time(), "n": self.sent}
+        if self.arm:
+            payload["mpu"] += [self._mpu(), self._mpu()]
+            payload["qmc"] = [{"m": [self.rng.randint(-5000, 5000) for _ in range(3)]} for _ in range(2)]
+        return msgpack.packb(payload)
+
+    async def notify_loop(self, client, characteristic, callback):
+        next_time = time.perf_counter()
+        while client.notifying:
+            next_time += self.period
+            await asyncio.sleep(max(next_time - time.perf_counter(), 0))
+            if not client.notifying:
+                return
+
+            if self.rng.random() < self.disconnect_rate:
+                self.disconnects += 1
+                client.drop_connection()
+                return
+
+            data = self.payload()
+            self.sent += 1
+            if self.rng.random() < self.drop_rate:
+                self.dropped += 1
+                continue
+
+            callback(characteristic, bytearray(data))
+
+
+# Nodes by address, set by install()
+nodes: dict = {}
+
+
+class BleakScanner:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    @property
+    def discovered_devices(self):
+        # Connected nodes stop advertising
+        return [BLEDevice(n.address, n.name) for n in nodes.values() if n.client is None]
+
+
+class BleakClient:
+    def __init__(self, device, disconnected_callback=None, **kwargs):
+        self.address = device.address if isinstance(device, BLEDevice) else str(device)
+        self.node = nodes.get(self.address.upper())
+        self.disconnected_callback = disconnected_callback
+        self.is_connected = False
+        self.notifying = False
+        self.task = None
+
+    async def connect(self, **kwargs):
+        if self.node is None or self.node.client is not None:
+            raise OSError(f"Device {self.address} not found")
+
+        self.node.client = self
+        self.is_connected = True
+        return True
+
+    async def get_services(self):
+        return []
+
+    async def start_notify(self, uuid, callback, **kwargs):
+        if not self.is_connected:
+            raise OSError("Not connected")
+
+        self.notifying = True
+        self.task = asyncio.create_task(self.node.notify_loop(self, BleakGATTCharacteristic(uuid), callback))
+
+    async def stop_notify(self, uuid):
+        self.notifying = False
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def drop_connection(self):
+        """Connection lost on the node side."""
+        self._close()
+        if self.disconnected_callback is not None:
+            self.disconnected_callback(self)
+
+    async def disconnect(self):
+        if self.is_connected:
+            self._close()
+        return True
+
+    def _close(self):
+        self.is_connected = False
+        self.notifying = False
+        if self.node is not None and self.node.client is self:
+            self.node.client = None
+
+
+def install(simulated_nodes):
+    """Register this module as bleak (and the submodules the hub imports) in sys.modules."""
+    nodes.clear()
+    nodes.update({n.address: n for n in simulated_nodes})
+
+    modules = {
+        "bleak": {"BleakClient": BleakClient, "BleakScanner": BleakScanner, "BLEDevice": BLEDevice},
+        "bleak.backends": {},
+        "bleak.backends.characteristic": {"BleakGATTCharacteristic": BleakGATTCharacteristic},
+    }
+
+    for name, attrs in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        module.__all__ = list(attrs)
+        sys.modules[name] = module
@@ -0,0 +1,176 @@
+"""Stand-in for bluez_peripheral that needs no dbus or Bluetooth adapter.
+
+Call `install()` before importing bleak_client or Peripheral_Central_Combined. Services can then be
+created and registered as usual, and clients subscribe to characteristics in-process:
+
+    service.combined_data.subscribe(lambda value: ...)
+
+Registered services are kept in `registered_services`, e.g. to find the service a script created.
+"""
+import sys
+import types
+from enum import Flag, auto
+
+
+class CharacteristicFlags(Flag):
+    BROADCAST = auto()
+    READ = auto()
+    WRITE_WITHOUT_RESPONSE = auto()
+    WRITE = auto()
+    NOTIFY = auto()
+    INDICATE = auto()
+
+
+DescriptorFlags = CharacteristicFlags
+
+# Services in the order they were registered
+registered_services = []
+
+
+class BoundCharacteristic:
+    """A characteristic of one service instance."""
+
+    def __init__(self, definition, service):
+        self.definition = definition
+        self.service = service
+        self.subscribers = []
+        self.notified = 0
+
+    @property
+    def uuid(self):
+        return self.definition.uuid
+
+    @property
+    def _notify(self):
+        # Same attribute bluez_peripheral uses to know whether someone is subscribed
+        return len(self.subscribers) > 0
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def changed(self, new_value):
+        self.notified += 1
+        for callback in list(self.subscribers):
+            callback(new_value)
+
+    def read(self, options=None):
+        return self.definition.getter_func(self.service, options)
+
+    def write(self, value, options=None):
+        self.definition.setter_func(self.service, value, options)
+
+
+class characteristic:
+    def __init__(self, uuid, flags=CharacteristicFlags.READ):
+        self.uuid = uuid
+        self.flags = flags
+        self.getter_func = None
+        self.setter_func = None
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __call__(self, getter_func=None, setter_func=None):
+        self.getter_func = getter_func
+        self.setter_func = setter_func
+        return self
+
+    def setter(self, setter_func):
+        self.setter_func = setter_func
+        return self
+
+    def descriptor(self, uuid, flags=DescriptorFlags.READ):
+        return descriptor(uuid, self, flags)
+
+    def __get__(self, service, owner=None):
+        if service is None:
+            return self
+
+        bound = service.__dict__.get(("characteristic", self.name))
+        if bound is None:
+            bound = service.__dict__[("characteristic", self.name)] = BoundCharacteristic(self, service)
+        return bound
+
+
+class descriptor:
+    def __init__(self, uuid, characteristic, flags=DescriptorFlags.READ):
+        self.uuid = uuid
+        self.characteristic = characteristic
+        self.flags = flags
+
+    def __call__(self, getter_func=None, setter_func=None):
+        self.getter_func = getter_func
+        return self
+
+
+class Service:
+    def __init__(self, uuid, primary=True, includes=None):
+        self.uuid = uuid
+        self.primary = primary
+        self.registered = False
+
+    def characteristics(self) -> dict:
+        """All characteristics of this service by UUID."""
+        result = {}
+        for name in dir(type(self)):
+            if isinstance(getattr(type(self), name, None), characteristic):
+                bound = getattr(self, name)
+                result[bound.uuid] = bound
+        return result
+
+    async def register(self, bus, path=None, adapter=None):
+        self.registered = True
+        registered_services.append(self)
+
+
+class MessageBus:
+    async def wait_for_disconnect(self):
+        pass
+
+
+class Adapter:
+    @classmethod
+    async def get_first(cls, bus):
+        return cls()
+
+
+class Advertisement:
+    def __init__(self, localName, serviceUUIDs, appearance, timeout=0, *args, **kwargs):
+        self.local_name = localName
+        self.service_uuids = serviceUUIDs
+
+    async def register(self, bus, adapter=None, path=None):
+        pass
+
+
+class NoIoAgent:
+    async def register(self, bus, default=True, path=None):
+        pass
+
+
+async def get_message_bus():
+    return MessageBus()
+
+
+def install():
+    """Register this module as bluez_peripheral and its submodules in sys.modules."""
+    modules = {
+        "bluez_peripheral": {},
+        "bluez_peripheral.gatt": {},
+        "bluez_peripheral.gatt.service": {"Service": Service},
+        "bluez_peripheral.gatt.characteristic": {"characteristic": characteristic, "CharacteristicFlags": CharacteristicFlags},
+        "bluez_peripheral.gatt.descriptor": {"descriptor": descriptor, "DescriptorFlags": DescriptorFlags},
+        "bluez_peripheral.util": {"Adapter": Adapter, "get_message_bus": get_message_bus, "MessageBus": MessageBus},
+        "bluez_peripheral.advert": {"Advertisement": Advertisement},
+        "bluez_peripheral.agent": {"NoIoAgent": NoIoAgent},
+    }
+
+    for name, attrs in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        module.__all__ = list(attrs)
+        sys.modules[name] = module
@@ -0,0 +1,235 @@
+"""On-demand profiling of the hub scripts.
+
+- `SamplingProfiler` samples the stacks of every thread from a background thread and dumps them in the
+  collapsed format of flamegraph.pl / speedscope ("thread;module:function;... count" per line).
+- `SPANS` times named spans of the hot path and logs a summary (count, mean, max, total) every interval.
+  When disabled, `SPANS.span(name)` returns a shared no-op context manager, so the overhead is a method call.
+
+Both can be toggled on a running hub with signals (see `install_signal_handlers`):
+
+    kill -USR1 <pid>    # start the sampling profiler, send again to stop and write profile-<time>.folded
+    kill -USR2 <pid>    # toggle the span summaries
+"""
+import contextlib
+import datetime
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_SPAN_INTERVAL = 10.0
+
+
+class SamplingProfiler:
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self):
+        if self.running:
+            return
+
+        self.stacks.clear()
+        self.samples = 0
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+
+        while not self.stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+
+                functions = []
+                while frame is not None:
+                    code = frame.f_code
+                    functions.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+
+                functions.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(functions))] += 1
+
+            self.samples += 1
+
+    def dump(self, path) -> str:
+        """Write the collapsed stacks (most frequent first) and return the path."""
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def profile_for(self, seconds, path):
+        """Profile for `seconds` in the background, then write the stacks to `path`."""
+        self.start()
+
+        def stop_and_dump():
+            self.stop()
+            self.dump(path)
+
+        timer = threading.Timer(seconds, stop_and_dump)
+        timer.daemon = True
+        timer.start()
+
+
+class _Span:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+
+
+_NO_SPAN = contextlib.nullcontext()
+
+
+class SpanTimer:
+    """Durations of named spans, summarized in the log every `interval` seconds while enabled."""
+
+    def __init__(self):
+        self.enabled = False
+        self.logger = None
+        self.interval = DEFAULT_SPAN_INTERVAL
+        self.lock = threading.Lock()
+        # name -> [count, total, max]
+        self.stats = {}
+        self.last_summary = time.monotonic()
+
+    def enable(self, logger, interval=DEFAULT_SPAN_INTERVAL):
+        with self.lock:
+            self.logger = logger
+            self.interval = interval
+            self.stats = {}
+            self.last_summary = time.monotonic()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name):
+        """Context manager timing its block (from any thread)."""
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name)
+
+    def record(self, name, duration):
+        now = time.monotonic()
+
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += duration
+            if duration > stats[2]:
+                stats[2] = duration
+
+            if now - self.last_summary < self.interval:
+                return
+
+            elapsed = now - self.last_summary
+            self.last_summary = now
+            summary, self.stats = self.stats, {}
+
+        self._log_summary(summary, elapsed)
+
+    def _log_summary(self, summary, elapsed):
+        lines = [f"Spans in the last {elapsed:.1f}s:"]
+        for name, (count, total, longest) in sorted(summary.items(), key=lambda item: -item[1][1]):
+            lines.append(
+                f"  {name:<24} {count:7d} calls  mean {total / count * 1000:8.3f}ms  "
+                f"max {longest * 1000:8.3f}ms  total {total / elapsed * 100:5.1f}%"
+            )
+        self.logger.info("\n".join(lines))
+
+
+# Shared by the hub scripts
+SPANS = SpanTimer()
+
+
+def install_signal_handlers(logger, profiler=None, output_dir=".", span_interval=DEFAULT_SPAN_INTERVAL,
+                            profile_signal=signal.SIGUSR1, spans_signal=signal.SIGUSR2):
+    """Toggle the sampling profiler with `profile_signal` and the span summaries with `spans_signal`.
+
+    Must be called from the main thread. Returns the profiler.
+    """
+    if profiler is None:
+        profiler = SamplingProfiler()
+
+    def toggle_profiler(signum, frame):
+        if not profiler.running:
+            profiler.start()
+            logger.info("Sampling profiler started")
+            return
+
+        # Stop and write the stacks outside of the signal handler
+        path = os.path.join(output_dir, f"profile-{datetime.datetime.now():%Y%m%d_%H%M%S}.folded")
+
+        def stop_and_dump():
+            profiler.stop()
+            profiler.dump(path)
+            logger.info("Wrote %d samples to %s", profiler.samples, path)
+
+        threading.Thread(target=stop_and_dump, daemon=True).start()
+
+    def toggle_spans(signum, frame):
+        if SPANS.enabled:
+            SPANS.disable()
+            logger.info("Span summaries disabled")
+        else:
+            SPANS.enable(logger, span_interval)
+            logger.info("Span summaries enabled")
+
+    signal.signal(profile_signal, toggle_profiler)
+    signal.signal(spans_signal, toggle_spans)
+    return profiler
+
+
+def add_arguments(parser):
+    """Profiling options shared by the hub scripts, see `apply_arguments`."""
+    parser.add_argument("--profile", type=float, metavar="SECONDS", help="run the sampling profiler for SECONDS at startup")
+    parser.add_argument("--profile-output", default=".", metavar="FOLDER", help="where profiles are written")
+    parser.add_argument("--spans", type=float, metavar="SECONDS", help="log a summary of the timing spans every SECONDS")
+
+
+def apply_arguments(args, logger):
+    profiler = install_signal_handlers(logger, output_dir=args.profile_output)
+
+    if args.profile:
+        path = os.path.join(args.profile_output, f"profile-{datetime.datetime.now():%Y%m%d_%H%M%S}.folded")
+        profiler.profile_for(args.profile, path)
+        logger.info("Profiling for %.0fs into %s", args.profile, path)
+
+    if args.spans:
+        SPANS.enable(logger, args.spans)
+
+    return profiler
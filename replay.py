@@ -0,0 +1,126 @@
+"""Replay recorded sessions with their original timing, in real time, N times faster, or as fast as possible.
+
+Frames are streamed lazily from the recording and handed to a sink, either the hub's
+`CentralService.update_combined_data` path or a local UDP socket.
+"""
+import argparse
+import asyncio
+import socket
+import time
+
+from debug_helper import get_data_cycle, iter_recorded_frames
+from frame_codec import encode_frame
+
+# Gaps longer than this (e.g. between recordings) are shortened to it
+MAX_GAP = 2.0
+
+
+class ReplayEngine:
+    """Sends frames to `sink` keeping the recorded gaps between their "t" values, divided by `speed`.
+
+    A speed of 0 sends frames as fast as possible.
+    """
+
+    def __init__(self, frames, speed=1.0, max_gap=MAX_GAP):
+        self.frames = frames
+        self.speed = speed
+        self.max_gap = max_gap
+
+        self.sent = 0
+        self.late = 0.0
+
+    async def run(self, sink, limit=None):
+        start_wall = time.perf_counter()
+        # Recorded time elapsed since the first frame, with long gaps shortened
+        recorded_elapsed = 0.0
+        prev_t = None
+
+        for frame in self.frames:
+            t = frame.get("t")
+            if prev_t is not None and t is not None:
+                gap = t - prev_t
+                # Time going backwards means the recording started over
+                if gap >= 0:
+                    recorded_elapsed += min(gap, self.max_gap)
+            if t is not None:
+                prev_t = t
+
+            if self.speed:
+                delay = start_wall + recorded_elapsed / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.late = max(self.late, -delay)
+            elif self.sent % 100 == 0:
+                # Let other tasks (e.g. dbus notifications) run
+                await asyncio.sleep(0)
+
+            result = sink(frame)
+            if asyncio.iscoroutine(result):
+                await result
+
+            self.sent += 1
+            if limit is not None and self.sent >= limit:
+                break
+
+        return self.sent
+
+
+def central_service_sink(central_service):
+    """Sink sending frames the same way bleak_client does."""
+
+    def sink(frame):
+        central_service.update_combined_data(encode_frame(frame))
+        central_service.publish("raw", frame)
+
+    return sink
+
+
+class SocketSink:
+    """Sends each encoded frame as one UDP datagram. Frames are dropped if the socket buffer is full."""
+
+    def __init__(self, host="127.0.0.1", port=5005):
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.dropped = 0
+
+    def __call__(self, frame):
+        try:
+            self.sock.sendto(encode_frame(frame), self.address)
+        except (BlockingIOError, ConnectionRefusedError):
+            self.dropped += 1
+
+    def close(self):
+        self.sock.close()
+
+
+async def replay_to_socket(folder, speed, host, port, loop, limit):
+    frames = get_data_cycle(folder) if loop else iter_recorded_frames(folder)
+    engine = ReplayEngine(frames, speed)
+    sink = SocketSink(host, port)
+
+    start = time.perf_counter()
+    sent = await engine.run(sink, limit)
+    elapsed = time.perf_counter() - start
+    sink.close()
+
+    print(f"Sent {sent} frames in {elapsed:.2f}s ({sent / elapsed if elapsed else 0:.1f} frames/s)")
+    print(f"Dropped: {sink.dropped}, max lateness: {engine.late * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded session to a local UDP socket")
+    parser.add_argument("folder", help="folder of JSON files saved by Peripheral_Central_Combined")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed multiplier, 0 for as fast as possible")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5005)
+    parser.add_argument("--loop", action="store_true", help="start over when the recording ends")
+    parser.add_argument("--limit", type=int, help="stop after this many frames")
+    args = parser.parse_args()
+
+    asyncio.run(replay_to_socket(args.folder, args.speed, args.host, args.port, args.loop, args.limit))
+
+
+if __name__ == "__main__":
+    main()
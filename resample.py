@@ -0,0 +1,380 @@
+"""Resampling of sensor streams with uneven timestamps onto the fixed sample grid of the dataset.
+
+Vectors are interpolated linearly and quaternions with SLERP. Grid points inside a gap longer than `max_gap`
+are NaN instead of being interpolated across the gap.
+
+Offline, converted CSV files (see convert_test_data.ipynb) can be resampled with:
+
+    python resample.py test_data_06_09_walking.csv [OUTPUT] [--period 33] [--max-gap 200]
+
+On the hub, `FrameResampler` does the same for combined frames as they arrive.
+"""
+import argparse
+import math
+import os
+
+import numpy as np
+
+from feature_extraction import SENSOR_BLOCKS
+
+# OPPORTUNITY is sampled at 30Hz, timestamps are in ms
+DATASET_PERIOD_MS = 33
+# Gaps longer than this are not interpolated
+DEFAULT_MAX_GAP_MS = 200
+
+# Keys of the values inside a node payload, and their number of components
+LINEAR_KEYS = ("a", "g", "m", "e")
+QUATERNION_KEY = "q"
+
+# Below this angle between quaternions, SLERP falls back to normalized linear interpolation
+SLERP_MIN_ANGLE = 1e-6
+
+
+def uniform_grid(start, end, period):
+    """Multiples of `period` from `start` to `end` (included)."""
+    return np.arange(math.ceil(start / period), math.floor(end / period) + 1) * float(period)
+
+
+def prepare(times, values):
+    """Drop rows with NaN values, sort by time and keep the first sample of duplicate times."""
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+
+    valid = ~np.isnan(times) & ~np.isnan(values).any(axis=1)
+    times, values = times[valid], values[valid]
+
+    times, first = np.unique(times, return_index=True)
+    return times, values[first]
+
+
+def bracket(times, grid, max_gap):
+    """For each grid time, the indices of the samples around it, the interpolation weight,
+    and whether it can be interpolated (inside the samples and not in a gap). `times` must be strictly increasing.
+    """
+    n = len(times)
+    if n < 2:
+        zeros = np.zeros(len(grid), dtype=np.intp)
+        valid = np.zeros(len(grid), dtype=bool)
+        if n == 1:
+            valid = grid == times[0]
+        return zeros, zeros, np.zeros(len(grid)), valid
+
+    right = np.clip(np.searchsorted(times, grid, side="right"), 1, n - 1)
+    left = right - 1
+
+    t0 = times[left]
+    dt = times[right] - t0
+    weight = (grid - t0) / dt
+
+    # Grid times on a sample are kept even next to a gap
+    on_sample = (grid == t0) | (grid == times[right])
+    valid = (grid >= times[0]) & (grid <= times[-1]) & ((dt <= max_gap) | on_sample)
+    return left, right, weight, valid
+
+
+def interpolate_linear(times, values, grid, max_gap):
+    """Linear interpolation of (n, k) `values` at `grid`, NaN in gaps."""
+    times, values = prepare(times, values)
+    left, right, weight, valid = bracket(times, grid, max_gap)
+
+    out = np.full((len(grid), values.shape[1]), np.nan)
+    if valid.any():
+        l, r, w = left[valid], right[valid], weight[valid, None]
+        out[valid] = values[l] + w * (values[r] - values[l])
+    return out
+
+
+def slerp(q0, q1, weight):
+    """Spherical linear interpolation between rows of unit quaternions (n, 4), taking the shortest path."""
+    dot = np.einsum("ij,ij->i", q0, q1)
+
+    # q and -q are the same rotation
+    q1 = np.where(dot[:, None] < 0, -q1, q1)
+    dot = np.clip(np.abs(dot), 0.0, 1.0)
+
+    angle = np.arccos(dot)
+    sin_angle = np.sin(angle)
+    small = sin_angle < SLERP_MIN_ANGLE
+    safe_sin = np.where(small, 1.0, sin_angle)
+
+    s0 = np.where(small, 1 - weight, np.sin((1 - weight) * angle) / safe_sin)
+    s1 = np.where(small, weight, np.sin(weight * angle) / safe_sin)
+
+    q = s0[:, None] * q0 + s1[:, None] * q1
+    return q / np.linalg.norm(q, axis=1, keepdims=True)
+
+
+def interpolate_quaternions(times, quaternions, grid, max_gap):
+    """SLERP of (n, 4) quaternions at `grid`, NaN in gaps.
+
+    Quaternions don't have to be normalized (nodes send them scaled), the norm is interpolated linearly.
+    """
+    times, quaternions = prepare(times, quaternions)
+    left, right, weight, valid = bracket(times, grid, max_gap)
+
+    out = np.full((len(grid), 4), np.nan)
+    if not valid.any():
+        return out
+
+    norms = np.linalg.norm(quaternions, axis=1)
+    # All-zero quaternions are missing orientations
+    norms[norms == 0] = np.nan
+    units = quaternions / norms[:, None]
+
+    l, r, w = left[valid], right[valid], weight[valid]
+    scale = norms[l] + w * (norms[r] - norms[l])
+    out[valid] = slerp(units[l], units[r], w) * scale[:, None]
+    return out
+
+
+def interpolate_hold(times, values, grid, max_gap):
+    """Previous value at `grid` (e.g. for label columns), NaN in gaps."""
+    times, values = prepare(times, values)
+    left, right, weight, valid = bracket(times, grid, max_gap)
+
+    out = np.full((len(grid), values.shape[1]), np.nan)
+    if valid.any():
+        # The right sample if the grid time is exactly on it
+        index = np.where(weight[valid] >= 1.0, right[valid], left[valid])
+        out[valid] = values[index]
+    return out
+
+
+def resample_columns(times, values, grid, max_gap, quaternion_groups=(), hold_columns=()):
+    """Resample every column of a (n, c) array at `grid`.
+
+    Columns in `quaternion_groups` (tuples of 4 column indices) use SLERP and columns in `hold_columns` keep
+    their previous value. Every other column is interpolated linearly, each with its own missing values.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full((len(grid), values.shape[1]), np.nan)
+
+    special = set(hold_columns)
+    for group in quaternion_groups:
+        group = list(group)
+        special.update(group)
+        out[:, group] = interpolate_quaternions(times, values[:, group], grid, max_gap)
+
+    for column in hold_columns:
+        out[:, column] = interpolate_hold(times, values[:, column], grid, max_gap)[:, 0]
+
+    for column in range(values.shape[1]):
+        if column in special or np.isnan(values[:, column]).all():
+            continue
+        out[:, column] = interpolate_linear(times, values[:, column], grid, max_gap)[:, 0]
+
+    return out
+
+
+class StreamingResampler:
+    """Resamples one stream sample by sample onto a grid of multiples of `period`.
+
+    `push(t, value)` returns the grid samples between the previous sample and this one, as (time, value) pairs.
+    Grid samples in a gap longer than `max_gap` are NaN.
+    """
+
+    def __init__(self, period, max_gap, quaternion=False):
+        self.period = period
+        self.max_gap = max_gap
+        self.interpolate = interpolate_quaternions if quaternion else interpolate_linear
+
+        self.last_time = None
+        self.last_value = None
+        # Grid times are next_index * period, counted from 0 so that every stream shares the same grid
+        self.next_index = None
+
+    def push(self, t, value):
+        value = np.asarray(value, dtype=np.float64)
+
+        if self.last_time is None or t < self.last_time:
+            # First sample, or time went back (e.g. the recording restarted)
+            self.next_index = math.ceil(t / self.period)
+            self.last_time, self.last_value = t, value
+
+            if self.next_index * self.period == t:
+                self.next_index += 1
+                return [(t, value)]
+            return []
+
+        if t == self.last_time:
+            # Keep the first of duplicate samples
+            return []
+
+        end_index = math.floor(t / self.period)
+        indices = np.arange(self.next_index, end_index + 1)
+        times = np.array([self.last_time, t])
+        values = np.stack([self.last_value, value])
+        self.last_time, self.last_value = t, value
+
+        if len(indices) == 0:
+            return []
+
+        self.next_index = end_index + 1
+        grid = indices * self.period
+        return list(zip(grid.tolist(), self.interpolate(times, values, grid, self.max_gap)))
+
+    def clear(self):
+        self.last_time = None
+        self.last_value = None
+        self.next_index = None
+
+
+def iter_channels(device_data):
+    """Yield (channel_name, values) for every value of a node payload, e.g. ("mpu0.q", [w, x, y, z])."""
+    if not device_data:
+        return
+
+    for block in SENSOR_BLOCKS:
+        for i, sensor in enumerate(device_data.get(block) or []):
+            if not sensor:
+                continue
+
+            for key, v in sensor.items():
+                if v is not None and (key in LINEAR_KEYS or key == QUATERNION_KEY):
+                    yield f"{block}{i}.{key}", v
+
+
+def build_payload(channels):
+    """Inverse of `iter_channels`. Sensors without any value are None, like missing sensors in node payloads."""
+    payload = {}
+    for channel, v in channels.items():
+        sensor_name, key = channel.split(".")
+        block = sensor_name.rstrip("0123456789")
+        index = int(sensor_name[len(block):])
+
+        sensors = payload.setdefault(block, [])
+        while len(sensors) <= index:
+            sensors.append(None)
+        if sensors[index] is None:
+            sensors[index] = {}
+        sensors[index][key] = v
+
+    return payload
+
+
+class FrameResampler:
+    """Resamples combined frames ({"t": ..., "LA": {"d": payload, "s": status}, ...}) onto a uniform grid.
+
+    Each device channel has its own `StreamingResampler`. A grid frame is emitted once every channel that notified
+    in the last `max_gap` seconds has passed its time. Values in gaps are left out of the payloads.
+    """
+
+    def __init__(self, period, max_gap):
+        self.period = period
+        self.max_gap = max_gap
+        self.resamplers: dict[str, dict[str, StreamingResampler]] = {}
+        self.statuses = {}
+        # Grid index -> {device: {channel: value}}
+        self.pending: dict[int, dict] = {}
+        self.next_index = None
+
+    def push(self, combined: dict) -> list:
+        t = combined["t"]
+
+        for device, entry in combined.items():
+            if device == "t" or not isinstance(entry, dict):
+                continue
+
+            self.statuses[device] = entry.get("s")
+            device_resamplers = self.resamplers.setdefault(device, {})
+
+            for channel, v in iter_channels(entry.get("d")):
+                resampler = device_resamplers.get(channel)
+                if resampler is None:
+                    resampler = device_resamplers[channel] = StreamingResampler(
+                        self.period, self.max_gap, channel.endswith("." + QUATERNION_KEY)
+                    )
+
+                for grid_time, value in resampler.push(t, v):
+                    index = round(grid_time / self.period)
+                    if not np.isnan(value).any() and (self.next_index is None or index >= self.next_index):
+                        self.pending.setdefault(index, {}).setdefault(device, {})[channel] = value.tolist()
+
+        # Channels that stopped notifying don't hold back the others
+        active = [
+            r.last_time for rs in self.resamplers.values() for r in rs.values()
+            if r.last_time is not None and t - r.last_time <= self.max_gap
+        ]
+        if not active:
+            return []
+        complete = math.floor(min(active) / self.period)
+
+        frames = []
+        for index in sorted(i for i in self.pending if i <= complete):
+            devices = self.pending.pop(index)
+            frame = {"t": index * self.period}
+            for device in self.resamplers:
+                frame[device] = {"d": build_payload(devices.get(device, {})), "s": self.statuses.get(device)}
+            frames.append(frame)
+
+        if frames:
+            self.next_index = round(frames[-1]["t"] / self.period) + 1
+        return frames
+
+    def clear(self):
+        self.resamplers.clear()
+        self.statuses.clear()
+        self.pending.clear()
+        self.next_index = None
+
+
+def quaternion_groups_from_names(names):
+    """Column indices of each quaternion in OPPORTUNITY column names (QuaternionX1 to QuaternionX4)."""
+    groups = []
+    for i, name in enumerate(names):
+        if name.endswith("Quaternion1") and i + 3 < len(names):
+            groups.append((i, i + 1, i + 2, i + 3))
+    return groups
+
+
+def resample_csv(input_path, output_path, period=DATASET_PERIOD_MS, max_gap=DEFAULT_MAX_GAP_MS, column_names_path=None):
+    """Resample a converted CSV file (space separated, time in ms in the first column)."""
+    # pandas is only needed offline
+    import pandas as pd
+
+    df = pd.read_csv(input_path, sep=" ", header=None, na_values="NaN")
+    times = df.iloc[:, 0].to_numpy(dtype=np.float64)
+    values = df.iloc[:, 1:].to_numpy(dtype=np.float64)
+
+    quaternion_groups = []
+    hold_columns = []
+    if column_names_path is not None and os.path.exists(column_names_path):
+        from add_col_names import read_column_names
+
+        with open(column_names_path, "r") as f:
+            data_names, label_names = read_column_names(f.readlines())
+
+        # Without the time column
+        quaternion_groups = quaternion_groups_from_names(data_names[1:])
+        hold_columns = [c for c in range(len(data_names) - 1, values.shape[1])]
+
+    times = times - times[0]
+    grid = uniform_grid(0, times[-1], period)
+    resampled = resample_columns(times, values, grid, max_gap, quaternion_groups, hold_columns)
+
+    out = pd.DataFrame(np.column_stack([grid, resampled]).round()).astype("Int64")
+    out.to_csv(output_path, sep=" ", index=False, na_rep="NaN", header=False)
+
+    gap_rows = int(np.isnan(resampled).all(axis=1).sum())
+    print(f"Resampled {len(times)} rows to {len(grid)} rows every {period}ms ({gap_rows} rows in gaps)")
+
+
+def main():
+    from add_col_names import COLUMN_NAMES
+
+    parser = argparse.ArgumentParser(description="Resample a converted CSV file onto the dataset's sample grid")
+    parser.add_argument("input")
+    parser.add_argument("output", nargs="?", help="defaults to INPUT with a .resampled.csv extension")
+    parser.add_argument("--period", type=float, default=DATASET_PERIOD_MS, help="grid period in ms")
+    parser.add_argument("--max-gap", type=float, default=DEFAULT_MAX_GAP_MS, help="longest gap to interpolate in ms")
+    parser.add_argument("--column-names", default=COLUMN_NAMES, help="used to find quaternion and label columns")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.input)[0] + ".resampled.csv"
+    resample_csv(args.input, output, args.period, args.max_gap, args.column_names)
+
+
+if __name__ == "__main__":
+    main()
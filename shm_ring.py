@@ -0,0 +1,170 @@
+"""Ring of raw notification packets in shared memory, written by one process and read by several.
+
+Each slot holds one packet: a sequence number, the receive time, the device address and status, and the
+payload. The writer never waits for readers. A reader that falls more than a ring behind skips ahead and counts
+the skipped packets in `lost`, and a slot that is overwritten while being read is detected with its sequence
+number (written last by the writer, checked before and after copying by the reader).
+"""
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+DEFAULT_SLOTS = 4096
+# Node payloads are below 512 bytes (see bleak_client)
+DEFAULT_SLOT_SIZE = 512
+
+ADDRESS_SIZE = 17
+
+# saved_seq is the position of the reader that continues across restarts (see RingReader.save_position)
+HEADER_DTYPE = np.dtype([("write_seq", "<u8"), ("slots", "<u4"), ("slot_size", "<u4"), ("saved_seq", "<u8")])
+HEADER_SIZE = 64
+
+
+def slot_dtype(slot_size):
+    return np.dtype([
+        ("seq", "<u8"),
+        ("t", "<f8"),
+        ("address", f"S{ADDRESS_SIZE}"),
+        ("status", "u1"),
+        ("length", "<u2"),
+        ("data", "u1", (slot_size,)),
+    ])
+
+
+class SharedRing:
+    def __init__(self, name=None, slots=DEFAULT_SLOTS, slot_size=DEFAULT_SLOT_SIZE, create=False):
+        """Create a new ring (`create=True`, with a generated name if None) or attach to the ring `name`."""
+        if create:
+            size = HEADER_SIZE + slots * slot_dtype(slot_size).itemsize
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name)
+
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        if create:
+            self.header["write_seq"] = 0
+            self.header["saved_seq"] = 0
+            self.header["slots"] = slots
+            self.header["slot_size"] = slot_size
+
+        self.slot_count = int(self.header["slots"])
+        self.slot_size = int(self.header["slot_size"])
+        self.slots = np.ndarray(
+            (self.slot_count,), dtype=slot_dtype(self.slot_size), buffer=self.shm.buf, offset=HEADER_SIZE
+        )
+        self.owner = create
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def write_seq(self):
+        return int(self.header["write_seq"])
+
+    @property
+    def saved_seq(self):
+        return int(self.header["saved_seq"])
+
+    def close(self):
+        # The arrays must be released before the shared memory is closed
+        self.header = None
+        self.slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingWriter:
+    """Writes packets into the ring, from any thread of the writing process."""
+
+    def __init__(self, ring: SharedRing):
+        self.ring = ring
+        self.lock = threading.Lock()
+        self.oversized = 0
+
+    def write(self, t, address, status, data):
+        length = len(data)
+        if length > self.ring.slot_size:
+            self.oversized += 1
+            return False
+
+        with self.lock:
+            seq = self.ring.write_seq + 1
+            slot = self.ring.slots[seq % self.ring.slot_count]
+
+            # Mark the slot as being written
+            slot["seq"] = 0
+            slot["t"] = t
+            slot["address"] = address.encode()
+            slot["status"] = status
+            slot["length"] = length
+            slot["data"][:length] = np.frombuffer(data, dtype=np.uint8)
+            slot["seq"] = seq
+
+            self.ring.header["write_seq"] = seq
+
+        return True
+
+
+class RingReader:
+    """Reads the packets written since the last call. Each reader has its own position."""
+
+    def __init__(self, ring: SharedRing, start="latest"):
+        """Start at the "latest" packet, at the "oldest" one still in the ring, or after the "saved" position.
+
+        The saved position is kept in the ring, so a reader that saves it with `save_position` continues where
+        the previous one stopped when its process is restarted. Only one reader of a ring can use it.
+        """
+        self.ring = ring
+        write_seq = ring.write_seq
+        if start == "latest":
+            self.read_seq = write_seq
+        elif start == "saved":
+            self.read_seq = min(ring.saved_seq, write_seq)
+        else:
+            self.read_seq = max(write_seq - ring.slot_count, 0)
+        self.lost = 0
+
+    def read(self) -> list:
+        """List of (t, address, status, data) packets, oldest first."""
+        write_seq = self.ring.write_seq
+        if write_seq - self.read_seq > self.ring.slot_count:
+            # Overwritten before we could read them
+            self.lost += write_seq - self.read_seq - self.ring.slot_count
+            self.read_seq = write_seq - self.ring.slot_count
+
+        packets = []
+        slots = self.ring.slots
+        for seq in range(self.read_seq + 1, write_seq + 1):
+            slot = slots[seq % self.ring.slot_count]
+            if int(slot["seq"]) != seq:
+                self.lost += 1
+                continue
+
+            packet = (float(slot["t"]), slot["address"].decode(), int(slot["status"]), slot["data"][: slot["length"]].tobytes())
+
+            # Overwritten while copying
+            if int(slot["seq"]) != seq:
+                self.lost += 1
+                continue
+
+            packets.append(packet)
+
+        self.read_seq = write_seq
+        return packets
+
+    def save_position(self):
+        """Save the position in the ring, for a reader started with start="saved"."""
+        self.ring.header["saved_seq"] = self.read_seq
+
+    def wait(self, timeout, poll_interval=0.002) -> list:
+        """Read, waiting up to `timeout` seconds for at least one packet."""
+        deadline = time.monotonic() + timeout
+        while True:
+            packets = self.read()
+            if packets or time.monotonic() >= deadline:
+                return packets
+            time.sleep(poll_interval)
@@ -0,0 +1,106 @@
+"""Consistent snapshots of the latest per-device values, and a fixed-size buffer that is saved in the background."""
+import queue
+import threading
+
+from hub_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class LatestValues:
+    """Latest data and status of each device, updated from several threads.
+
+    Data dicts are replaced (never mutated) on update, so a snapshot only copies the outer dicts
+    instead of deep-copying the whole nested structure.
+    """
+
+    def __init__(self, names, statuses):
+        self.lock = threading.Lock()
+        self.values = {name: {"data": {}, "status": int(status)} for name, status in zip(names, statuses)}
+
+    def update(self, name, data=None, status=None):
+        with self.lock:
+            entry = self.values[name]
+            if data is not None:
+                entry["data"] = data
+            if status is not None:
+                entry["status"] = int(status)
+
+    def snapshot(self, t) -> dict:
+        with self.lock:
+            snapshot = {name: dict(entry) for name, entry in self.values.items()}
+        snapshot["time"] = t
+        return snapshot
+
+
+class SnapshotBuffer:
+    """Preallocated buffers of `capacity` snapshots. Full buffers are handed to `save(list)` in a writer thread.
+
+    Only `pool_size` buffers exist, so memory stays flat. If the writer falls behind and no free buffer is left,
+    the full buffer is discarded and counted in `dropped_buffers`. A failed save (e.g. missing folder or full
+    disk) is logged and counted in `failed_saves`, and the writer goes on with the next buffer.
+    """
+
+    def __init__(self, capacity, save, pool_size=3):
+        self.capacity = capacity
+        self.save = save
+
+        self.free = queue.Queue()
+        for _ in range(pool_size - 1):
+            self.free.put([None] * capacity)
+
+        self.current = [None] * capacity
+        self.count = 0
+        self.dropped_buffers = 0
+        self.failed_saves = 0
+
+        self.full = queue.Queue()
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def append(self, snapshot):
+        self.current[self.count] = snapshot
+        self.count += 1
+
+        if self.count == self.capacity:
+            self.flush()
+
+    def flush(self):
+        if self.count == 0:
+            return
+
+        try:
+            next_buffer = self.free.get_nowait()
+        except queue.Empty:
+            # Writer is behind, reuse the current buffer
+            self.dropped_buffers += 1
+            self.count = 0
+            return
+
+        self.full.put((self.current, self.count))
+        self.current = next_buffer
+        self.count = 0
+
+    def close(self):
+        """Save what is left and wait for the writer."""
+        self.flush()
+        self.full.put(None)
+        self.thread.join()
+
+    def _write_loop(self):
+        while True:
+            item = self.full.get()
+            if item is None:
+                return
+
+            buffer, count = item
+            try:
+                self.save(buffer[:count])
+            except Exception as e:
+                self.failed_saves += 1
+                logger.error("Error saving %d snapshots: %s", count, e)
+            finally:
+                # Release the references before reusing the buffer
+                for i in range(count):
+                    buffer[i] = None
+                self.free.put(buffer)
@@ -0,0 +1,241 @@
+"""Soak test of the whole node -> hub -> consumer path on one machine, without Bluetooth.
+
+Simulated nodes (mock_bleak.py) are scanned, connected and notified by bleak_client's own ingest code, the hub
+sends its frames through a mock GATT service (mock_gatt.py), and a central_client FrameConsumer decodes them.
+Every node payload carries its send time and a sequence number, so the consumer measures the end-to-end latency
+and which samples made it. The report (JSON) has:
+
+- latency: node send to consumer decode, p50/p99/max in ms
+- loss: frames sent by the hub and not decoded, and node samples that never reached the consumer (most of them
+  are dropped on purpose by the hub, which only combines one sample per node per loop)
+- memory: RSS after the warmup, at the end, and its growth per hour (e.g. unbounded lists or leaked threads)
+- cpu: process CPU time per frame sent
+
+    python soak.py --duration 3600 --output soak-$(git rev-parse --short HEAD).json [--compare soak-old.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+import mock_bleak
+import mock_gatt
+from device_registry import DeviceRegistry
+
+DEFAULT_DURATION = 60.0
+# Resources are not measured during the warmup (caches, buffers), which starts once every node is connected
+DEFAULT_WARMUP = 10.0
+DEFAULT_NODE_PERIOD = 0.033
+# Seconds between memory and thread samples
+SAMPLE_INTERVAL = 1.0
+# Seconds to wait for every node to be connected before the warmup starts
+CONNECT_TIMEOUT = 30.0
+
+# Metrics printed by --compare, as paths in the report
+COMPARED_METRICS = (
+    ("latency_ms", "p50"),
+    ("latency_ms", "p99"),
+    ("loss", "frame_loss"),
+    ("loss", "sample_delivery"),
+    ("memory", "growth_mb_per_hour"),
+    ("cpu", "ms_per_frame"),
+)
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm", "r") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class SoakRecorder:
+    """Latency of every node sample in the decoded frames, and the sequence numbers seen per device."""
+
+    def __init__(self):
+        self.measuring = False
+        self.latencies = []
+        self.sequences = {}
+        self.frames = 0
+
+    def on_batch(self, batch):
+        now = time.time()
+        for frame in batch:
+            self.frames += 1
+            for device, entry in frame.items():
+                if not isinstance(entry, dict) or not isinstance(entry.get("d"), dict):
+                    continue
+
+                payload = entry["d"]
+                self.sequences.setdefault(device, set()).add(payload.get("n"))
+                if self.measuring and payload.get("ts") is not None:
+                    self.latencies.append(now - payload["ts"])
+
+
+def percentiles_ms(values) -> dict:
+    if not values:
+        return {"p50": None, "p99": None, "max": None, "mean": None}
+
+    values = np.asarray(values) * 1000
+    return {
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p99": round(float(np.percentile(values, 99)), 3),
+        "max": round(float(values.max()), 3),
+        "mean": round(float(values.mean()), 3),
+    }
+
+
+async def run_soak(duration=DEFAULT_DURATION, warmup=DEFAULT_WARMUP, node_period=DEFAULT_NODE_PERIOD, drop_rate=0.0,
+                   disconnect_rate=0.0, seed=0, log_level=logging.CRITICAL) -> dict:
+    nodes = [
+        mock_bleak.SimulatedNode(d.address, d.name, node_period, drop_rate, disconnect_rate, seed=seed + i)
+        for i, d in enumerate(DeviceRegistry.load())
+    ]
+
+    # The stand-ins must be installed before the hub is imported
+    mock_gatt.install()
+    mock_bleak.install(nodes)
+    import bleak_client
+    from central_client import FrameConsumer, LocalTransport
+
+    bleak_client.METRICS_PORT = None
+    bleak_client.logger.setLevel(log_level)
+
+    hub_task = asyncio.create_task(bleak_client.main())
+    while not any(isinstance(s, bleak_client.CentralService) for s in mock_gatt.registered_services):
+        if hub_task.done():
+            hub_task.result()
+        await asyncio.sleep(0.01)
+    service = next(s for s in mock_gatt.registered_services if isinstance(s, bleak_client.CentralService))
+
+    # Batches of one, so frames are measured as soon as they are decoded
+    recorder = SoakRecorder()
+    consumer = FrameConsumer(batch_size=1)
+    transport = LocalTransport(service.combined_data)
+    await transport.start(consumer)
+    consumer_task = asyncio.create_task(consumer.run(recorder.on_batch))
+
+    # The hub connects the nodes one at a time and only sends frames once they are all connected
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while not all(n.client is not None for n in nodes):
+        if hub_task.done():
+            hub_task.result()
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"nodes not connected after {CONNECT_TIMEOUT} s")
+        await asyncio.sleep(0.01)
+
+    await asyncio.sleep(warmup)
+
+    recorder.measuring = True
+    start = time.monotonic()
+    start_cpu = time.process_time()
+    start_notified = service.combined_data.notified
+    start_received = consumer.received
+
+    samples = []
+    while time.monotonic() - start < duration:
+        samples.append((time.monotonic() - start, rss_bytes(), threading.active_count()))
+        await asyncio.sleep(min(SAMPLE_INTERVAL, max(duration - (time.monotonic() - start), 0)))
+    samples.append((time.monotonic() - start, rss_bytes(), threading.active_count()))
+
+    elapsed = time.monotonic() - start
+    cpu = time.process_time() - start_cpu
+    frames_sent = service.combined_data.notified - start_notified
+    frames_received = consumer.received - start_received
+
+    await transport.stop()
+    for task in (consumer_task, hub_task):
+        task.cancel()
+    await asyncio.gather(consumer_task, hub_task, return_exceptions=True)
+
+    times, rss, threads = (np.array(x, dtype=np.float64) for x in zip(*samples))
+    growth_per_second = float(np.polyfit(times, rss, 1)[0]) if len(samples) > 2 else 0.0
+
+    samples_sent = sum(n.sent for n in nodes)
+    delivered = sum(len(s - {None}) for s in recorder.sequences.values())
+
+    return {
+        "commit": git_commit(),
+        "duration": round(elapsed, 3),
+        "nodes": len(nodes),
+        "node_period": node_period,
+        "hub_interval": bleak_client.MAIN_LOOP_INTERVAL,
+        "frames_sent": frames_sent,
+        "frames_received": frames_received,
+        "latency_ms": percentiles_ms(recorder.latencies),
+        "loss": {
+            "frame_loss": round(1 - frames_received / frames_sent, 6) if frames_sent else None,
+            "consumer_dropped": consumer.dropped,
+            "decode_errors": consumer.errors,
+            "samples_sent": samples_sent,
+            "samples_dropped_by_nodes": sum(n.dropped for n in nodes),
+            "samples_delivered": delivered,
+            "sample_delivery": round(delivered / samples_sent, 6) if samples_sent else None,
+        },
+        "disconnects": sum(n.disconnects for n in nodes),
+        "memory": {
+            "rss_start_mb": round(rss[0] / 2**20, 3),
+            "rss_end_mb": round(rss[-1] / 2**20, 3),
+            "rss_max_mb": round(rss.max() / 2**20, 3),
+            "growth_mb_per_hour": round(growth_per_second * 3600 / 2**20, 3),
+        },
+        "threads": {"start": int(threads[0]), "end": int(threads[-1]), "max": int(threads.max())},
+        "cpu": {
+            "percent": round(cpu / elapsed * 100, 2),
+            "ms_per_frame": round(cpu / frames_sent * 1000, 4) if frames_sent else None,
+        },
+    }
+
+
+def compare(report, previous):
+    """Print the main metrics of two reports side by side."""
+    print(f"{'':32}{str(previous.get('commit')):>12}{str(report.get('commit')):>12}")
+    for section, key in COMPARED_METRICS:
+        old, new = previous.get(section, {}).get(key), report.get(section, {}).get(key)
+        change = f"{(new - old) / old * 100:+8.1f}%" if old and new is not None else ""
+        print(f"{section + '.' + key:32}{str(old):>12}{str(new):>12}{change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test of the node -> hub -> consumer path with simulated nodes")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=DEFAULT_WARMUP, help="seconds before measuring")
+    parser.add_argument("--node-period", type=float, default=DEFAULT_NODE_PERIOD, help="seconds between notifications")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="chance of a notification being lost")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="chance of a disconnection per notification")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--compare", metavar="REPORT", help="compare with a previous report")
+    parser.add_argument("--verbose", action="store_true", help="show the warnings and errors of the hub")
+    args = parser.parse_args()
+
+    log_level = logging.WARNING if args.verbose else logging.CRITICAL
+    report = asyncio.run(
+        run_soak(args.duration, args.warmup, args.node_period, args.drop_rate, args.disconnect_rate, args.seed, log_level)
+    )
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
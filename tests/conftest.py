@@ -0,0 +1,9 @@
+"""The tests import the scripts of the repository root, with the stand-in for bluez_peripheral (no dbus needed)."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_gatt  # noqa: E402
+
+mock_gatt.install()
@@ -0,0 +1,34 @@
+"""Alignments of a capture taken from the reference are reliable, those of unrelated signals are not."""
+import numpy as np
+
+from align import estimate_alignment
+
+PERIOD = 0.033
+
+
+def _walk(n, seed):
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) * PERIOD
+    # Steps at a varying cadence on top of gravity
+    xyz = np.stack([np.sin(t * 11), np.cos(t * 7), 1 + 0.5 * np.sin(t * 5 + np.sin(t))], axis=1)
+    return t, xyz + rng.normal(0, 0.3, (n, 3)).cumsum(axis=0) * 0.05
+
+
+def test_capture_from_reference_is_reliable():
+    t, xyz = _walk(3000, 1)
+    start = 600
+    capture_t, capture = t[start:start + 900] - t[start], xyz[start:start + 900] * 0.5
+
+    alignment = estimate_alignment(capture_t, capture, t, xyz, period=PERIOD)
+    assert alignment.reliable()
+    assert abs(alignment.offset - start * PERIOD) < PERIOD
+    assert abs(alignment.scale - 2) < 0.05
+
+
+def test_unrelated_capture_is_not_reliable():
+    t, xyz = _walk(3000, 1)
+    rng = np.random.default_rng(2)
+    capture = rng.normal(0, 1, (900, 3)) + [0, 0, 1]
+
+    alignment = estimate_alignment(t[:900], capture, t, xyz, period=PERIOD)
+    assert not alignment.reliable()
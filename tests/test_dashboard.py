@@ -0,0 +1,126 @@
+"""The dashboard feed: status messages and frames sent by the hub over UDP, and how the dashboard reads them.
+
+The dashboard side needs dash, and is skipped without it.
+"""
+import socket
+import time
+
+import pytest
+
+import bleak_client
+from frame_codec import decode_frame
+from replay import SocketSink
+
+
+def _frames(n):
+    return [{"t": float(i), "LA": {"d": {"mpu": [{"a": [i, 0, 1000]}], "qmc": None}, "s": 1}} for i in range(n)]
+
+
+@pytest.fixture
+def dashboard():
+    pytest.importorskip("dash")
+    import dashboard
+
+    return dashboard
+
+
+@pytest.fixture
+def receiver(dashboard):
+    receiver = dashboard.FeedReceiver(port=0, history=8)
+    receiver.start()
+    yield receiver
+    receiver.close()
+
+
+def _wait(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_status_message():
+    status = bleak_client.dashboard_status()
+    assert status["t"] > 0
+    assert set(status["status"]) == {d.short_name for d in bleak_client.registry}
+    assert all(isinstance(value, int) for value in status["status"].values())
+    assert isinstance(status["drops"], dict)
+
+
+def test_socket_sink_sends_one_datagram_per_frame():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(2.0)
+    sink = SocketSink(port=sock.getsockname()[1])
+    try:
+        for frame in _frames(3):
+            sink(frame)
+        assert [decode_frame(sock.recv(65536)) for _ in range(3)] == _frames(3)
+        assert sink.dropped == 0
+    finally:
+        sink.close()
+        sock.close()
+
+
+def test_receiver_frames_and_status(receiver):
+    sink = SocketSink(port=receiver.sock.getsockname()[1])
+    sink({"t": 1.0, "status": {"LA": 1}, "drops": {}})
+    for frame in _frames(3):
+        sink(frame)
+    sink({"t": 2.0, "status": {"LA": 3}, "drops": {}})
+    sink.close()
+
+    _wait(lambda: receiver.received == 3 and receiver.status is not None and receiver.status["t"] == 2.0)
+    assert receiver.previous_status["status"] == {"LA": 1}
+
+    # A new browser starts from the current position
+    assert receiver.since(None) == ([], 3)
+    assert receiver.since(0) == (_frames(3), 3)
+    assert receiver.since(2) == (_frames(3)[2:], 3)
+    assert receiver.since(3) == ([], 3)
+
+
+def test_receiver_history_and_errors(receiver):
+    sink = SocketSink(port=receiver.sock.getsockname()[1])
+    for frame in _frames(12):
+        sink(frame)
+    sink.sock.sendto(b"not a frame", sink.address)
+    sink.close()
+
+    _wait(lambda: receiver.received == 12 and receiver.errors == 1)
+    # Frames older than the history are gone, a late browser gets the ones that are left
+    assert receiver.since(0) == (_frames(12)[4:], 12)
+
+
+def test_decimate(dashboard):
+    frames = list(range(10))
+    assert dashboard.decimate(frames, budget=25) is frames
+
+    frames = list(range(100))
+    result = dashboard.decimate(frames, budget=25)
+    assert len(result) <= 25
+    assert result[-1] == 99
+    assert result == sorted(result)
+
+
+def test_channel_points(dashboard):
+    frames = _frames(3) + [{"t": 3.0, "LA": {"d": None, "s": 2}}, {"t": 4.0}]
+    times, (x, y, z) = dashboard.channel_points(frames, "LA", "mpu0.a")
+    assert times == [0.0, 1000.0, 2000.0]
+    assert x == [0, 1, 2] and z == [1000] * 3
+    assert dashboard.channel_points(frames, "LA", "mpu1.a") == ([], ([], [], []))
+
+
+def test_drop_rows(dashboard):
+    assert len(dashboard.drop_rows(None, None)) == 1
+
+    previous = {"t": 10.0, "drops": {"late": 4}, "spread": {"count": 10, "sum": 0.5}}
+    status = {"t": 12.0, "drops": {"late": 10, "full": 2}, "spread": {"count": 20, "sum": 1.5}}
+    rows = dashboard.drop_rows(status, previous)
+
+    cells = [[cell.children for cell in row.children] for row in rows[1:]]
+    assert cells == [["full", 2, "1.0"], ["late", 10, "3.0"], ["alignment spread", "", "100ms"]]
+
+    # Without a previous message there is no rate yet
+    cells = [[cell.children for cell in row.children] for row in dashboard.drop_rows(status, None)[1:]]
+    assert cells == [["full", 2, ""], ["late", 10, ""]]
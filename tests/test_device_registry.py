@@ -0,0 +1,82 @@
+"""reload_if_changed applies additions, renames and retirements, and rejects conflicting files as a whole."""
+import json
+import os
+
+import pytest
+
+from device_registry import DeviceRegistry
+
+LA = {"address": "08:D1:F9:C7:14:DE", "name": "LEFT_ARM", "short_name": "LA"}
+RA = {"address": "08:D1:F9:DF:D7:BA", "name": "RIGHT_ARM", "short_name": "RA"}
+LL = {"address": "CD:C8:D6:CF:45:50", "name": "LEFT_LEG", "short_name": "LL"}
+
+
+@pytest.fixture
+def config(tmp_path):
+    path = tmp_path / "devices.json"
+    version = [0]
+
+    def write(*devices):
+        path.write_text(json.dumps({"devices": list(devices)}))
+        # Distinct modification times, whatever the resolution of the file system
+        version[0] += 1
+        os.utime(path, (1000 + version[0], 1000 + version[0]))
+        return str(path)
+
+    return write
+
+
+def _names(devices):
+    return sorted(d.short_name for d in devices)
+
+
+def test_added_device(config):
+    registry = DeviceRegistry.load(config(LA))
+    config(LA, RA)
+
+    added, retired = registry.reload_if_changed()
+    assert _names(added) == ["RA"] and retired == []
+    assert _names(registry) == ["LA", "RA"]
+    assert registry.reload_if_changed() == ([], [])
+
+
+def test_retired_device(config):
+    registry = DeviceRegistry.load(config(LA, RA))
+    config(LA)
+
+    added, retired = registry.reload_if_changed()
+    assert added == [] and _names(retired) == ["RA"]
+    assert RA["address"] not in registry
+
+
+def test_renamed_device_is_retired_and_added(config):
+    registry = DeviceRegistry.load(config(LA, RA))
+    config(LA, dict(RA, name="RIGHT_WRIST", short_name="RW"))
+
+    added, retired = registry.reload_if_changed()
+    assert _names(added) == ["RW"] and _names(retired) == ["RA"]
+    assert registry.get(RA["address"]).short_name == "RW"
+
+
+def test_swapped_short_names(config):
+    registry = DeviceRegistry.load(config(LA, RA))
+    config(dict(LA, short_name="RA"), dict(RA, short_name="LA"))
+
+    added, retired = registry.reload_if_changed()
+    assert _names(added) == ["LA", "RA"] and _names(retired) == ["LA", "RA"]
+    assert registry.by_short_name["LA"].address == RA["address"]
+
+
+def test_conflicting_file_leaves_the_registry_unchanged(config):
+    registry = DeviceRegistry.load(config(LA, RA))
+    # A new device takes the short name of one that stays, and RA is dropped in the same edit
+    config(LA, dict(LL, short_name="LA"))
+
+    assert registry.reload_if_changed() == ([], [])
+    assert _names(registry) == ["LA", "RA"]
+    assert registry.by_short_name["LA"].address == LA["address"]
+
+    # Picked up once the file is fixed
+    config(LA, LL)
+    added, retired = registry.reload_if_changed()
+    assert _names(added) == ["LL"] and _names(retired) == ["RA"]
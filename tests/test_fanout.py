@@ -0,0 +1,88 @@
+"""The three subscriber slots of bleak_client.CentralService, through mock_gatt instead of dbus."""
+import asyncio
+import logging
+
+import msgpack
+
+import bleak_client
+from frame_codec import decode_frame
+
+bleak_client.logger.setLevel(logging.CRITICAL)
+
+
+def _frames(n):
+    return [{"t": float(i), "LA": {"d": {"mpu": [{"a": [i, 0, 1000]}], "qmc": None}, "s": 1}} for i in range(n)]
+
+
+async def _publish(service, kind, frames, period=0.01):
+    for frame in frames:
+        service.publish(kind, frame)
+        await asyncio.sleep(period)
+
+
+def _subscribe(service):
+    """Decoded frames received on each slot."""
+    received = [[], [], []]
+    for slot, frames in zip([service.slot_0, service.slot_1, service.slot_2], received):
+        slot.subscribe(lambda data, frames=frames: frames.append(decode_frame(data)))
+    return received
+
+
+def test_profiles_and_decimation_per_slot():
+    async def run():
+        service = bleak_client.CentralService()
+        received = _subscribe(service)
+        service.slot_config.write(msgpack.packb({"slot": 1, "profile": "raw", "every": 3}))
+        service.slot_config.write(msgpack.packb({"slot": 2, "profile": "features"}))
+        service.fanout.start()
+
+        await _publish(service, "raw", _frames(9))
+        await _publish(service, "features", [{"t": 1.0, "f": [0.5]}])
+        await _publish(service, "labels", [{"t": 1.0, "p": 3}])
+        service.fanout.stop()
+        return received
+
+    raw, decimated, features = asyncio.run(run())
+
+    assert [f["t"] for f in raw] == [float(i) for i in range(9)]
+    assert [f["t"] for f in decimated] == [0.0, 3.0, 6.0]
+    assert features == [{"t": 1.0, "f": [0.5]}]
+
+
+def test_unsubscribed_slot_gets_nothing():
+    async def run():
+        service = bleak_client.CentralService()
+        received = []
+        service.slot_0.subscribe(received.append)
+        service.fanout.start()
+
+        await _publish(service, "raw", _frames(3))
+        service.fanout.stop()
+        return service, received
+
+    service, received = asyncio.run(run())
+
+    assert len(received) == 3
+    assert [s["sent"] for s in service.fanout.stats()] == [3, 0, 0]
+
+
+def test_slow_slot_does_not_hold_back_fast_slot():
+    async def run():
+        service = bleak_client.CentralService()
+        received = _subscribe(service)
+        # Slot 1 takes raw frames at most every 0.2s, slot 0 all of them
+        service.slot_config.write(msgpack.packb({"slot": 1, "profile": "raw", "interval": 0.2}))
+        service.fanout.start()
+
+        await _publish(service, "raw", _frames(20))
+        await asyncio.sleep(0.25)
+        service.fanout.stop()
+        return service, received
+
+    service, (fast, slow, _) = asyncio.run(run())
+
+    assert [f["t"] for f in fast] == [float(i) for i in range(20)]
+    # The slow slot only gets the latest frame when it is ready, and drops the ones in between
+    assert 1 < len(slow) < len(fast) // 2
+    assert slow[-1]["t"] == 19.0
+    assert service.fanout.stats()[1]["dropped"] > 10
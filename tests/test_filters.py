@@ -0,0 +1,95 @@
+"""FrameFilter keeps the state of each (device, channel) when other nodes or sensors come and go."""
+import copy
+
+import pytest
+
+from filters import Biquad, FrameFilter, KalmanCV
+
+
+def _frames(n):
+    return [
+        {
+            "t": i * 0.12,
+            "LA": {"d": {"mpu": [{"a": [i, 2 * i, 1000]}, {"a": [-i, 0, 1000]}], "qmc": None}, "s": 1},
+            "LL": {"d": {"mpu": [{"a": [0, i % 3, 1000]}], "qmc": None}, "s": 1},
+        }
+        for i in range(n)
+    ]
+
+
+@pytest.mark.parametrize(
+    "make_filter",
+    [lambda axes: KalmanCV(axes, 0.12), lambda axes: Biquad.lowpass(axes, 2.0, 1 / 0.12)],
+)
+def test_missing_node_does_not_reset_the_others(make_filter):
+    steady = [copy.deepcopy(f) for f in _frames(20)]
+    gappy = [copy.deepcopy(f) for f in _frames(20)]
+    # LL drops for one frame, and LA's second MPU is missing from another
+    del gappy[8]["LL"]
+    gappy[12]["LA"]["d"]["mpu"][1] = None
+
+    for frames in (steady, gappy):
+        f = FrameFilter(make_filter)
+        for frame in frames:
+            f.apply(frame)
+
+    for i in range(20):
+        assert gappy[i]["LA"]["d"]["mpu"][0] == steady[i]["LA"]["d"]["mpu"][0]
+    for i in range(8):
+        assert gappy[i]["LL"] == steady[i]["LL"]
+    assert gappy[12]["LA"]["d"]["mpu"][1] is None
+
+
+def test_new_device_keeps_existing_state():
+    frames = _frames(10)
+    for frame in frames[:5]:
+        del frame["LL"]
+
+    f = FrameFilter(lambda axes: KalmanCV(axes, 0.12))
+    reference = FrameFilter(lambda axes: KalmanCV(axes, 0.12))
+    for frame in frames:
+        expected = copy.deepcopy(frame)
+        expected.pop("LL", None)
+        reference.apply(expected)
+        f.apply(frame)
+        assert frame["LA"] == expected["LA"]
+
+
+def test_kalman_gets_the_time_between_values():
+    times = [0.0, 0.1, 0.3, 0.35, 0.6, 0.65]
+    frames = [{"t": t, "LA": {"d": {"mpu": [{"a": [100 * t, 5, 1000]}], "qmc": None}, "s": 1}} for t in times]
+    # LA is missing from one frame, its next value comes 0.25s after the previous one
+    frames.insert(4, {"t": 0.47, "LL": {"d": {"mpu": [{"a": [0, 0, 1000]}], "qmc": None}, "s": 1}})
+
+    f = FrameFilter(lambda axes: KalmanCV(axes, 0.12))
+    filtered = [f.apply(copy.deepcopy(frame)) for frame in frames]
+
+    reference = KalmanCV(3, 0.12)
+    previous = times[0]
+    for t, frame in zip(times, (frame for frame in filtered if "LA" in frame)):
+        expected = reference.update([100 * t, 5, 1000], t - previous).tolist()
+        previous = t
+        assert frame["LA"]["d"]["mpu"][0]["a"] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize(
+    "make_filter",
+    [lambda axes: KalmanCV(axes, 0.12), lambda axes: Biquad.lowpass(axes, 2.0, 1 / 0.12)],
+)
+def test_channels_start_over_after_a_gap(make_filter):
+    frames = _frames(10)
+    # The hub stalls for 2s, then LA's first MPU has moved
+    for frame in frames[5:]:
+        frame["t"] += 2.0
+        frame["LA"]["d"]["mpu"][0]["a"] = [500, 500, 0]
+    # Time goes back (e.g. a recording replayed again)
+    frames.append(copy.deepcopy(frames[0]))
+
+    f = FrameFilter(make_filter)
+    for frame in frames:
+        f.apply(frame)
+
+    # The first values after the gap are not pulled towards the old ones
+    assert frames[5]["LA"]["d"]["mpu"][0]["a"] == pytest.approx([500, 500, 0])
+    assert frames[6]["LA"]["d"]["mpu"][0]["a"] == pytest.approx([500, 500, 0])
+    assert frames[10]["LA"]["d"]["mpu"][0]["a"] == pytest.approx([0, 0, 1000])
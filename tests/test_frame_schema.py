@@ -0,0 +1,82 @@
+"""Packed frames round-trip for both schema versions, with missing slots and the predicted label."""
+import pytest
+
+import bleak_client
+import frame_schema
+from inference import integer_labels
+
+
+def _frame(**extra):
+    return {
+        "t": 1717000000.25,
+        "LA": {
+            "d": {
+                "mpu": [{"a": [12, -2000, 1001], "g": [-1000, 5, 0], "q": [994, -2, -95, -32], "e": [-180, 3, 90]}],
+                "qmc": [None, {"m": [4000, -5000, 12]}],
+            },
+            "s": 1,
+        },
+        "LL": {"d": {"mpu": [None, None, {"a": [1, 2, 3], "g": [4, 5, 6], "q": [7, 8, 9, 10], "e": [11, 12, 13]}], "qmc": None}, "s": 2},
+        **extra,
+    }
+
+
+def test_v2_round_trip_with_missing_slots():
+    frame = _frame()
+    unpacked = frame_schema.unpack_combined_dict(frame_schema.pack_combined(frame))
+
+    assert unpacked["t"] == frame["t"]
+    assert unpacked["LA"] == frame["LA"]
+    assert unpacked["LL"] == frame["LL"]
+    assert "p" not in unpacked
+
+
+def test_v1_round_trip_keeps_its_scales():
+    frame = {"t": 2.0, "LA": {"d": {"mpu": [{"a": [1, 2, 3], "g": [1.25, -0.5, 0], "q": [0.5, 0.5, -0.5, 0.5], "e": [10.5, 0, 0]}], "qmc": [{"m": [12.3, 0, -1.5]}]}, "s": 1}}
+    unpacked = frame_schema.unpack_combined_dict(frame_schema.pack_combined(frame, version=1))
+
+    mpu = unpacked["LA"]["d"]["mpu"][0]
+    assert mpu["g"] == [1.25, -0.5, 0]
+    assert mpu["q"] == [0.5, 0.5, -0.5, 0.5]
+    assert mpu["e"] == [10.5, 0, 0]
+    assert unpacked["LA"]["d"]["qmc"][0]["m"] == pytest.approx([12.3, 0, -1.5])
+
+
+def test_out_of_range_values_are_clipped():
+    frame = {"t": 0.0, "LA": {"d": {"mpu": [{"a": [70000, -70000, 1.6]}], "qmc": None}, "s": 1}}
+    unpacked = frame_schema.unpack_combined_dict(frame_schema.pack_combined(frame))
+    assert unpacked["LA"]["d"]["mpu"][0]["a"] == [32767, -32768, 2]
+
+
+def test_node_payload_round_trip():
+    payload = _frame()["LA"]["d"]
+    assert frame_schema.unpack_node_dict(frame_schema.pack_node(payload)) == payload
+
+
+def test_prediction_round_trip():
+    unpacked = frame_schema.unpack_combined_dict(frame_schema.pack_combined(_frame(p=101)))
+    assert unpacked["p"] == 101
+
+
+@pytest.mark.parametrize("frame,version", [(_frame(p="Walk"), 2), (_frame(p=1), 1), (_frame(x=1), 2)])
+def test_unpackable_frames_are_rejected(frame, version):
+    with pytest.raises(ValueError):
+        frame_schema.pack_combined(frame, version)
+
+
+class Classifier:
+    def __init__(self, classes):
+        self.classes_ = classes
+
+
+def test_string_labels_are_rejected_at_startup(monkeypatch):
+    monkeypatch.setattr(bleak_client, "FRAME_FORMAT", "packed")
+    monkeypatch.setattr(bleak_client, "PAYLOAD_MODE", "raw")
+
+    assert integer_labels(Classifier([101, 102])) is True
+    bleak_client.check_label_format(Classifier([101, 102]))
+    with pytest.raises(ValueError):
+        bleak_client.check_label_format(Classifier(["Stand", "Walk"]))
+
+    monkeypatch.setattr(bleak_client, "FRAME_FORMAT", "msgpack")
+    bleak_client.check_label_format(Classifier(["Stand", "Walk"]))
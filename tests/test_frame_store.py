@@ -0,0 +1,56 @@
+"""FrameStore gives back the frames it was given, across growth, new devices and missing sensors."""
+import numpy as np
+
+from frame_store import ABSENT, FrameStore
+
+
+def _frame(i, devices=("LA", "LL")):
+    frame = {"t": 1717000000.0 + i * 0.12}
+    if "LA" in devices:
+        frame["LA"] = {
+            "d": {
+                "mpu": [{"a": [i, -i, 1000], "g": [1, 2, 3], "q": [994, -2, -95, -32], "e": [0, 45, -90]}, None, {"a": [5, 6, 7]}],
+                "qmc": [{"m": [4000, -5000, i]}],
+            },
+            "s": 1,
+        }
+    if "LL" in devices:
+        frame["LL"] = {"d": {"mpu": [{"a": [0, i % 3, 1000]}], "qmc": None}, "s": 2}
+    if "RL" in devices:
+        frame["RL"] = {"d": {"mpu": None, "qmc": [None, {"m": [1, 2, 3]}]}, "s": 3}
+    return frame
+
+
+def test_round_trip():
+    frames = [_frame(i) for i in range(10)]
+    store = FrameStore.from_dicts(frames)
+    assert store.to_dicts() == frames
+
+
+def test_growth_and_new_devices_keep_the_earlier_frames():
+    frames = [_frame(i) for i in range(5)] + [_frame(i, ("LA", "RL")) for i in range(5, 40)] + [_frame(40, ())]
+    store = FrameStore(capacity=4)
+    store.extend(frames)
+
+    assert len(store) == len(frames) and store.capacity >= len(frames)
+    assert store.devices == ["LA", "LL", "RL"]
+    assert store.to_dicts() == frames
+    assert store.to_dicts(5, 7) == frames[5:7]
+
+
+def test_columns_and_missing_values():
+    store = FrameStore.from_dicts([_frame(i, ("LA",)) for i in range(3)] + [_frame(3)])
+
+    assert store.column("LA.mpu0.a").tolist() == [[i, -i, 1000] for i in range(4)]
+    assert np.isnan(store.column("LA.mpu1.a")).all()
+    assert store.column("LL.s").tolist() == [ABSENT] * 3 + [2]
+
+
+def test_clear_keeps_the_capacity():
+    store = FrameStore.from_dicts([_frame(i) for i in range(20)], capacity=8)
+    capacity = store.capacity
+    store.clear()
+
+    assert len(store) == 0 and store.capacity == capacity
+    store.append(_frame(99))
+    assert store.to_dicts() == [_frame(99)]
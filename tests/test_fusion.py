@@ -0,0 +1,51 @@
+"""FrameFusion writes orientations in the integer units of the nodes, which pack without loss."""
+import math
+
+import frame_schema
+from fusion import FrameFusion
+
+
+def _frame(t, a, g=(0, 0, 0)):
+    return {"t": t, "LA": {"d": {"mpu": [{"a": list(a), "g": list(g)}], "qmc": None}, "s": 1}}
+
+
+def _fuse(frames, **kwargs):
+    fusion = FrameFusion(**kwargs)
+    for frame in frames:
+        fusion.apply(frame)
+    return frames[-1]["LA"]["d"]["mpu"][0]
+
+
+def test_level_sensor_is_identity_in_node_units():
+    sensor = _fuse([_frame(i * 0.12, (0, 0, 1000)) for i in range(10)])
+    assert sensor["q"] == [1000, 0, 0, 0]
+    assert sensor["e"] == [0, 0, 0]
+    assert all(isinstance(x, int) for x in sensor["q"] + sensor["e"])
+
+
+def test_tilted_sensor_roll_in_degrees():
+    a = (0, round(1000 * math.sin(math.radians(30))), round(1000 * math.cos(math.radians(30))))
+    sensor = _fuse([_frame(i * 0.12, a) for i in range(10)])
+    assert abs(sensor["e"][0] - 30) <= 1
+    assert abs(sum(x * x for x in sensor["q"]) - 1000 ** 2) < 1000 ** 2 * 0.01
+
+
+def test_gyro_scale_is_configurable():
+    # 90 node units per second around z for one second: 90 degrees with the default scale, 45 with half of it
+    def turning():
+        return [_frame(i * 0.1, (0, 0, 1000), (0, 0, 90)) for i in range(11)]
+
+    default = _fuse(turning())
+    half = _fuse(turning(), gyro_scale=math.pi / 360)
+    assert abs(default["e"][2] - 90) <= 2
+    assert abs(half["e"][2] - 45) <= 2
+
+
+def test_fused_frame_packs_and_unpacks_unchanged():
+    frames = [_frame(i * 0.12, (120, -340, 930), (15, -4, 60)) for i in range(20)]
+    sensor = _fuse(frames)
+    assert sensor["q"] != [0, 0, 0, 0] and max(abs(x) for x in sensor["q"]) > 1
+
+    unpacked = frame_schema.unpack_combined_dict(frame_schema.pack_combined(frames[-1]))
+    assert unpacked["LA"]["d"]["mpu"][0]["q"] == sensor["q"]
+    assert unpacked["LA"]["d"]["mpu"][0]["e"] == sensor["e"]
@@ -0,0 +1,38 @@
+"""EventAggregator logs the last burst from poll(), with the window since the previous summary."""
+import logging
+
+from hub_logging import EventAggregator
+
+
+class Recorder(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_poll_logs_last_burst():
+    logger = logging.getLogger("test_hub_logging")
+    logger.propagate = False
+    recorder = Recorder()
+    logger.addHandler(recorder)
+
+    skipped = EventAggregator(logger, "Skipped %d for %s in the last %.0fs", interval=5.0)
+    start = skipped.last_flush
+    skipped.add("LL")
+    skipped.add("LL")
+    assert recorder.messages == []
+
+    # Nothing more is added, the summary still comes out once the interval is over
+    skipped.poll(start + 4.0)
+    assert recorder.messages == []
+    skipped.poll(start + 6.0)
+    assert recorder.messages == ["Skipped 2 for LL in the last 6s"]
+
+    # A quiet interval moves the window
+    skipped.poll(start + 12.0)
+    skipped.counts["RL"] = 1
+    skipped.poll(start + 17.0)
+    assert recorder.messages[-1] == "Skipped 1 for RL in the last 5s"
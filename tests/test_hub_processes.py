@@ -0,0 +1,139 @@
+"""Supervisor restarts with backoff, and the recorder resuming from its saved position after a restart."""
+import os
+import time
+
+import msgpack
+import pytest
+
+import hub_processes
+from hub_processes import HEALTHY_RUN_TIME, MAX_RESTART_DELAY, RESTART_DELAY, Recorder, Worker
+from shm_ring import RingWriter, SharedRing
+
+
+class FakeProcess:
+    started = []
+
+    def __init__(self, target, args, name, daemon):
+        self.name = name
+        self.alive = False
+        self.exitcode = None
+        self.pid = len(FakeProcess.started)
+
+    def start(self):
+        self.alive = True
+        FakeProcess.started.append(self)
+
+    def is_alive(self):
+        return self.alive
+
+    def crash(self):
+        self.alive = False
+        self.exitcode = 1
+
+
+class FakeContext:
+    Process = FakeProcess
+
+
+@pytest.fixture
+def worker():
+    FakeProcess.started = []
+    worker = Worker("recorder", FakeContext(), "ring", None)
+    worker.start()
+    return worker
+
+
+def test_crashing_worker_restarts_with_doubling_delay(worker):
+    now = time.monotonic()
+    delays = []
+    for _ in range(7):
+        FakeProcess.started[-1].crash()
+        worker.check(now)
+        crashed_at = now
+
+        # Not restarted before its delay
+        starts = len(FakeProcess.started)
+        worker.check(worker.next_start - 0.01)
+        assert len(FakeProcess.started) == starts
+
+        now = worker.next_start
+        worker.check(now)
+        assert len(FakeProcess.started) == starts + 1
+        delays.append(round(now - crashed_at, 6))
+
+    assert delays == [min(RESTART_DELAY * 2**i, MAX_RESTART_DELAY) for i in range(7)]
+
+
+def test_healthy_worker_resets_the_delay(worker):
+    now = time.monotonic()
+    for _ in range(3):
+        FakeProcess.started[-1].crash()
+        worker.check(now)
+        now = worker.next_start
+        worker.check(now)
+    assert worker.restarts == 3
+
+    worker.check(worker.started + HEALTHY_RUN_TIME)
+    assert worker.restarts == 0
+
+    FakeProcess.started[-1].crash()
+    now = worker.started + HEALTHY_RUN_TIME + 1
+    worker.check(now)
+    assert worker.next_start == now + RESTART_DELAY
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRing(create=True, slots=64)
+    yield ring
+    ring.close()
+
+
+def _recorded(folder):
+    packets = []
+    for name in sorted(os.listdir(folder)):
+        assert " " not in name and ":" not in name
+        with open(os.path.join(folder, name), "rb") as f:
+            packets += [data for _, _, _, data in msgpack.Unpacker(f)]
+    return packets
+
+
+def _write(writer, payloads):
+    for data in payloads:
+        writer.write(time.time(), "AA:BB:CC:DD:EE:FF", 1, data)
+
+
+def test_restarted_recorder_records_every_packet_once(ring, tmp_path, monkeypatch):
+    monkeypatch.setattr(hub_processes, "RECORD_PACKETS_PER_FILE", 4)
+    writer = RingWriter(ring)
+
+    recorder = Recorder(ring, str(tmp_path), sync_interval=0)
+    _write(writer, [b"%d" % i for i in range(6)])
+    recorder.poll(0)
+    # Killed without closing: the position of the synced packets is in the ring
+    recorder.f.close()
+
+    _write(writer, [b"%d" % i for i in range(6, 10)])
+    restarted = Recorder(ring, str(tmp_path), sync_interval=0)
+    restarted.poll(0)
+    restarted.close()
+
+    assert _recorded(str(tmp_path)) == [b"%d" % i for i in range(10)]
+
+
+def test_unsynced_packets_are_recorded_again(ring, tmp_path):
+    writer = RingWriter(ring)
+
+    recorder = Recorder(ring, str(tmp_path), sync_interval=3600)
+    recorder.sync()
+    _write(writer, [b"a", b"b"])
+    recorder.poll(0)
+    # Crashes before syncing: the file may or may not have the packets, the next recorder records them again
+    recorder.f.close()
+    os.remove(recorder.f.name)
+
+    restarted = Recorder(ring, str(tmp_path), sync_interval=3600)
+    restarted.poll(0)
+    restarted.close()
+
+    assert _recorded(str(tmp_path)) == [b"a", b"b"]
@@ -0,0 +1,67 @@
+"""InferenceStage keeps predicting when windows lose devices or the model raises."""
+import time
+
+from inference import InferenceStage, flatten_features
+
+
+class LengthModel:
+    """Predicts the sum of each vector, and raises on batches containing a negative one."""
+
+    def __init__(self):
+        self.shapes = []
+
+    def predict(self, x):
+        if (x < 0).any():
+            raise ValueError("bad input")
+        self.shapes.append(x.shape)
+        return x.sum(axis=1)
+
+
+def _window(t, devices):
+    return {"t": t, **{d: {"mpu0.a": [v, v], "mpu0.g": [v, 0.0]} for d, v in devices.items()}}
+
+
+def _wait(stage, t, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while stage.latest_time != t and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stage.latest_time == t
+
+
+def test_missing_channels_are_zero_filled():
+    channels = [("LA", "mpu0.a"), ("LL", "mpu0.a")]
+    vector = flatten_features({"t": 0, "LA": {"mpu0.a": [1.0, 2.0]}, "LL": None}, channels, 2)
+    assert vector.tolist() == [1.0, 2.0, 0.0, 0.0]
+
+
+def test_device_dropping_out_does_not_crash_submit():
+    model = LengthModel()
+    stage = InferenceStage(model, batch_size=1, max_wait=0)
+    stage.start()
+    try:
+        stage.submit(_window(1, {"LA": 1.0, "LL": 2.0}))
+        _wait(stage, 1)
+        # The first device of the channel order is gone, then a window without any device
+        stage.submit(_window(2, {"LL": 2.0}))
+        _wait(stage, 2)
+        stage.submit({"t": 3})
+        _wait(stage, 3)
+    finally:
+        stage.stop()
+
+    assert stage.latest_label == 0.0
+    assert {shape[1] for shape in model.shapes} == {8}
+
+
+def test_failed_prediction_is_dropped_and_the_worker_keeps_running():
+    stage = InferenceStage(LengthModel(), batch_size=1, max_wait=0)
+    stage.start()
+    try:
+        stage.submit(_window(1, {"LA": -1.0}))
+        stage.submit(_window(2, {"LA": 1.0}))
+        _wait(stage, 2)
+    finally:
+        stage.stop()
+
+    assert stage.failed == 1
+    assert stage.latest_label == 3.0
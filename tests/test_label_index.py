@@ -0,0 +1,64 @@
+"""LabelIndex segments match a scan of the rows, and the saved index is rebuilt when the data changes."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from label_index import LabelIndex, run_length
+
+PERIOD = 33
+LOCOMOTION = "244 Locomotion"
+
+
+@pytest.fixture
+def df():
+    # Stand, Walk, nothing, Walk again, then Stand
+    labels = ["1 Stand"] * 10 + ["2 Walk"] * 30 + [None] * 5 + ["2 Walk"] * 20 + ["1 Stand"] * 5
+    return pd.DataFrame({"1 MILLISEC": np.arange(len(labels)) * PERIOD, LOCOMOTION: labels})
+
+
+def test_intervals_match_the_rows(df):
+    track = LabelIndex.from_frame(df, [LOCOMOTION])["Locomotion"]
+
+    assert track.intervals("Walk").tolist() == [[10 * PERIOD, 40 * PERIOD], [45 * PERIOD, 65 * PERIOD]]
+    assert track.intervals("Stand").tolist() == [[0, 10 * PERIOD], [65 * PERIOD, 70 * PERIOD]]
+    assert track.intervals(2).tolist() == track.intervals("Walk").tolist()
+
+    # Every row is inside the interval of its own label
+    for t, label in zip(df["1 MILLISEC"], df[LOCOMOTION]):
+        assert track.label_at(t) == (label.split(" ", 1)[1] if isinstance(label, str) else "0")
+
+
+def test_label_at_outside_of_the_segments(df):
+    track = LabelIndex.from_frame(df, [LOCOMOTION])[LOCOMOTION]
+    assert track.label_at(-1) is None
+    assert track.label_at(70 * PERIOD) is None
+
+
+def test_windows_stay_inside_one_segment(df):
+    track = LabelIndex.from_frame(df, [LOCOMOTION])[LOCOMOTION]
+    length, hop = 10 * PERIOD, 5 * PERIOD
+
+    starts = track.windows("Walk", length, hop)
+    assert len(starts) == 5 + 3
+    for start in starts:
+        assert track.label_at(start) == "Walk" and track.label_at(start + length - 1) == "Walk"
+
+
+def test_run_length_of_a_single_row():
+    starts, ends, labels = run_length([100], [3])
+    assert (starts.tolist(), ends.tolist(), labels.tolist()) == ([100], [100], [3])
+
+
+def test_saved_index_is_rebuilt_when_the_data_changes(df, tmp_path):
+    path = str(tmp_path / "session.csv")
+    df.to_csv(path, index=False)
+    index = LabelIndex.load_or_build(path, [LOCOMOTION])
+    assert os.path.exists(path + ".labels.json")
+    assert LabelIndex.load_or_build(path, [LOCOMOTION])[LOCOMOTION].segments() == index[LOCOMOTION].segments()
+
+    df.loc[:, LOCOMOTION] = "4 Lie"
+    df.to_csv(path, index=False)
+    os.utime(path, (os.path.getmtime(path) + 10,) * 2)
+    assert LabelIndex.load_or_build(path, [LOCOMOTION])[LOCOMOTION].segments() == [(0, 70 * PERIOD, 4)]
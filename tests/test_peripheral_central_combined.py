@@ -0,0 +1,39 @@
+"""Peripheral_Central_Combined serves its snapshots through notifications and reads, like bleak_client."""
+import asyncio
+
+import msgpack
+
+import Peripheral_Central_Combined as pcc
+from central_client import FrameConsumer, LocalTransport
+from snapshot_buffer import LatestValues
+
+
+def _snapshot(t):
+    combined = LatestValues(["LEFT_ARM", "LEFT_LEG"], [pcc.NodeStatus.CONNECTED, pcc.NodeStatus.DISCONNECTED])
+    combined.update("LEFT_ARM", data={"mpu": [{"a": [3, 7, 14], "g": [0, -1000, 0]}], "qmc": None})
+    return combined.snapshot(t)
+
+
+def test_send_combined_notifies_subscribers():
+    async def run():
+        service = pcc.AllTogether()
+        consumer = FrameConsumer(batch_size=2, max_delay=0.1)
+        await LocalTransport(service.my_readonly_characteristic).start(consumer)
+
+        pcc.send_combined(service, _snapshot(1.0))
+        pcc.send_combined(service, _snapshot(1.2))
+        return await asyncio.wait_for(anext(consumer.batches()), 1.0)
+
+    batch = asyncio.run(run())
+
+    assert [frame["time"] for frame in batch] == [1.0, 1.2]
+    assert batch[0]["LEFT_ARM"] == {"data": {"mpu": [{"a": [3, 7, 14], "g": [0, -1000, 0]}], "qmc": None}, "status": 1}
+    assert batch[0]["LEFT_LEG"] == {"data": {}, "status": 2}
+
+
+def test_read_returns_latest_snapshot():
+    service = pcc.AllTogether()
+    pcc.send_combined(service, _snapshot(1.0))
+    pcc.send_combined(service, _snapshot(2.0))
+
+    assert msgpack.unpackb(service.my_readonly_characteristic.read()) == _snapshot(2.0)
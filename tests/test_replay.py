@@ -0,0 +1,124 @@
+"""ReplayEngine keeps the recorded timing (scaled by its speed, with long gaps shortened), and its sinks."""
+import asyncio
+import json
+import socket
+import time
+
+from frame_codec import decode_frame
+from replay import ReplayEngine, SocketSink, central_service_sink, replay_to_socket
+
+# Sleeps may end a little early or late on a loaded machine
+TOLERANCE = 0.005
+
+
+def _frames(times):
+    return [{"t": t, "LA": {"d": {"mpu": [{"a": [i, 0, 1000]}], "qmc": None}, "s": 1}} for i, t in enumerate(times)]
+
+
+class TimedSink:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.times = []
+        self.frames = []
+
+    def __call__(self, frame):
+        self.times.append(time.perf_counter() - self.start)
+        self.frames.append(frame)
+
+
+def test_keeps_the_recorded_gaps():
+    frames = _frames([100.0, 100.1, 100.3])
+    sink = TimedSink()
+    engine = ReplayEngine(frames)
+    assert asyncio.run(engine.run(sink)) == 3
+
+    assert sink.frames == frames
+    assert sink.times[1] >= 0.1 - TOLERANCE and sink.times[2] >= 0.3 - TOLERANCE
+    assert sink.times[2] < 0.3 + 0.1
+
+
+def test_speed_and_long_gaps():
+    # The hour long gap is shortened to max_gap, time going back (a new recording) doesn't wait
+    frames = _frames([0.0, 0.2, 3600.2, 10.0, 10.2])
+    sink = TimedSink()
+    engine = ReplayEngine(frames, speed=4, max_gap=0.2)
+    asyncio.run(engine.run(sink))
+
+    expected = [0.0, 0.05, 0.1, 0.1, 0.15]
+    assert all(t >= e - TOLERANCE for t, e in zip(sink.times, expected))
+    assert sink.times[-1] < 0.15 + 0.1
+
+
+def test_as_fast_as_possible_with_limit():
+    frames = _frames([float(i) for i in range(1000)])
+    sink = TimedSink()
+    engine = ReplayEngine(iter(frames), speed=0)
+    assert asyncio.run(engine.run(sink, limit=500)) == 500
+    assert sink.frames == frames[:500]
+    assert sink.times[-1] < 1.0
+
+
+def test_coroutine_sink():
+    received = []
+
+    async def sink(frame):
+        await asyncio.sleep(0)
+        received.append(frame)
+
+    frames = _frames([0.0, 0.01])
+    asyncio.run(ReplayEngine(frames).run(sink))
+    assert received == frames
+
+
+def test_central_service_sink():
+    class Service:
+        def __init__(self):
+            self.data = []
+            self.published = []
+
+        def update_combined_data(self, data):
+            self.data.append(data)
+
+        def publish(self, kind, frame):
+            self.published.append((kind, frame))
+
+    service = Service()
+    frames = _frames([0.0, 0.01])
+    asyncio.run(ReplayEngine(frames, speed=0).run(central_service_sink(service)))
+
+    assert [decode_frame(data) for data in service.data] == frames
+    assert service.published == [("raw", frame) for frame in frames]
+
+
+def test_replay_folder_to_socket(tmp_path, capsys):
+    points = [{"time": 100.0 + i * 0.01, "LEFT_ARM": {"mpu": [{"a": [i, 0, 1000]}], "qmc": None}} for i in range(6)]
+    for name, part in (("b.json", points[3:]), ("a.json", points[:3])):
+        (tmp_path / name).write_text(json.dumps({"data": part}))
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(2.0)
+    try:
+        asyncio.run(replay_to_socket(str(tmp_path), 0, "127.0.0.1", sock.getsockname()[1], loop=True, limit=9))
+        received = [decode_frame(sock.recv(65536)) for _ in range(9)]
+    finally:
+        sock.close()
+
+    # Files in name order, starting over after the last one
+    assert [frame["LA"]["d"]["mpu"][0]["a"][0] for frame in received] == [0, 1, 2, 3, 4, 5, 0, 1, 2]
+    assert "Sent 9 frames" in capsys.readouterr().out
+
+
+def test_socket_sink_without_reader():
+    # Nobody reads the port: the frames are dropped or lost, never blocking the sender
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    sink = SocketSink(port=port)
+    start = time.perf_counter()
+    for frame in _frames([float(i) for i in range(100)]):
+        sink(frame)
+    sink.close()
+    assert time.perf_counter() - start < 1.0
@@ -0,0 +1,134 @@
+"""Resampling onto the grid: linear, SLERP and hold interpolation, gaps, and the streaming resamplers of the hub."""
+import math
+
+import numpy as np
+
+from resample import (
+    FrameResampler,
+    StreamingResampler,
+    interpolate_hold,
+    interpolate_linear,
+    interpolate_quaternions,
+    resample_columns,
+    uniform_grid,
+)
+
+
+def test_uniform_grid():
+    assert uniform_grid(10, 100, 33).tolist() == [33.0, 66.0, 99.0]
+    assert uniform_grid(0, 66, 33).tolist() == [0.0, 33.0, 66.0]
+
+
+def test_linear_with_gaps():
+    times = [0, 10, 20, 300, 310]
+    values = [[0, 0], [10, 100], [20, 200], [300, 3000], [310, 3100]]
+    grid = np.array([0, 5, 15, 20, 100, 305, 400], dtype=np.float64)
+
+    out = interpolate_linear(times, values, grid, max_gap=50)
+    assert out[:4].tolist() == [[0, 0], [5, 50], [15, 150], [20, 200]]
+    # Inside the 280ms gap, and after the last sample
+    assert np.isnan(out[4]).all() and np.isnan(out[6]).all()
+    assert out[5].tolist() == [305, 3050]
+
+    # Grid times on the samples around a gap are kept
+    out = interpolate_linear(times, values, np.array([20.0, 300.0]), max_gap=50)
+    assert out.tolist() == [[20, 200], [300, 3000]]
+
+
+def test_linear_drops_missing_and_duplicate_samples():
+    times = [0, 10, 10, 20, 30]
+    values = [0, 10, 99, np.nan, 30]
+    out = interpolate_linear(times, values, np.array([10.0, 20.0]), max_gap=50)
+    # The first sample of duplicate times is kept, the NaN sample is interpolated over
+    assert out[:, 0].tolist() == [10, 20]
+
+    # The NaN sample makes a 20ms gap, longer than max_gap
+    assert np.isnan(interpolate_linear(times, values, np.array([20.0]), max_gap=15)).all()
+
+
+def test_quaternions_slerp_and_norm():
+    half = math.sqrt(0.5)
+    times = [0, 10]
+    # Identity and 90 degrees about z, scaled like the nodes send them, the second one with the opposite sign
+    quaternions = [[1000, 0, 0, 0], [-1000 * half, 0, 0, -1000 * half]]
+
+    out = interpolate_quaternions(times, quaternions, np.array([0.0, 5.0, 10.0]), max_gap=50)
+    angle = math.radians(22.5)
+    assert np.allclose(out[1], [1000 * math.cos(angle), 0, 0, 1000 * math.sin(angle)])
+    assert np.allclose(np.linalg.norm(out, axis=1), 1000)
+
+    assert np.isnan(interpolate_quaternions(times, quaternions, np.array([5.0]), max_gap=5)).all()
+
+
+def test_hold():
+    out = interpolate_hold([0, 10, 20], [1, 2, 3], np.array([0.0, 9.0, 10.0, 15.0, 25.0]), max_gap=50)
+    assert out[:4, 0].tolist() == [1, 1, 2, 2]
+    assert np.isnan(out[4, 0])
+
+
+def test_resample_columns_keeps_each_column_missing_values():
+    times = [0, 10, 20]
+    values = [[0, 1, 1000, 0, 0, 0, np.nan], [10, np.nan, 1000, 0, 0, 0, np.nan], [20, 3, 1000, 0, 0, 0, np.nan]]
+    grid = np.array([5.0, 15.0])
+
+    out = resample_columns(times, values, grid, max_gap=50, quaternion_groups=[(2, 3, 4, 5)], hold_columns=[1])
+    assert out[:, 0].tolist() == [5, 15]
+    assert out[:, 1].tolist() == [1, 1]
+    assert np.allclose(out[:, 2:6], [[1000, 0, 0, 0]] * 2)
+    assert np.isnan(out[:, 6]).all()
+
+
+def test_streaming_matches_batch():
+    rng = np.random.default_rng(0)
+    times = np.cumsum(rng.uniform(5, 60, 200))
+    values = rng.normal(size=(200, 3))
+
+    resampler = StreamingResampler(33, 50)
+    streamed = [sample for t, v in zip(times, values) for sample in resampler.push(t, v)]
+
+    grid = uniform_grid(times[0], times[-1], 33)
+    batch = interpolate_linear(times, values, grid, 50)
+    assert [t for t, _ in streamed] == grid.tolist()
+    assert np.allclose(np.array([v for _, v in streamed]), batch, equal_nan=True)
+    # Some grid samples fall in gaps longer than 50ms
+    assert np.isnan(batch).any() and not np.isnan(batch).all()
+
+
+def test_streaming_restarts_when_time_goes_back():
+    resampler = StreamingResampler(10, 50)
+    assert resampler.push(5, [0]) == []
+    assert [t for t, _ in resampler.push(25, [20])] == [10, 20]
+    assert resampler.push(25, [99]) == []
+
+    assert resampler.push(0, [7]) == [(0, [7])]
+    assert [t for t, _ in resampler.push(10, [8])] == [10]
+
+
+def _frame(t, la=None, ra=None):
+    frame = {"t": t}
+    for device, value in (("LA", la), ("RA", ra)):
+        frame[device] = {"d": {"mpu": [{"a": [value, 0, 0]}]} if value is not None else None, "s": 1}
+    return frame
+
+
+def test_frame_resampler_gap_and_silent_device():
+    resampler = FrameResampler(period=0.1, max_gap=0.25)
+    frames = []
+    # Both devices every 0.05s, then RA goes silent, then LA skips 0.4s
+    for i in range(7):
+        frames += resampler.push(_frame(i * 0.05, la=i, ra=i))
+    for t in (0.35, 0.4, 0.81, 0.86, 0.91, 0.96, 1.01):
+        frames += resampler.push(_frame(t, la=t * 20))
+
+    times = [round(f["t"], 6) for f in frames]
+    assert times == sorted(times) and len(set(times)) == len(times)
+
+    by_time = {round(f["t"], 6): f for f in frames}
+    assert by_time[0.1]["LA"]["d"]["mpu"][0]["a"] == [2.0, 0.0, 0.0]
+    assert by_time[0.1]["RA"]["d"]["mpu"][0]["a"] == [2.0, 0.0, 0.0]
+    # RA stopped notifying after 0.3s but doesn't hold LA back
+    assert 0.4 in by_time and by_time[0.4]["RA"]["d"] == {}
+    # Grid times inside the LA gap are left out of its payload
+    for t in (0.5, 0.6, 0.7, 0.8):
+        assert t not in by_time or by_time[t]["LA"]["d"] == {}
+    assert np.allclose(by_time[0.9]["LA"]["d"]["mpu"][0]["a"], [18, 0, 0])
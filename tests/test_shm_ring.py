@@ -0,0 +1,42 @@
+"""A reader started from the saved position continues where the previous one stopped, like a restarted recorder."""
+import pytest
+
+from shm_ring import RingReader, RingWriter, SharedRing
+
+ADDRESS = "AA:BB:CC:DD:EE:FF"
+
+
+@pytest.fixture
+def ring():
+    ring = SharedRing(create=True, slots=16)
+    yield ring
+    ring.close()
+
+
+def _write(writer, payloads):
+    for i, data in enumerate(payloads):
+        writer.write(float(i), ADDRESS, 1, data)
+
+
+def test_restarted_reader_does_not_read_saved_packets_again(ring):
+    writer = RingWriter(ring)
+    reader = RingReader(ring, start="saved")
+    _write(writer, [b"a", b"b", b"c"])
+    assert [data for *_, data in reader.read()] == [b"a", b"b", b"c"]
+    reader.save_position()
+
+    # Written while the reader was down
+    _write(writer, [b"d", b"e"])
+    restarted = RingReader(ring, start="saved")
+    assert [data for *_, data in restarted.read()] == [b"d", b"e"]
+    assert restarted.lost == 0
+
+
+def test_restarted_reader_counts_overwritten_packets(ring):
+    writer = RingWriter(ring)
+    RingReader(ring, start="saved").save_position()
+
+    _write(writer, [bytes([i]) for i in range(20)])
+    restarted = RingReader(ring, start="saved")
+    assert len(restarted.read()) == 16
+    assert restarted.lost == 4
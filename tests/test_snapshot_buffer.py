@@ -0,0 +1,21 @@
+"""SnapshotBuffer keeps saving after a failed save, and saves the last buffer on close."""
+from snapshot_buffer import SnapshotBuffer
+
+
+def test_failed_save_does_not_stop_the_writer():
+    saved = []
+
+    def save(snapshots):
+        if not saved and snapshots[0] == 0:
+            saved.append(None)
+            raise OSError("No such file or directory")
+        saved.append(list(snapshots))
+
+    buffer = SnapshotBuffer(2, save, pool_size=8)
+    for i in range(7):
+        buffer.append(i)
+    buffer.close()
+
+    assert saved[1:] == [[2, 3], [4, 5], [6]]
+    assert buffer.failed_saves == 1
+    assert buffer.dropped_buffers == 0
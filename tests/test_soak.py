@@ -0,0 +1,66 @@
+"""Simulated node payloads, and a short soak run of the node -> hub -> consumer path."""
+import json
+import os
+import random
+import subprocess
+import sys
+
+import msgpack
+
+import mock_bleak
+from soak import SoakRecorder, percentiles_ms
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_node_payload_in_node_units():
+    arm = mock_bleak.SimulatedNode("aa:bb:cc:dd:ee:ff", "LEFT_ARM", seed=1)
+    leg = mock_bleak.SimulatedNode("11:22:33:44:55:66", "LEFT_LEG", seed=1)
+
+    payload = msgpack.unpackb(arm.payload())
+    assert arm.address == "AA:BB:CC:DD:EE:FF"
+    assert len(payload["mpu"]) == 3 and len(payload["qmc"]) == 2
+    values = [x for mpu in payload["mpu"] for key in "agqe" for x in mpu[key]]
+    values += [x for qmc in payload["qmc"] for x in qmc["m"]]
+    assert all(isinstance(x, int) for x in values)
+    assert payload["n"] == 0 and payload["ts"] > 0
+
+    payload = msgpack.unpackb(leg.payload())
+    assert len(payload["mpu"]) == 1 and payload["qmc"] is None
+
+
+def test_recorder_sequences_and_latency():
+    recorder = SoakRecorder()
+    payload = {"ts": 0.0, "n": 4}
+    frame = {"t": 1.0, "LA": {"d": payload, "s": 1}, "RA": {"d": None, "s": 3}}
+
+    recorder.on_batch([frame])
+    assert recorder.frames == 1
+    assert recorder.sequences == {"LA": {4}}
+    assert recorder.latencies == []
+
+    recorder.measuring = True
+    recorder.on_batch([frame])
+    assert len(recorder.latencies) == 1
+
+
+def test_percentiles():
+    assert percentiles_ms([])["p50"] is None
+    result = percentiles_ms([0.001, 0.002, 0.003])
+    assert result["p50"] == 2.0 and result["max"] == 3.0
+
+
+def test_short_soak(tmp_path):
+    # In a subprocess: the run replaces bleak and imports the hub, which would leak into the other tests
+    output = tmp_path / "soak.json"
+    subprocess.run(
+        [sys.executable, "soak.py", "--duration", "2", "--warmup", "0.5", "--output", str(output)],
+        cwd=ROOT, check=True, capture_output=True, timeout=120,
+    )
+    report = json.loads(output.read_text())
+
+    assert report["frames_sent"] > 0
+    assert report["loss"]["frame_loss"] == 0.0
+    assert report["loss"]["decode_errors"] == 0
+    assert report["loss"]["samples_delivered"] > 0
+    assert report["latency_ms"]["p50"] is not None
@@ -0,0 +1,149 @@
+"""Escalation of the watchdog, on a fake clock: resubscribe, reconnect, then restart the adapter."""
+import asyncio
+import types
+
+import pytest
+
+import watchdog
+from watchdog import RECONNECT, RESTART_ADAPTER, RESUBSCRIBE, Watchdog
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(watchdog, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+class Recovery:
+    """Records the actions of the watchdog. `reconnect` returns `reconnected`."""
+
+    def __init__(self, reconnected=True):
+        self.actions = []
+        self.reconnected = reconnected
+
+    async def resubscribe(self, key):
+        self.actions.append((RESUBSCRIBE, key))
+
+    async def reconnect(self, key):
+        self.actions.append((RECONNECT, key))
+        return self.reconnected
+
+    async def restart_adapter(self):
+        self.actions.append((RESTART_ADAPTER, None))
+
+    def watchdog(self, **kwargs):
+        return Watchdog(self.resubscribe, self.reconnect, self.restart_adapter, stale_after=1.0, action_timeout=3.0,
+                        max_failed_reconnects=2, min_restart_interval=60.0, **kwargs)
+
+
+def _check_at(clock, wd, t):
+    clock.now = t
+    asyncio.run(wd.check())
+
+
+def test_escalation(clock):
+    recovery = Recovery()
+    wd = recovery.watchdog()
+    wd.watch("LA")
+    wd.watch("RA")
+
+    for t in (1, 2, 3, 5, 8, 11, 14):
+        # RA keeps notifying
+        clock.now = t - 0.1
+        wd.record("RA")
+        _check_at(clock, wd, t)
+
+    assert [action for action, _ in recovery.actions] == [RESUBSCRIBE, RECONNECT, RECONNECT, RESTART_ADAPTER, RECONNECT]
+    assert all(key in ("LA", None) for _, key in recovery.actions)
+
+
+def test_recovery_starts_over(clock):
+    recovery = Recovery()
+    wd = recovery.watchdog()
+    wd.watch("LA")
+
+    _check_at(clock, wd, 2)
+    _check_at(clock, wd, 5)
+    assert [action for action, _ in recovery.actions] == [RESUBSCRIBE, RECONNECT]
+
+    clock.now = 6
+    wd.record("LA")
+    _check_at(clock, wd, 6.5)
+    health = wd.devices["LA"]
+    assert health.stale_since is None and health.last_action is None and health.failed_reconnects == 0
+
+    _check_at(clock, wd, 8)
+    assert recovery.actions[-1] == (RESUBSCRIBE, "LA")
+
+
+def test_reconnect_without_connection_is_not_a_failure(clock):
+    recovery = Recovery(reconnected=False)
+    wd = recovery.watchdog()
+    wd.watch("LA")
+
+    for t in range(2, 30, 3):
+        _check_at(clock, wd, t)
+
+    assert (RESTART_ADAPTER, None) not in recovery.actions
+    assert wd.devices["LA"].failed_reconnects == 0
+
+
+def test_adapter_restarts_are_spaced(clock):
+    recovery = Recovery()
+    wd = recovery.watchdog()
+    wd.watch("LA")
+    wd.watch("RA")
+
+    for t in (2, 5, 8, 11, 14, 17):
+        _check_at(clock, wd, t)
+
+    # Both devices reached the restart at the same time, only one restart was done
+    restarts = [action for action, _ in recovery.actions if action == RESTART_ADAPTER]
+    assert len(restarts) == 1
+
+
+def test_paused_device_is_not_checked(clock):
+    recovery = Recovery()
+    wd = recovery.watchdog()
+    wd.watch("LA")
+
+    _check_at(clock, wd, 2)
+    _check_at(clock, wd, 5)
+    assert recovery.actions[-1] == (RECONNECT, "LA")
+
+    # Disconnected: no actions however long it is gone
+    wd.pause("LA")
+    for t in range(8, 100, 3):
+        _check_at(clock, wd, t)
+    assert len(recovery.actions) == 2
+
+    # Reconnected: it gets action_timeout seconds to notify again
+    clock.now = 100
+    wd.watch("LA")
+    _check_at(clock, wd, 101)
+    assert len(recovery.actions) == 2
+
+    clock.now = 102
+    wd.record("LA")
+    _check_at(clock, wd, 102.5)
+    assert wd.devices["LA"].stale_since is None
+
+
+def test_unwatch(clock):
+    recovery = Recovery()
+    wd = recovery.watchdog()
+    wd.watch("LA")
+    wd.unwatch("LA")
+    wd.record("LA")
+
+    _check_at(clock, wd, 10)
+    assert recovery.actions == []
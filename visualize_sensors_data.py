@@ -3,7 +3,7 @@ import sys
 
 import pandas as pd
 import plotly.express as px
-from dash import Dash, Input, Output, callback, dcc, html
+from dash import Dash, Input, Output, callback, dcc, html, no_update
 
 acc_list = [
     "RKN^",
@@ -60,6 +60,31 @@ column_list = (
 df: pd.DataFrame = None
 sensors_data_file: str = ""
 
+# When reading from a dataset store (see dataset_store.py), only the plotted columns and time range are loaded
+store = None
+store_partition: dict = {}
+columns: list = []
+
+# Label segments of the file (see label_index.py), for the label range selector
+label_index = None
+
+
+def read_range(selected_columns, start, end) -> pd.DataFrame:
+    """The selected columns between start and end (in seconds)."""
+    if store is None:
+        return df.loc[start:end, selected_columns]
+
+    time_column = columns[0]
+    dff = store.read(
+        [time_column] + selected_columns,
+        [(time_column, ">=", start * 1000), (time_column, "<=", end * 1000)],
+        **store_partition,
+    )
+    dff = dff.set_index(time_column).sort_index()
+    dff.index = dff.index / 1000
+    dff.index.name = "1 SECOND"
+    return dff
+
 
 @callback(
     Output("graph-content", "figure"),
@@ -71,20 +96,18 @@ def update_graph_dropdown(dropdown_values, checklist_values, slider_range):
     checklist_indices = dict(map(reversed, enumerate(["X", "Y", "Z", "W"])))
     checklist_values_quat = [checklist_indices[x] for x in checklist_values]
 
-    dff = df[
-        [
-            col
-            for col in df.columns
-            if any([val in col for val in dropdown_values])
-            and (
-                col.lower().endswith(tuple([x.lower() for x in checklist_values]))
-                or col.endswith(tuple(["Quaternion" + str(i + 1) for i in checklist_values_quat]))
-            )
-        ]
+    selected_columns = [
+        col
+        for col in columns[1:]
+        if any([val in col for val in dropdown_values])
+        and (
+            col.lower().endswith(tuple([x.lower() for x in checklist_values]))
+            or col.endswith(tuple(["Quaternion" + str(i + 1) for i in checklist_values_quat]))
+        )
     ]
 
     fig = px.line(
-        dff.loc[slider_range[0] : slider_range[1]],
+        read_range(selected_columns, slider_range[0], slider_range[1]),
         title=sensors_data_file.split(".")[0],
         labels=dict(variable="Column Name", value="Value"),
     )
@@ -94,17 +117,85 @@ def update_graph_dropdown(dropdown_values, checklist_values, slider_range):
     return fig
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python visualize_sensors_data.py FILE [SENSORS_FILE]")
-        sys.exit(1)
+@callback(
+    Output("label-selection", "options"),
+    Output("label-selection", "value"),
+    Input("track-selection", "value"),
+)
+def update_label_options(track_name):
+    if label_index is None or track_name is None:
+        return [], None
+
+    track = label_index[track_name]
+    labels = sorted(set(track.labels.tolist()))
+    return [{"label": track.label_name(label), "value": label} for label in labels], None
+
+
+@callback(
+    Output("segment-selection", "options"),
+    Output("segment-selection", "value"),
+    Input("track-selection", "value"),
+    Input("label-selection", "value"),
+)
+def update_segment_options(track_name, label):
+    if label_index is None or track_name is None or label is None:
+        return [], None
+
+    options = [
+        {"label": f"{start / 1000:.1f}s - {end / 1000:.1f}s", "value": f"{start},{end}"}
+        for start, end in label_index[track_name].intervals(label).tolist()
+    ]
+    return options, None
+
+
+@callback(
+    Output("my-range-slider", "value"),
+    Input("segment-selection", "value"),
+)
+def select_segment(segment):
+    if segment is None:
+        return no_update
+
+    start, end = segment.split(",")
+    return [int(start) / 1000, int(end) / 1000]
+
+
+def open_store(root, partition_args):
+    global store, store_partition, columns, sensors_data_file, label_index
 
-    global df, sensors_data_file
+    # Only needed for the dataset store
+    from dataset_store import DatasetStore
 
-    sensors_data_file = sys.argv[1]
+    store = DatasetStore(root)
+    store_partition = dict(arg.split("=", 1) for arg in partition_args)
+    columns = store.columns()
+    sensors_data_file = " ".join(partition_args) or root
+
+    # Only the time and label columns are read here
+    label_names = [name for name in store.label_names if name in columns]
+    times = store.read([columns[0]] + label_names, **store_partition).sort_values(columns[0])
+
+    if label_names:
+        from label_index import LabelIndex
+
+        label_index = LabelIndex.from_frame(times, label_names)
+
+    return times[columns[0]].max() / 1000
+
+
+def open_file(file):
+    global df, columns, sensors_data_file, label_index
+
+    sensors_data_file = file
     # sensors_data_file = "S1-ADL1_sensors_data.txt.new.csv"
 
     df = pd.read_csv(sensors_data_file)
+    columns = list(df.columns)
+
+    from label_index import LabelIndex, label_columns
+
+    if label_columns(df):
+        label_index = LabelIndex.load_or_build(sensors_data_file, df=df)
 
     # Set Millisec column to index
     df.set_index(df.columns[0], inplace=True)
@@ -116,14 +207,71 @@ def main():
     # Convert all NaN values to None
     df = df.where(pd.notnull(df), None)
 
+    return df.last_valid_index()
+
+
+def align_sensors_file(df2, sensor, manual_offset=0.0):
+    """Shift (and scale) the capture onto the time axis of the dataset, see align.py.
+
+    When the alignment is not reliable the capture is only shifted by `manual_offset` (seconds), unscaled.
+    """
+    from align import acceleration_columns, estimate_alignment
+
+    capture_columns = acceleration_columns(df2)
+    alignment = estimate_alignment(
+        df2.index.to_numpy(dtype=float),
+        df2[capture_columns].to_numpy(dtype=float),
+        df.index.to_numpy(dtype=float),
+        df[acceleration_columns(df, sensor)].to_numpy(dtype=float),
+    )
+    print(f"{sensor}: {alignment}")
+
+    if not alignment.reliable():
+        print(f"Warning: alignment with {sensor} not reliable, using the manual offset of {manual_offset}s")
+        df2.index = df2.index + manual_offset
+        return df2
+
+    df2.index = df2.index + alignment.offset
+    df2[capture_columns] = df2[capture_columns] * alignment.scale
+    return df2
+
+
+def main():
+    # Align the sensors file with a dataset sensor
+    align_sensor = None
+    if "--align" in sys.argv:
+        i = sys.argv.index("--align")
+        align_sensor = sys.argv[i + 1]
+        del sys.argv[i:i + 2]
+
+    # Offset used instead when the alignment is not reliable
+    manual_offset = 0.0
+    if "--offset" in sys.argv:
+        i = sys.argv.index("--offset")
+        manual_offset = float(sys.argv[i + 1])
+        del sys.argv[i:i + 2]
+
+    if len(sys.argv) < 2:
+        print("Usage: python visualize_sensors_data.py FILE [SENSORS_FILE [--align SENSOR [--offset SECONDS]]]")
+        print("       python visualize_sensors_data.py --store ROOT [subject=S1] [pose=walking] [date=...] [device=...]")
+        sys.exit(1)
+
+    if sys.argv[1] == "--store":
+        last_time = open_store(sys.argv[2], sys.argv[3:])
+    else:
+        last_time = open_file(sys.argv[1])
+
     sensors_figure = []
-    if len(sys.argv) == 3:
+    if len(sys.argv) == 3 and store is None:
         file2 = sys.argv[2]
         df2 = pd.read_csv(file2)
         df2.set_index(df2.columns[0], inplace=True)
 
         df2.index.name = "1 SECOND"
 
+        if align_sensor is not None:
+            df2 = align_sensors_file(df2, align_sensor, manual_offset)
+
         # Sensors figure
         sensor_fig = px.line(
             df2,
@@ -155,12 +303,26 @@ def main():
                 id="checklist-selection",
             ),
             dcc.Graph(id="graph-content"),
+            # Label range selector: a track, a label, then one of its segments sets the range below
+            html.Div(
+                [
+                    dcc.Dropdown(
+                        list(label_index) if label_index is not None else [],
+                        next(iter(label_index), None) if label_index is not None else None,
+                        placeholder="Label track",
+                        id="track-selection",
+                    ),
+                    dcc.Dropdown(placeholder="Label", id="label-selection"),
+                    dcc.Dropdown(placeholder="Segment", id="segment-selection"),
+                ],
+                style={"display": "grid", "gridTemplateColumns": "1fr 1fr 1fr"},
+            ),
             dcc.RangeSlider(
                 min=0,
-                max=df.last_valid_index(),
+                max=last_time,
                 step=1,
                 value=[0, 600],
-                marks={0: "0", df.last_valid_index(): f"{df.last_valid_index()}"},
+                marks={0: "0", last_time: f"{last_time}"},
                 tooltip={"placement": "bottom", "always_visible": True},
                 id="my-range-slider",
             ),
@@ -0,0 +1,177 @@
+"""Per-device health watchdog with escalating recovery.
+
+Each connected device is expected to notify regularly. When one goes stale, recovery escalates from the cheapest
+action to the most disruptive one, and only for that device:
+
+1. resubscribe to notifications
+2. reconnect the device
+3. restart the Bluetooth adapter (last resort, only after reconnecting failed repeatedly)
+
+Disconnected devices are paused (not checked) until they are watched again on reconnection, so a node that is gone
+for good doesn't count as failed reconnects and restart the adapter under the healthy ones.
+"""
+import asyncio
+import time
+
+import metrics
+
+RESUBSCRIBE = "resubscribe"
+RECONNECT = "reconnect"
+RESTART_ADAPTER = "restart_adapter"
+
+# Exponential moving average factor of the notification rate
+RATE_SMOOTHING = 0.1
+
+WATCHDOG_ACTIONS = metrics.REGISTRY.counter("hub_watchdog_actions_total", "Recovery actions taken by the watchdog", "action")
+RECOVERY_TIME = metrics.REGISTRY.histogram(
+    "hub_recovery_seconds", "Time from a device going stale to its next notification", label_name="action"
+)
+STALE_GAP = metrics.REGISTRY.histogram(
+    "hub_stale_gap_seconds", "Gaps between notifications of devices that went stale", label_name="device"
+)
+NOTIFICATION_RATE = metrics.REGISTRY.gauge("hub_notification_rate_hz", "Smoothed notification rate", "device")
+
+
+class DeviceHealth:
+    def __init__(self, name):
+        self.name = name
+        self.last_notification = time.monotonic()
+        self.rate = 0.0
+
+        # Stale episode state
+        self.stale_since = None
+        self.stale_from = None
+        self.last_action = None
+        self.last_action_time = 0.0
+        self.failed_reconnects = 0
+        # Whether the last RECONNECT action actually disconnected the device
+        self.reconnect_attempted = False
+        self.paused = False
+
+    def record(self, now=None):
+        """Called for every notification (from any thread)."""
+        if now is None:
+            now = time.monotonic()
+
+        gap = now - self.last_notification
+        if gap > 0:
+            self.rate += RATE_SMOOTHING * (1 / gap - self.rate)
+        self.last_notification = now
+
+
+class Watchdog:
+    def __init__(
+        self,
+        resubscribe,
+        reconnect,
+        restart_adapter,
+        stale_after=1.0,
+        action_timeout=3.0,
+        max_failed_reconnects=3,
+        min_restart_interval=60.0,
+    ):
+        """`resubscribe(key)`, `reconnect(key)` and `restart_adapter()` are coroutine functions. `reconnect` returns
+        False if there was nothing to reconnect (e.g. the device was already disconnected).
+
+        A device is stale after `stale_after` seconds without notifications. Each action gets `action_timeout` seconds
+        to bring it back before escalating. The adapter is only restarted after `max_failed_reconnects` reconnections
+        did not help, and at most once every `min_restart_interval` seconds.
+        """
+        self.resubscribe = resubscribe
+        self.reconnect = reconnect
+        self.restart_adapter = restart_adapter
+        self.stale_after = stale_after
+        self.action_timeout = action_timeout
+        self.max_failed_reconnects = max_failed_reconnects
+        self.min_restart_interval = min_restart_interval
+
+        self.devices: dict[str, DeviceHealth] = {}
+        self.restarting = False
+        self.last_restart = float("-inf")
+
+    def watch(self, key, name=None):
+        """Start watching a device once it is connected. After a reconnection, gives it some time to notify again."""
+        health = self.devices.get(key)
+        if health is None:
+            self.devices[key] = DeviceHealth(name or key)
+        else:
+            health.paused = False
+            health.last_action_time = time.monotonic()
+
+    def pause(self, key):
+        """Stop checking a device while it is disconnected, until `watch` is called again."""
+        health = self.devices.get(key)
+        if health is not None:
+            health.paused = True
+
+    def unwatch(self, key):
+        self.devices.pop(key, None)
+
+    def record(self, key):
+        health = self.devices.get(key)
+        if health is not None:
+            health.record()
+
+    async def check(self):
+        now = time.monotonic()
+
+        for key, health in list(self.devices.items()):
+            if health.paused:
+                continue
+
+            age = now - health.last_notification
+            NOTIFICATION_RATE.set(health.rate, health.name)
+
+            if age <= self.stale_after:
+                if health.stale_since is not None:
+                    # Recovered, measured up to the last notification
+                    RECOVERY_TIME.observe(max(health.last_notification - health.stale_since, 0.0), health.last_action or "none")
+                    STALE_GAP.observe(health.last_notification - health.stale_from, health.name)
+
+                    health.failed_reconnects = 0
+                    health.stale_since = None
+                    health.last_action = None
+                continue
+
+            if health.stale_since is None:
+                health.stale_since = now
+                health.stale_from = health.last_notification
+
+            if health.last_action is not None and now - health.last_action_time < self.action_timeout:
+                # Give the previous action some time
+                continue
+
+            await self._escalate(key, health, now)
+
+    async def _escalate(self, key, health, now):
+        if health.last_action is None:
+            action = RESUBSCRIBE
+        else:
+            if health.last_action == RECONNECT and health.reconnect_attempted:
+                health.failed_reconnects += 1
+            action = RECONNECT if health.failed_reconnects < self.max_failed_reconnects else RESTART_ADAPTER
+
+        if action == RESTART_ADAPTER and (self.restarting or now - self.last_restart < self.min_restart_interval):
+            action = RECONNECT
+
+        health.last_action = action
+        health.last_action_time = now
+        WATCHDOG_ACTIONS.inc(action)
+
+        if action == RESUBSCRIBE:
+            await self.resubscribe(key)
+        elif action == RECONNECT:
+            health.reconnect_attempted = await self.reconnect(key) is not False
+        else:
+            self.restarting = True
+            self.last_restart = now
+            health.failed_reconnects = 0
+            try:
+                await self.restart_adapter()
+            finally:
+                self.restarting = False
+
+    async def run(self, interval=0.5):
+        while True:
+            await asyncio.sleep(interval)
+            await self.check()
@@ -1,17 +1,38 @@
+import asyncio
+
 import simplepyble
-import msgpack
-import time
 
-DEVICES = [
-    '08:d1:f9:c7:14:de', # ESP32 DevkitC v4 1 (Left arm)
-    '08:d1:f9:df:d7:ba', # ESP32 DevkitC v4 2 (Right arm)
-    'cd:c8:d6:cf:45:50', # XIAO 1 (Left leg)
-    'd9:4d:33:22:7f:55', # XIAO 2 (Right leg)
-]
+from central_client import FrameConsumer, SimplePybleTransport
+from device_registry import DeviceRegistry
+
+# Sensor nodes, loaded from devices.json
+registry = DeviceRegistry.load()
 
 SERVICE_UUID = "4fafc201-1fb5-459e-8fcc-c5c9c331914b"
 CHARACTERISTIC_UUID = "beb5483e-36e1-4688-b7f5-ea07361b26a8"
 
+# Frames are printed in batches of up to this size (or every BATCH_MAX_DELAY seconds)
+BATCH_SIZE = 5
+BATCH_MAX_DELAY = 0.5
+
+
+def print_batch(batch):
+    for frame in batch:
+        print(frame)
+
+
+async def receive(peripheral, service_uuid, characteristic_uuid):
+    consumer = FrameConsumer(BATCH_SIZE, BATCH_MAX_DELAY)
+    transport = SimplePybleTransport(peripheral, service_uuid, characteristic_uuid)
+
+    # Subscribe to notifications instead of polling the characteristic
+    await transport.start(consumer)
+    try:
+        await consumer.run(print_batch)
+    finally:
+        await transport.stop()
+
+
 if __name__ == "__main__":
     adapters = simplepyble.Adapter.get_adapters()
 
@@ -43,7 +64,7 @@ if __name__ == "__main__":
     peripheral = None
     for i, peripheralTemp in enumerate(peripherals):
         print(f"{i}: {peripheralTemp.identifier()} [{peripheralTemp.address()}]")
-        if(peripheralTemp.address() in DEVICES):
+        if(peripheralTemp.address() in registry):
             peripheral = peripheralTemp
 
     if peripheral is None:
@@ -63,23 +84,10 @@ if __name__ == "__main__":
                 print(f"Characteristic: {characteristic.uuid()}")
                 service_uuid=service.uuid() 
                 characteristic_uuid=characteristic.uuid()
-    
-    prev_time = 0
-    while(True):
-        try:
-            contents = peripheral.read(service_uuid, characteristic_uuid)
-            
-            # print(contents)
-            
-            if len(contents) != 0:
-                unpacked = msgpack.unpackb(contents)
-                
-                if ('time' in unpacked and unpacked['time'] != prev_time):
-                    prev_time = unpacked['time']
-                    print(unpacked)
-
-            time.sleep(0.150)
-        except Exception as e:
-            print(e)
-            pass
+
+    try:
+        asyncio.run(receive(peripheral, service_uuid, characteristic_uuid))
+    except KeyboardInterrupt:
+        pass
+
     peripheral.disconnect()